@@ -1,29 +1,51 @@
 import importlib
 import logging
 import sys
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Dict, Union
+from types import CodeType
+from typing import Any, Dict, List, Mapping, Optional, Tuple, Union
 
 import yaml
 
 # For validation
 from pydantic.error_wrappers import ValidationError
-from linkml_validator.validator import Validator
 from koza.converter.kgx_converter import KGXConverter
 
 from koza.exceptions import MapItemException, NextRowException
+from koza.io.map_cache import (
+    add_loaded_map,
+    get_loaded_map,
+    load_cached_map,
+    map_cache_key,
+    save_cached_map,
+)
+from koza.io.writer.dedup_writer import DedupWriter
 from koza.io.writer.jsonl_writer import JSONLWriter
+from koza.io.writer.parquet_writer import ParquetWriter
 from koza.io.writer.tsv_writer import TSVWriter
-from koza.io.writer.writer import KozaWriter
+from koza.io.writer.writer import KozaWriter, ThreadedWriter
 from koza.io.yaml_loader import UniqueIncludeLoader
-from koza.model.config.source_config import MapFileConfig, OutputFormat
+from koza.model.config.source_config import (
+    DedupPolicy,
+    MapFileConfig,
+    MapMode,
+    OutputCompression,
+    OutputFormat,
+    OutputShardConfig,
+    ValidationConfig,
+)
 from koza.model.curie_cleaner import CurieCleaner
-from koza.model.map_dict import MapDict
+from koza.model.map_dict import CompactMapDict, LazyMapDict, MapDict, MapStats
 from koza.model.source import Source
 from koza.model.translation_table import TranslationTable
+from koza.validation import EntityValidator
 
 logger = logging.getLogger(__name__)
 
+# number of missing map keys that are logged individually
+MAP_MISS_WARNINGS = 10
+
 
 class KozaApp:
     """
@@ -38,32 +60,58 @@ class KozaApp:
         output_dir: str = './output',
         output_format: OutputFormat = OutputFormat('jsonl'),
         schema: str = None,
+        write_batch_size: int = 10000,
+        write_batch_bytes: int = 4 * 1024 * 1024,
+        map_cache_dir: str = None,
+        output_compression: OutputCompression = None,
+        compression_level: int = None,
+        background_write: bool = False,
+        dedup_nodes: DedupPolicy = None,
+        dedup_max_nodes: int = None,
+        output_shards: OutputShardConfig = None,
+        validation: ValidationConfig = None,
     ):
         self.source = source
         self.translation_table = translation_table
         self.output_dir = output_dir
         self.output_format = output_format
         self._map_registry: Dict[str, Source] = {}
-        self._map_cache: Dict[str, Dict] = {}
+        self._map_cache: Dict[str, Mapping] = {}
         self.curie_cleaner: CurieCleaner = CurieCleaner()
-        self.writer: KozaWriter = self._get_writer(
-            source.config.name, source.config.node_properties, source.config.edge_properties
-        )
-        
+        self.write_batch_size = write_batch_size
+        self.write_batch_bytes = write_batch_bytes
+        self.map_cache_dir = map_cache_dir
+        self.output_compression = output_compression
+        self.compression_level = compression_level
+        self.output_shards = output_shards
+        self._map_misses_logged = 0
+
         if schema:
-            self.validator = Validator(schema=schema)
+            self.validator = EntityValidator(schema, validation)
             self.converter = KGXConverter()
 
         if source.config.depends_on is not None:
             for map_file in source.config.depends_on:
-                with open(map_file, 'r') as map_file_fh:
-                    map_file_config = MapFileConfig(**yaml.load(map_file_fh, Loader=UniqueIncludeLoader))
-                    map_file_config.transform_code = (str(Path(map_file).parent / Path(map_file).stem) + '.py')
+                map_file_config = self.get_map_config(map_file)
                 self._map_registry[map_file_config.name] = Source(map_file_config)
 
-        self.writer = self._get_writer(
+        self.writer: KozaWriter = self._get_writer(
             source.config.name, source.config.node_properties, source.config.edge_properties
         )
+        if dedup_nodes:
+            self.writer = DedupWriter(self.writer, dedup_nodes, dedup_max_nodes, output_dir)
+        if background_write:
+            self.writer = ThreadedWriter(self.writer)
+
+    @staticmethod
+    def get_map_config(map_file: str) -> MapFileConfig:
+        """
+        Reads a map config, with its transform code alongside it as a .py file
+        """
+        with open(map_file, 'r') as map_file_fh:
+            map_file_config = MapFileConfig(**yaml.load(map_file_fh, Loader=UniqueIncludeLoader))
+        map_file_config.transform_code = str(Path(map_file).parent / Path(map_file).stem) + '.py'
+        return map_file_config
 
     def get_map(self, map_name: str):
         map = self._map_cache[map_name]
@@ -79,6 +127,13 @@ class KozaApp:
         else:
             return next(self.source)
 
+    def get_batch(self) -> Any:
+        """
+        Returns the next batch of rows from the source for batch mode transforms,
+        a pyarrow RecordBatch or a dictionary of NumPy arrays
+        """
+        return self.source.next_batch()
+
     def process_sources(self):
         """
         Transform an entire file using ingest logic in a functionless python file
@@ -94,19 +149,21 @@ class KozaApp:
         parent_path = Path(self.source.config.transform_code).parent
         transform_code = Path(self.source.config.transform_code).stem
         sys.path.append(str(parent_path))
-        is_first = True
-        transform_module = None
 
-        if self.source.config.transform_mode == 'flat':
+        if self.source.config.transform_mode in ['flat', 'batch']:
+            code, namespace = self._compile_transform(Path(self.source.config.transform_code))
             while True:
                 try:
-                    if is_first:
-                        transform_module = importlib.import_module(transform_code)
-                        is_first = False
-                    else:
-                        importlib.reload(transform_module)
+                    exec(code, namespace)
                 except MapItemException as mie:
-                    logger.warning(f"{str(mie)} not found in map")
+                    if self.source.config.transform_mode == 'batch':
+                        # the transform runs once per batch, skipping it would drop the whole batch
+                        raise MapItemException(
+                            f"Key {mie} is missing from a map in a batch transform, which would "
+                            "drop the whole batch. Look up keys with .get() and handle missing "
+                            "ones in the transform"
+                        ) from mie
+                    self._log_map_miss(mie)
                 except NextRowException:
                     continue
                 except ValidationError as ve:
@@ -125,17 +182,106 @@ class KozaApp:
         # close the writer when the source is done processing
         self.writer.finalize()
 
+        if hasattr(self, 'validator'):
+            self.log_validation_summary()
+
+        self.log_map_stats()
+
         # remove directory from sys.path to prevent name clashes
         sys.path.remove(str(parent_path))
 
-    def process_maps(self):
+    def process_maps(self, workers: int = None):
         """
         Initializes self._map_cache
+
+        Maps don't depend on each other, so with more than one worker they are
+        loaded concurrently in threads. Each map file is decompressed on a
+        background thread of its reader (see koza.io.utils.open_resource), and
+        maps are built in this process so they aren't copied back from another.
+        The map sources are closed once the maps are loaded
+
+        Maps already loaded by another KozaApp in this process (or inherited
+        from the parent of a worker process) are reused rather than loaded
+        again, see koza.io.map_cache.get_loaded_map
+
+        :param workers: optional number of maps to load at once
         :return:
         """
-        for map_file in self._map_registry.values():
-            if map_file.config.name not in self._map_cache:
-                self._load_map(map_file)
+        pending = []
+        try:
+            for map_file in self._map_registry.values():
+                if map_file.config.name in self._map_cache:
+                    continue
+                loaded_map = get_loaded_map(map_file.config)
+                if loaded_map is not None:
+                    logger.info(
+                        f"Reusing map {map_file.config.name} loaded earlier in this process"
+                    )
+                    # the lookups of earlier KozaApps aren't counted for this one
+                    if getattr(loaded_map, 'stats', None) is not None:
+                        loaded_map.stats = MapStats()
+                    self._map_cache[map_file.config.name] = loaded_map
+                else:
+                    pending.append(map_file)
+
+            if not workers or workers < 2 or len(pending) < 2:
+                for map_file in pending:
+                    self._load_map(map_file)
+            else:
+                self._load_maps_concurrently(pending, workers)
+        finally:
+            for map_file in self._map_registry.values():
+                map_file.close()
+
+        for map_file in pending:
+            add_loaded_map(map_file.config, self._map_cache[map_file.config.name])
+
+    def _load_maps_concurrently(self, map_files: List[Source], workers: int):
+        with ThreadPoolExecutor(max_workers=workers) as threads:
+            futures = [threads.submit(self._load_map, map_file) for map_file in map_files]
+            for future in futures:
+                # re-raises any exception from loading the map
+                future.result()
+
+    def log_map_stats(self, top_n: int = 10):
+        """
+        Logs a summary of the lookups in each map (see MapStats)
+
+        :param top_n: number of the most frequently missing keys to include
+        """
+        for map_name, map in (self._map_cache or {}).items():
+            stats = getattr(map, 'stats', None)
+            if stats is not None and stats.lookups:
+                logger.info(stats.summary(map_name, top_n))
+
+    def log_validation_summary(self):
+        """
+        Waits for the validation of the written entities and logs how many
+        were invalid per class, as a warning when any were
+        """
+        summary = self.validator.finish()
+        if not summary.validated:
+            return
+        if summary.valid:
+            logger.info(f"Validated {sum(summary.validated.values())} records against the schema")
+        else:
+            logger.warning(f"Invalid records in {self.source.config.name}:\n{summary.summary()}")
+
+    def _log_map_miss(self, map_item_exception: MapItemException):
+        """
+        Logs the first MAP_MISS_WARNINGS missing map keys, later misses
+        are only counted and reported by log_map_stats
+        """
+        self._map_misses_logged += 1
+        if self._map_misses_logged > MAP_MISS_WARNINGS:
+            return
+        map_name = getattr(map_item_exception, 'map_name', None)
+        message = f"{str(map_item_exception)} not found in map"
+        if map_name:
+            message += f" {map_name}"
+        if self._map_misses_logged == MAP_MISS_WARNINGS:
+            message += ", further misses are summarized when the source is done"
+        logger.warning(message)
 
     @staticmethod
     def next_row():
@@ -154,71 +300,189 @@ class KozaApp:
         # If a schema/validator is defined, validate before writing
         if hasattr(self, 'validator'):
 
-            (nodes, edges) = self.converter.convert(entities)
-
-            if self.output_format == OutputFormat.tsv:
-                if nodes:
-                    for node in nodes:
-                        self.validator.validate(obj=node, target_class="NamedThing", strict=True)
+            (node_entities, edge_entities) = self.converter.split(entities)
+            nodes = [self.converter.convert_node(node) for node in node_entities]
+            edges = [self.converter.convert_association(edge) for edge in edge_entities]
 
-                if edges:
-                    for edge in edges:
-                        self.validator.validate(obj=edge, target_class="Association", strict=True)
+            if nodes:
+                self.validator.add(node_entities, nodes, "NamedThing")
+            if edges:
+                self.validator.add(edge_entities, edges, "Association")
 
-            elif self.output_format == OutputFormat.jsonl:
-                if nodes:
-                    for node in nodes:
-                        # node = json.dumps(n, ensure_ascii=False)
-                        self.validator.validate(obj=node, target_class="NamedThing", strict=True)
-
-                if edges:
-                    for edge in edges:
-                        # edge = json.dumps(e, ensure_ascii=False)
-                        self.validator.validate(obj=edge, target_class="Association", strict=True)
+            # the writer is given the converted entities, rather than converting them again
+            self.writer.write_converted(nodes, edges)
+            return
 
         self.writer.write(entities)
 
-    def _get_writer(self, name, node_properties, edge_properties) -> Union[TSVWriter, JSONLWriter]:
+    def _get_writer(
+        self, name, node_properties, edge_properties
+    ) -> Union[TSVWriter, JSONLWriter, ParquetWriter]:
         if self.output_format == OutputFormat.tsv:
-            return TSVWriter(self.output_dir, name, node_properties, edge_properties)
+            return TSVWriter(
+                self.output_dir,
+                name,
+                node_properties,
+                edge_properties,
+                self.write_batch_size,
+                self.write_batch_bytes,
+                self.output_compression,
+                self.compression_level,
+                shards=self.output_shards,
+            )
 
         elif self.output_format == OutputFormat.jsonl:
-            return JSONLWriter(self.output_dir, name, node_properties, edge_properties)
+            return JSONLWriter(
+                self.output_dir,
+                name,
+                node_properties,
+                edge_properties,
+                self.write_batch_size,
+                self.write_batch_bytes,
+                self.output_compression,
+                self.compression_level,
+                shards=self.output_shards,
+            )
+
+        elif self.output_format == OutputFormat.parquet:
+            if self.output_shards:
+                raise ValueError("Sharded outputs are only supported for tsv and jsonl output")
+            return ParquetWriter(
+                self.output_dir,
+                name,
+                node_properties,
+                edge_properties,
+                compression=self.output_compression,
+                compression_level=self.compression_level,
+            )
 
     def _load_map(self, map_file: Source):
 
-       # map_file = Source(map_file_config)
-
         if not isinstance(map_file.config, MapFileConfig):
             raise ValueError(f"Error loading map: {map_file.config.name} is not a MapFileConfig")
 
+        transform_code_pth = Path(map_file.config.transform_code)
+
+        if not transform_code_pth.exists():
+            self._map_cache[map_file.config.name] = self._load_declarative_map(
+                map_file, self.map_cache_dir
+            )
+            return
+
+        if map_file.config.map_mode != MapMode.dict:
+            logger.warning(
+                f"map_mode {map_file.config.map_mode.value} only applies to key/values maps, "
+                f"loading {map_file.config.name} with {transform_code_pth} as a dict"
+            )
+
+        cache_key, map = self._from_map_cache(map_file.config, self.map_cache_dir)
+        if map is not None:
+            self._map_cache[map_file.config.name] = map
+            return
+
         map = MapDict()
+        map.name = map_file.config.name
 
         self._map_cache[map_file.config.name] = map
 
-        transform_code_pth = Path(map_file.config.transform_code)
+        parent_path = transform_code_pth.parent
+        sys.path.append(str(parent_path))
+        code, namespace = self._compile_transform(transform_code_pth)
 
-        if transform_code_pth.exists():
-            parent_path = transform_code_pth.parent
-            transform_code = transform_code_pth.stem
-            sys.path.append(str(parent_path))
-            is_first = True
-            transform_module = None
+        while True:
+            try:
+                exec(code, namespace)
+            except StopIteration:
+                break
 
-            while True:
-                try:
-                    if is_first:
-                        transform_module = importlib.import_module(transform_code)
-                        is_first = False
-                    else:
-                        importlib.reload(transform_module)
-                except StopIteration:
-                    break
-        else:
-            key_column = map_file.config.key
-            value_columns = map_file.config.values
-            for row in map_file:
-                map[row[key_column]] = {key: value for key, value in row.items() if key in value_columns}
+        if cache_key:
+            save_cached_map(self.map_cache_dir, cache_key, map)
+
+    @staticmethod
+    def _load_declarative_map(
+        map_file: Union[Source, MapFileConfig], map_cache_dir: str = None
+    ) -> Union[MapDict, CompactMapDict, LazyMapDict]:
+        """
+        Builds a map from the key and values columns of a map file, stored as
+        configured by map_mode
+
+        Also used to load a map from its config alone, eg to preload it
+        before worker processes are forked (see cli_runner._preload_maps)
+
+        :param map_file: the map Source, or its config
+        :param map_cache_dir: optional map cache directory (see koza.io.map_cache)
+        :return: the map
+        """
+        config = map_file if isinstance(map_file, MapFileConfig) else map_file.config
+        if config.map_mode == MapMode.lazy:
+            if LazyMapDict.supports_config(config):
+                # lazy maps save their index instead of the map, by default in koza's cache dir
+                return LazyMapDict(config, map_cache_dir)
+            logger.warning(
+                f"map_mode lazy needs local uncompressed csv or jsonl files, "
+                f"loading {config.name} as a dict"
+            )
+
+        cache_key, map = KozaApp._from_map_cache(config, map_cache_dir)
+        if map is not None:
+            return map
+
+        source = Source(map_file) if isinstance(map_file, MapFileConfig) else map_file
+        key_column = config.key
+        value_columns = config.values
+        try:
+            if config.map_mode == MapMode.compact:
+                map = CompactMapDict(value_columns)
+                map.name = config.name
+                for row in source:
+                    map[row[key_column]] = row
+            else:
+                map = MapDict()
+                map.name = config.name
+                for row in source:
+                    map[row[key_column]] = {
+                        key: value for key, value in row.items() if key in value_columns
+                    }
+        finally:
+            if source is not map_file:
+                source.close()
+
+        if cache_key:
+            save_cached_map(map_cache_dir, cache_key, map)
+        return map
+
+    @staticmethod
+    def _from_map_cache(
+        config: MapFileConfig, map_cache_dir: str = None
+    ) -> Tuple[Optional[str], Optional[Union[MapDict, CompactMapDict]]]:
+        """
+        :return: tuple of the map cache key (None when not caching) and the cached map if there is one
+        """
+        cache_key = map_cache_key(config) if map_cache_dir else None
+        if not cache_key:
+            return None, None
+        map = load_cached_map(map_cache_dir, cache_key)
+        if map is not None:
+            logger.info(f"Loaded map {config.name} from the map cache")
+        return cache_key, map
+
+    @staticmethod
+    def _compile_transform(transform_code_pth: Path) -> Tuple[CodeType, Dict[str, Any]]:
+        """
+        Compiles a flat mode transform file to a code object along with the
+        namespace it is executed in
+
+        The code object is executed once per row in the same namespace, which keeps
+        the semantics of reloading the module (module level names persist between
+        rows) without re-reading the file and rebuilding the module each time
+
+        :param transform_code_pth: path to the transform python file
+        :return: tuple of the compiled code and its module namespace
+        """
+        with open(transform_code_pth, 'r') as transform_code_fh:
+            code = compile(transform_code_fh.read(), str(transform_code_pth), 'exec')
+        namespace = {'__name__': transform_code_pth.stem, '__file__': str(transform_code_pth)}
+        return code, namespace
 
     @staticmethod
     def _map_sniffer(depends_on: str):
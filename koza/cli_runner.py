@@ -2,9 +2,16 @@
 Module for managing koza runs through the CLI
 """
 
+import copy
+import gc
+import json
 import logging
+import multiprocessing
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import Dict, Optional, Union
+from typing import Dict, List, Optional, Tuple, Union
 
 import yaml
 
@@ -12,11 +19,30 @@ from koza.app import KozaApp
 from koza.io.reader.csv_reader import CSVReader
 from koza.io.reader.json_reader import JSONReader
 from koza.io.reader.jsonl_reader import JSONLReader
-from koza.io.utils import open_resource
+from koza.io.map_cache import add_loaded_map, get_loaded_map, map_cache_key
+from koza.io.utils import (
+    COMPRESSION_EXTENSIONS,
+    is_compressed,
+    merge_output_files,
+    open_resource,
+)
+from koza.io.writer.dedup_writer import NodeIdSet, merge_unique_nodes
+from koza.io.writer.parquet_writer import merge_parquet_files
+from koza.io.writer.writer import shard_file_name, write_manifest
 from koza.io.yaml_loader import UniqueIncludeLoader
-from koza.model.config.source_config import FormatType, OutputFormat, PrimaryFileConfig
+from koza.model.config.source_config import (
+    DedupPolicy,
+    FormatType,
+    MapMode,
+    OutputCompression,
+    OutputFormat,
+    OutputShardConfig,
+    PrimaryFileConfig,
+    ValidationConfig,
+)
 from koza.model.source import Source
 from koza.model.translation_table import TranslationTable
+from koza.validation import get_schema_validator
 
 logger = logging.getLogger(__name__)
 
@@ -38,11 +64,31 @@ def set_koza_app(
     output_dir: str = './output',
     output_format: OutputFormat = OutputFormat('tsv'),
     schema: str = None,
+    map_cache_dir: str = None,
+    output_compression: OutputCompression = None,
+    compression_level: int = None,
+    background_write: bool = False,
+    dedup_nodes: DedupPolicy = None,
+    output_shards: OutputShardConfig = None,
+    validation: ValidationConfig = None,
 ) -> KozaApp:
     """
     Setter for singleton koza app object
     """  
-    koza_apps[source.config.name] = KozaApp(source, translation_table, output_dir, output_format, schema)
+    koza_apps[source.config.name] = KozaApp(
+        source,
+        translation_table,
+        output_dir,
+        output_format,
+        schema,
+        map_cache_dir=map_cache_dir,
+        output_compression=output_compression,
+        compression_level=compression_level,
+        background_write=background_write,
+        dedup_nodes=dedup_nodes,
+        output_shards=output_shards,
+        validation=validation,
+    )
     print(f"koza_apps entry created for: {source.config.name}\nkoza_app: {koza_apps[source.config.name]}")
     return koza_apps[source.config.name]
 
@@ -54,6 +100,14 @@ def transform_source(
     local_table: str = None,
     schema: str = None,
     row_limit: int = None,
+    workers: int = None,
+    map_cache_dir: str = None,
+    output_compression: OutputCompression = None,
+    compression_level: int = None,
+    background_write: bool = False,
+    dedup_nodes: DedupPolicy = None,
+    output_shards: OutputShardConfig = None,
+    validation: ValidationConfig = None,
 ):
 
     with open(source, 'r') as source_fh:
@@ -65,16 +119,421 @@ def transform_source(
             # look for it alongside the source conf as a .py file
             source_config.transform_code = str(Path(source).parent / Path(source).stem) + '.py'
 
-        koza_source = Source(source_config, row_limit)
-
         translation_table = get_translation_table(
             global_table if global_table else source_config.global_table,
             local_table if local_table else source_config.local_table,
         )
 
-        source_koza = set_koza_app(koza_source, translation_table, output_dir, output_format, schema)
-        source_koza.process_maps()
-        source_koza.process_sources()
+        if workers and workers > 1:
+            _transform_sharded(
+                source_config,
+                translation_table,
+                output_dir,
+                output_format,
+                schema,
+                row_limit,
+                workers,
+                map_cache_dir,
+                output_compression,
+                compression_level,
+                background_write,
+                dedup_nodes,
+                output_shards,
+                validation,
+            )
+        else:
+            _transform_shard(
+                source_config,
+                translation_table,
+                output_dir,
+                output_format,
+                schema,
+                row_limit,
+                map_cache_dir=map_cache_dir,
+                map_workers=workers,
+                output_compression=output_compression,
+                compression_level=compression_level,
+                background_write=background_write,
+                dedup_nodes=dedup_nodes,
+                output_shards=output_shards,
+                validation=validation,
+            )
+
+def _transform_shard(
+    source_config: PrimaryFileConfig,
+    translation_table: TranslationTable,
+    output_dir: str,
+    output_format: OutputFormat,
+    schema: str = None,
+    row_limit: int = None,
+    byte_range: Tuple[int, int] = None,
+    header: List[str] = None,
+    map_cache_dir: str = None,
+    map_workers: int = None,
+    output_compression: OutputCompression = None,
+    compression_level: int = None,
+    background_write: bool = False,
+    dedup_nodes: DedupPolicy = None,
+    output_shards: OutputShardConfig = None,
+    validation: ValidationConfig = None,
+):
+    """
+    Runs a transform for a source config in the current process,
+    also used as the entry point for worker processes
+
+    map_workers is the number of maps to load at once (see KozaApp.process_maps)
+    """
+    koza_source = Source(source_config, row_limit, byte_range, header)
+
+    source_koza = set_koza_app(
+        koza_source,
+        translation_table,
+        output_dir,
+        output_format,
+        schema,
+        map_cache_dir,
+        output_compression,
+        compression_level,
+        background_write,
+        dedup_nodes,
+        output_shards,
+        validation,
+    )
+    source_koza.process_maps(map_workers)
+    source_koza.process_sources()
+
+def _get_shards(
+    source_config: PrimaryFileConfig, workers: int, row_limit: int = None
+) -> List[Tuple[Path, Optional[Tuple[int, int]], Optional[List[str]]]]:
+    """
+    Splits the input of a source into (file, byte_range, header) shards
+
+    Each file is a shard, and when there are more workers than files each
+    local uncompressed csv or jsonl file is further split into byte ranges.
+    Files are not split when a row limit is set, since the limit applies
+    to the whole file
+    """
+    shards = []
+    ranges_per_file = workers // len(source_config.files)
+    for file in source_config.files:
+        if (
+            ranges_per_file > 1
+            and row_limit is None
+            and source_config.format in ['csv', 'jsonl']
+            and Path(file).exists()
+            and not is_compressed(file)
+        ):
+            byte_ranges, header = Source.split_file(source_config, file, ranges_per_file)
+            shards.extend((file, byte_range, header) for byte_range in byte_ranges)
+        else:
+            shards.append((file, None, None))
+    return shards
+
+def _preload_maps(source_config: PrimaryFileConfig, map_cache_dir: str = None) -> bool:
+    """
+    Loads the key/values maps of a source before worker processes are started
+
+    With the fork start method the maps are loaded into the registry, so forked
+    workers inherit the parent's copy (see koza.io.map_cache.get_loaded_map)
+    instead of each loading the maps again. The pages of a map are still copied
+    into a worker as it looks up keys, since lookups update reference counts,
+    the frozen gc only keeps collections from touching every page
+
+    Spawned workers (the spawn and forkserver start methods) share nothing with
+    the parent, so each loads its own copy of every map. With a map cache
+    directory the maps are cached here first, so workers load the cached maps
+    rather than each building them from the map files
+
+    Lazy maps are left to each worker since they hold open files, their values
+    are read through the page cache the workers share. Maps built by custom code
+    need a KozaApp and are also loaded by each worker
+
+    :return: True if maps were preloaded, in which case the gc is frozen
+    until the workers are done (see gc.freeze)
+    """
+    fork = multiprocessing.get_start_method() == 'fork'
+    if not source_config.depends_on or not (fork or map_cache_dir):
+        return False
+
+    preloaded = False
+    for map_file in source_config.depends_on:
+        map_config = KozaApp.get_map_config(map_file)
+        if map_config.map_mode == MapMode.lazy or Path(map_config.transform_code).exists():
+            continue
+        if fork:
+            if get_loaded_map(map_config) is None:
+                add_loaded_map(map_config, KozaApp._load_declarative_map(map_config, map_cache_dir))
+                preloaded = True
+        else:
+            cache_key = map_cache_key(map_config)
+            if cache_key and not (Path(map_cache_dir) / f"{cache_key}.pickle").exists():
+                # only built to be saved to the map cache
+                KozaApp._load_declarative_map(map_config, map_cache_dir)
+
+    if preloaded:
+        # keep the maps out of gc collections, which would otherwise touch and
+        # copy the pages they are on in every worker
+        gc.freeze()
+    return preloaded
+
+def _transform_sharded(
+    source_config: PrimaryFileConfig,
+    translation_table: TranslationTable,
+    output_dir: str,
+    output_format: OutputFormat,
+    schema: str = None,
+    row_limit: int = None,
+    workers: int = 2,
+    map_cache_dir: str = None,
+    output_compression: OutputCompression = None,
+    compression_level: int = None,
+    background_write: bool = False,
+    dedup_nodes: DedupPolicy = None,
+    output_shards: OutputShardConfig = None,
+    validation: ValidationConfig = None,
+):
+    """
+    Transforms the input of a source in separate worker processes
+
+    The input is split into shards (see _get_shards), each worker gets a
+    copy of the source config limited to its shard and writes to its own
+    shard directory, the shard outputs are then merged into the usual
+    {name}_nodes / {name}_edges files
+
+    With dedup_nodes each worker de-duplicates its own nodes and the node
+    files are de-duplicated again as they are merged, which is only exact
+    for the first policy
+    """
+    if dedup_nodes and DedupPolicy(dedup_nodes) == DedupPolicy.merge:
+        raise ValueError(
+            "Nodes can't be de-duplicated with the merge policy in worker processes, "
+            "use the first policy or a single worker"
+        )
+
+    shards = _get_shards(source_config, workers, row_limit)
+    if len(shards) == 1:
+        _transform_shard(
+            source_config,
+            translation_table,
+            output_dir,
+            output_format,
+            schema,
+            row_limit,
+            map_cache_dir=map_cache_dir,
+            map_workers=workers,
+            output_compression=output_compression,
+            compression_level=compression_level,
+            background_write=background_write,
+            dedup_nodes=dedup_nodes,
+            output_shards=output_shards,
+            validation=validation,
+        )
+        return
+
+    shards_dir = Path(output_dir) / f"{source_config.name}_shards"
+    shard_dirs = []
+
+    preloaded = _preload_maps(source_config, map_cache_dir)
+    if schema and multiprocessing.get_start_method() == 'fork':
+        # compiled once here rather than in every worker (see koza.validation.get_schema_validator)
+        get_schema_validator(schema)
+
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = []
+            for index, (file, byte_range, header) in enumerate(shards):
+                shard_config = copy.copy(source_config)
+                object.__setattr__(shard_config, 'files', [file])
+                shard_dir = str(shards_dir / str(index))
+                shard_dirs.append(shard_dir)
+                futures.append(
+                    executor.submit(
+                        _transform_shard,
+                        shard_config,
+                        translation_table,
+                        shard_dir,
+                        output_format,
+                        schema,
+                        row_limit,
+                        byte_range,
+                        header,
+                        map_cache_dir,
+                        None,
+                        output_compression,
+                        compression_level,
+                        background_write,
+                        dedup_nodes,
+                        output_shards,
+                        validation,
+                    )
+                )
+            for future in futures:
+                # re-raises any exception from the worker
+                future.result()
+    finally:
+        if preloaded:
+            gc.unfreeze()
+
+    compression = OutputCompression(output_compression).value if output_compression else None
+    if output_shards:
+        _merge_output_shards(
+            source_config.name,
+            shard_dirs,
+            output_dir,
+            output_format,
+            compression,
+            output_shards,
+            compression_level,
+            bool(dedup_nodes),
+        )
+        shutil.rmtree(shards_dir)
+        return
+
+    for output_type in ['nodes', 'edges']:
+        output_name = f"{source_config.name}_{output_type}.{output_format.value}"
+        if compression and output_format != OutputFormat.parquet:
+            output_name += COMPRESSION_EXTENSIONS[compression]
+        shard_files = [
+            Path(shard_dir) / output_name
+            for shard_dir in shard_dirs
+            if (Path(shard_dir) / output_name).exists()
+        ]
+        if shard_files and dedup_nodes and output_type == 'nodes':
+            node_ids = NodeIdSet(directory=output_dir)
+            try:
+                if output_format == OutputFormat.parquet:
+                    merge_parquet_files(
+                        shard_files,
+                        Path(output_dir) / output_name,
+                        compression,
+                        compression_level,
+                        node_ids,
+                    )
+                else:
+                    merge_unique_nodes(
+                        shard_files,
+                        Path(output_dir) / output_name,
+                        output_format,
+                        node_ids,
+                        compression,
+                        compression_level,
+                    )
+            finally:
+                node_ids.close()
+        elif shard_files and output_format == OutputFormat.parquet:
+            merge_parquet_files(
+                shard_files, Path(output_dir) / output_name, compression, compression_level
+            )
+        elif shard_files:
+            merge_output_files(
+                shard_files,
+                Path(output_dir) / output_name,
+                header=output_format == OutputFormat.tsv,
+                compression=compression,
+            )
+
+    shutil.rmtree(shards_dir)
+
+def _merge_output_shards(
+    name: str,
+    shard_dirs: List[str],
+    output_dir: str,
+    output_format: OutputFormat,
+    compression: Optional[str],
+    output_shards: OutputShardConfig,
+    compression_level: int = None,
+    dedup_nodes: bool = False,
+):
+    """
+    Combines the numbered output files of worker shards (see OutputShardConfig),
+    partitions are merged partition by partition and files rolled over by size
+    are moved to the output directory and renumbered, then the manifest is written
+
+    With dedup_nodes node files are de-duplicated as they are merged, partition by
+    partition since nodes are partitioned by id, and files rolled over by size
+    are rewritten without the nodes of the files before them
+    """
+    suffix = f".{output_format.value}"
+    if compression:
+        suffix += COMPRESSION_EXTENSIONS[compression]
+    manifests = []
+    for shard_dir in shard_dirs:
+        manifest_file = Path(shard_dir) / f"{name}_manifest.json"
+        if manifest_file.exists():
+            with open(manifest_file) as manifest_fh:
+                manifests.append((shard_dir, json.load(manifest_fh)))
+
+    outputs = {}
+    for output_type in ['nodes', 'edges']:
+        shard_outputs = [
+            (shard_dir, manifest[output_type])
+            for shard_dir, manifest in manifests
+            if output_type in manifest
+        ]
+        if not shard_outputs:
+            continue
+        stem = f"{name}_{output_type}"
+        files = []
+        dedup = dedup_nodes and output_type == 'nodes'
+        if output_shards.partitions:
+            for index in range(output_shards.partitions):
+                file_name = shard_file_name(stem, suffix, index)
+                partition_files = [
+                    Path(shard_dir) / shard_files[index]['file']
+                    for shard_dir, shard_files in shard_outputs
+                ]
+                if dedup:
+                    node_ids = NodeIdSet(directory=output_dir)
+                    try:
+                        rows = merge_unique_nodes(
+                            partition_files,
+                            Path(output_dir) / file_name,
+                            output_format,
+                            node_ids,
+                            compression,
+                            compression_level,
+                        )
+                    finally:
+                        node_ids.close()
+                else:
+                    merge_output_files(
+                        partition_files,
+                        Path(output_dir) / file_name,
+                        header=output_format == OutputFormat.tsv,
+                        compression=compression,
+                    )
+                    rows = sum(shard_files[index]['rows'] for _, shard_files in shard_outputs)
+                files.append({'file': file_name, 'rows': rows})
+        elif dedup:
+            node_ids = NodeIdSet(directory=output_dir)
+            try:
+                for shard_dir, shard_files in shard_outputs:
+                    for shard_file in shard_files:
+                        file_name = shard_file_name(stem, suffix, len(files))
+                        rows = merge_unique_nodes(
+                            [Path(shard_dir) / shard_file['file']],
+                            Path(output_dir) / file_name,
+                            output_format,
+                            node_ids,
+                            compression,
+                            compression_level,
+                        )
+                        if rows:
+                            files.append({'file': file_name, 'rows': rows})
+                        else:
+                            # all its nodes were in earlier files
+                            os.remove(Path(output_dir) / file_name)
+            finally:
+                node_ids.close()
+        else:
+            for shard_dir, shard_files in shard_outputs:
+                for shard_file in shard_files:
+                    file_name = shard_file_name(stem, suffix, len(files))
+                    shutil.move(Path(shard_dir) / shard_file['file'], Path(output_dir) / file_name)
+                    files.append({'file': file_name, 'rows': shard_file['rows']})
+        outputs[output_type] = files
+
+    write_manifest(output_dir, name, outputs)
 
 def validate_file(
     file: str,
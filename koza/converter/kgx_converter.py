@@ -1,7 +1,16 @@
-from dataclasses import asdict
-from typing import Iterable, Tuple
+import copy
+from dataclasses import asdict, fields, is_dataclass
+from typing import Any, Callable, Dict, Iterable, Tuple
+
 from pydantic import BaseModel
 
+# values that are immutable and can be used as is instead of copied
+_ATOMIC_TYPES = (str, int, float, bool, type(None))
+
+# (is_edge, convert) by entity class, see KGXConverter._dispatch
+_dispatch_cache: Dict[type, Tuple[bool, Callable[[Any], dict]]] = {}
+
+
 class KGXConverter:
     """
     Converts the biolink model to the KGX format, which splits
@@ -12,6 +21,8 @@ class KGXConverter:
 
     https://github.com/biolink/kgx/blob/master/specification/kgx-format.md
 
+    Whether a class is a node or an edge, and a conversion function that
+    reads its fields directly, are worked out once per class
     """
 
     def convert(self, entities: Iterable) -> Tuple[dict, dict]:
@@ -20,31 +31,106 @@ class KGXConverter:
         edges = []
 
         for entity in entities:
+            (is_edge, convert) = self._dispatch(entity)
+            if is_edge:
+                edges.append(convert(entity))
+            else:
+                nodes.append(convert(entity))
 
-            # if entity has subject + object + predicate, treat as edge
-            if all(hasattr(entity, attr) for attr in ["subject", "object", "predicate"]):
-                edges.append(self.convert_association(entity))
+        return nodes, edges
 
-            # if entity has id and name, but not subject/object/predicate, treat as node
-            elif all(hasattr(entity, attr) for attr in ["id", "name"]) and not all(
-                hasattr(entity, attr) for attr in ["subject", "object", "predicate"]
-            ):
-                nodes.append(self.convert_node(entity))
+    def split(self, entities: Iterable) -> Tuple[list, list]:
+        """
+        Splits entities into nodes and edges, without converting them
+        """
 
-            # otherwise, not a
+        nodes = []
+        edges = []
+
+        for entity in entities:
+            if self._dispatch(entity)[0]:
+                edges.append(entity)
             else:
-                raise ValueError(
-                    "Can only convert NamedThing or Association entities to KGX compatible dictionaries"
-                )
+                nodes.append(entity)
 
         return nodes, edges
 
     def convert_node(self, node) -> dict:
-        if isinstance(node, BaseModel):
-            return dict(node)
-        return asdict(node)
+        return self._dispatch(node)[1](node)
 
     def convert_association(self, association) -> dict:
-        if isinstance(association, BaseModel):
-            return dict(association)
-        return asdict(association)
+        return self._dispatch(association)[1](association)
+
+    @staticmethod
+    def _dispatch(entity) -> Tuple[bool, Callable[[Any], dict]]:
+        """
+        :return: whether entity is an edge, and the function converting it to a dictionary
+        """
+        try:
+            return _dispatch_cache[type(entity)]
+        except KeyError:
+            pass
+
+        # if entity has subject + object + predicate, treat as edge
+        if all(hasattr(entity, attr) for attr in ["subject", "object", "predicate"]):
+            is_edge = True
+
+        # if entity has id and name, but not subject/object/predicate, treat as node
+        elif all(hasattr(entity, attr) for attr in ["id", "name"]):
+            is_edge = False
+
+        # otherwise, not a
+        else:
+            raise ValueError(
+                "Can only convert NamedThing or Association entities to KGX compatible dictionaries"
+            )
+
+        dispatch = (is_edge, _entity_converter(type(entity)))
+        _dispatch_cache[type(entity)] = dispatch
+        return dispatch
+
+
+def _entity_converter(cls: type) -> Callable[[Any], dict]:
+    """
+    Generates a function converting instances of cls to a dictionary of
+    their fields, equivalent to dict(model) for pydantic models and to
+    asdict() for dataclasses, where only values that aren't atomic are copied
+    """
+    if isinstance(cls, type) and issubclass(cls, BaseModel):
+        return dict
+    if not is_dataclass(cls):
+        return asdict
+
+    names = [field.name for field in fields(cls)]
+    source = "def convert(entity):\n    return {%s}\n" % ", ".join(
+        f"{name!r}: entity.{name}" for name in names
+    )
+    namespace: Dict[str, Any] = {}
+    exec(compile(source, f"<{cls.__name__} converter>", "exec"), namespace)
+    read_fields = namespace['convert']
+
+    def convert(entity) -> dict:
+        record = read_fields(entity)
+        for name, value in record.items():
+            if not isinstance(value, _ATOMIC_TYPES):
+                record[name] = _copy_value(value)
+        return record
+
+    return convert
+
+
+def _copy_value(value: Any) -> Any:
+    """
+    Copies a field value as asdict() would
+    """
+    if isinstance(value, _ATOMIC_TYPES):
+        return value
+    if is_dataclass(value) and not isinstance(value, type):
+        return asdict(value)
+    if isinstance(value, list):
+        return [_copy_value(item) for item in value]
+    if isinstance(value, dict):
+        return {_copy_value(key): _copy_value(item) for key, item in value.items()}
+    if isinstance(value, tuple) and not hasattr(value, '_fields'):
+        return tuple(_copy_value(item) for item in value)
+    return copy.deepcopy(value)
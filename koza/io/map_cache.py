@@ -0,0 +1,122 @@
+"""
+Caches for loaded maps
+
+Maps loaded in a process are kept in a registry keyed by map_fingerprint,
+so every KozaApp in the process (and worker processes forked from it)
+shares one copy of each map
+
+Maps can also be pickled to an on disk cache, {cache_dir}/{key}.pickle,
+where the key is a hash of the map config, the contents of its input files
+and its transform code, so a cached map is only reused while all three
+are unchanged
+"""
+import gc
+import hashlib
+import logging
+import os
+import pickle
+import uuid
+from pathlib import Path
+from typing import Dict, Mapping, Optional, Union
+
+from koza.model.config.source_config import MapFileConfig
+
+logger = logging.getLogger(__name__)
+
+# part of every cache key, bump when the pickled map classes change
+MAP_CACHE_FORMAT = 2
+
+# maps loaded in this process by map_fingerprint
+_loaded_maps: Dict[str, Mapping] = {}
+
+
+def map_fingerprint(config: MapFileConfig) -> str:
+    """
+    A quick fingerprint of a map config, the size and modification time of
+    its input files and its transform code, for the in process map registry
+    """
+    fingerprint = hashlib.sha256(repr(config).encode())
+    for file in config.files:
+        fingerprint.update(str(file).encode())
+        if Path(file).is_file():
+            stat = os.stat(file)
+            fingerprint.update(f"{stat.st_size} {stat.st_mtime_ns}".encode())
+    if config.transform_code and Path(config.transform_code).exists():
+        fingerprint.update(Path(config.transform_code).read_bytes())
+    return fingerprint.hexdigest()
+
+
+def get_loaded_map(config: MapFileConfig) -> Optional[Mapping]:
+    """
+    :return: the map for config if it was already loaded in this process
+    """
+    return _loaded_maps.get(map_fingerprint(config))
+
+
+def add_loaded_map(config: MapFileConfig, map_dict: Mapping):
+    _loaded_maps[map_fingerprint(config)] = map_dict
+
+
+def clear_loaded_maps():
+    """
+    Releases the maps loaded in this process, KozaApps that
+    are still using a map keep their reference to it
+    """
+    _loaded_maps.clear()
+
+
+def map_cache_key(config: MapFileConfig) -> Optional[str]:
+    """
+    Fingerprint of a map config, its input files and its transform code
+
+    :param config: the map config
+    :return: hex digest, or None when an input file is not a local file
+    """
+    fingerprint = hashlib.sha256(f"{MAP_CACHE_FORMAT} {config!r}".encode())
+    files = list(config.files)
+    if config.transform_code and Path(config.transform_code).exists():
+        files.append(config.transform_code)
+    for file in files:
+        if not Path(file).is_file():
+            logger.debug(f"Not caching map {config.name}, {file} is not a local file")
+            return None
+        with open(file, 'rb') as file_fh:
+            for chunk in iter(lambda: file_fh.read(1024 * 1024), b''):
+                fingerprint.update(chunk)
+    return fingerprint.hexdigest()
+
+
+def load_cached_map(cache_dir: Union[str, os.PathLike], key: str):
+    """
+    :return: the cached map for key, or None when there is no cache entry
+    """
+    cache_file = Path(cache_dir) / f"{key}.pickle"
+    if not cache_file.exists():
+        return None
+    # a map is millions of small objects that the cyclic gc would
+    # otherwise repeatedly scan while they are unpickled
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        with open(cache_file, 'rb') as cache_fh:
+            return pickle.load(cache_fh)
+    except (EOFError, pickle.UnpicklingError, AttributeError, ImportError) as error:
+        # a truncated file, or a pickle of a class that was since renamed or moved
+        logger.warning(f"Ignoring unreadable map cache {cache_file}: {error}")
+        return None
+    finally:
+        if gc_enabled:
+            gc.enable()
+
+
+def save_cached_map(cache_dir: Union[str, os.PathLike], key: str, map_dict):
+    """
+    Writes a map to the cache, through a temporary file that is moved into
+    place so concurrent runs never read a partial cache entry
+    """
+    Path(cache_dir).mkdir(parents=True, exist_ok=True)
+    cache_file = Path(cache_dir) / f"{key}.pickle"
+    tmp_file = Path(cache_dir) / f"{key}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_file, 'wb') as tmp_fh:
+        pickle.dump(map_dict, tmp_fh, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_file, cache_file)
@@ -0,0 +1,147 @@
+"""
+Helpers for reading sources in column batches rather than row dictionaries
+
+A batch is a pyarrow RecordBatch when pyarrow is installed, otherwise
+a dictionary of column names to NumPy arrays
+"""
+from operator import eq, ge, gt, le, lt, ne
+from typing import Any, Dict, List, Sequence
+
+from koza.model.config.source_config import ColumnFilter, FieldType, FilterInclusion
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+except ImportError:
+    pa = None
+    pc = None
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+def check_batch_support():
+    if pa is None and np is None:
+        raise ImportError("Batch mode requires pyarrow or numpy to be installed")
+
+
+def build_batch(columns: Dict[str, Sequence[str]], field_type_map: Dict[str, FieldType]) -> Any:
+    """
+    Builds a column batch from stripped string values, coerced using field_type_map
+
+    :param columns: Dictionary of column names to lists of string values
+    :param field_type_map: A dictionary of field names and their type (using the FieldType enum)
+    :return: pyarrow.RecordBatch or Dict[str, numpy.ndarray]
+    """
+    check_batch_support()
+    if pa is not None:
+        arrays = []
+        for field, values in columns.items():
+            array = pa.array(values, type=pa.string())
+            if field_type_map[field] == FieldType.int:
+                array = pc.cast(array, pa.int64())
+            elif field_type_map[field] == FieldType.float:
+                array = pc.cast(array, pa.float64())
+            arrays.append(array)
+        return pa.RecordBatch.from_arrays(arrays, names=list(columns.keys()))
+    else:
+        batch = {}
+        for field, values in columns.items():
+            if field_type_map[field] == FieldType.int:
+                batch[field] = np.array(values).astype(np.int64)
+            elif field_type_map[field] == FieldType.float:
+                batch[field] = np.array(values).astype(np.float64)
+            else:
+                batch[field] = np.array(values, dtype=object)
+        return batch
+
+
+def batch_num_rows(batch: Any) -> int:
+    if pa is not None and isinstance(batch, pa.RecordBatch):
+        return batch.num_rows
+    return len(next(iter(batch.values()))) if batch else 0
+
+
+def _comparable_values(values: List, numeric: bool) -> List:
+    """
+    The values of an 'in' filter that can be equal to the values of a numeric
+    or string column, as with RowFilter where 1 is not in ['1'] and '1' is not in [1]
+    """
+    if numeric:
+        return [value for value in values if isinstance(value, (int, float))]
+    return [value for value in values if isinstance(value, str)]
+
+
+def _pyarrow_is_in(column: Any, values: List) -> Any:
+    """
+    Matches the values of an 'in' filter, as a value set of the column type
+    """
+    numeric = pa.types.is_integer(column.type) or pa.types.is_floating(column.type)
+    values = _comparable_values(values, numeric)
+    try:
+        value_set = pa.array(values, type=column.type)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        # eg floats or booleans for an int column, compared as floats
+        column = pc.cast(column, pa.float64())
+        value_set = pa.array([float(value) for value in values], type=pa.float64())
+    return pc.is_in(column, value_set=value_set)
+
+
+def filter_batch(batch: Any, filters: List[ColumnFilter]) -> Any:
+    """
+    Applies column filters to a batch as a vectorized mask,
+    keeping the same rows as RowFilter.include_row
+    """
+    if not filters:
+        return batch
+
+    if pa is not None and isinstance(batch, pa.RecordBatch):
+        operators = {
+            'gt': pc.greater,
+            'ge': pc.greater_equal,
+            'lt': pc.less,
+            'le': pc.less_equal,
+            'eq': pc.equal,
+            'ne': pc.not_equal,
+            'in': _pyarrow_is_in,
+        }
+        mask = None
+        column_filter: ColumnFilter
+        for column_filter in filters:
+            if column_filter.column not in batch.schema.names:
+                return batch.slice(0, 0)
+            column = batch.column(column_filter.column)
+            match = operators[column_filter.filter_code](column, column_filter.value)
+            if column_filter.inclusion == FilterInclusion.exclude:
+                match = pc.invert(match)
+            # null values never match a filter
+            match = pc.fill_null(match, False)
+            mask = match if mask is None else pc.and_(mask, match)
+        return batch.filter(mask)
+
+    else:
+        operators = {
+            'gt': gt,
+            'ge': ge,
+            'lt': lt,
+            'le': le,
+            'eq': eq,
+            'ne': ne,
+            'in': lambda column, value: np.isin(
+                column, _comparable_values(value, column.dtype != object)
+            ),
+        }
+        mask = np.ones(batch_num_rows(batch), dtype=bool)
+        for column_filter in filters:
+            if column_filter.column not in batch:
+                mask[:] = False
+                break
+            match = operators[column_filter.filter_code](
+                batch[column_filter.column], column_filter.value
+            )
+            if column_filter.inclusion == FilterInclusion.exclude:
+                match = ~match
+            mask &= match
+        return {field: values[mask] for field, values in batch.items()}
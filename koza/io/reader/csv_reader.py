@@ -2,6 +2,7 @@ import logging
 from csv import reader
 from typing import IO, Any, Dict, Iterator, List, Union
 
+from koza.io.reader.columnar import build_batch
 from koza.model.config.source_config import FieldType, HeaderMode
 
 LOG = logging.getLogger(__name__)
@@ -45,7 +46,7 @@ class CSVReader:
         io_str: IO[str],
         field_type_map: Dict[str, FieldType] = None,
         delimiter: str = ",",
-        header: Union[int, HeaderMode] = HeaderMode.infer,
+        header: Union[int, HeaderMode, List[str]] = HeaderMode.infer,
         header_delimiter: str = None,
         dialect: str = "excel",
         skip_blank_lines: bool = True,
@@ -65,6 +66,8 @@ class CSVReader:
                        if 'infer' will use the first non-empty and uncommented line
                        if 'none' will use the user supplied columns in field_type_map keys,
                            if field_type_map is None this will raise a ValueError
+                       a list of column names is used as an already parsed header,
+                       eg when the file is read in byte ranges that start after the header
 
         :param header_delimiter: delimiter for the header row, default = self.delimiter
         :param dialect: csv dialect, default=excel
@@ -93,6 +96,11 @@ class CSVReader:
 
         self._header = None
 
+        # used by __next__, set by _set_converters
+        self._fields = None
+        self._converters = None
+        self._column_indices = None
+
         if delimiter == '\\s':
             delimiter = ' '
 
@@ -108,6 +116,49 @@ class CSVReader:
         if not self._header:
             self._set_header()
 
+        row = self._next_row()
+
+        if self._column_indices is not None:
+            row = [row[index] for index in self._column_indices]
+
+        # if we've made it here we can convert a row to a dict, stripping each
+        # value and coercing it with the converter resolved in _set_converters
+        return {
+            field: field_value.strip() if converter is None else converter(field_value.strip())
+            for field, converter, field_value in zip(self._fields, self._converters, row)
+        }
+
+    def next_batch(self, batch_size: int) -> Any:
+        """
+        Reads up to batch_size rows as a column batch, a pyarrow RecordBatch
+        or a dictionary of NumPy arrays (see koza.io.reader.columnar)
+
+        Values are stripped and coerced using self.field_type_map per column
+        rather than per row, raises StopIteration when no rows are left
+        """
+        if not self._header:
+            self._set_header()
+
+        rows = []
+        try:
+            while len(rows) < batch_size:
+                rows.append(self._next_row())
+        except StopIteration:
+            if not rows:
+                raise
+
+        column_indices = self._column_indices or range(len(self._fields))
+        columns = {
+            field: [row[index].strip() for row in rows]
+            for field, index in zip(self._fields, column_indices)
+        }
+        return build_batch(columns, self.field_type_map)
+
+    def _next_row(self) -> List[str]:
+        """
+        Reads the next row as a list of values, skipping blank and
+        commented lines and checking the row length against the header
+        """
         try:
             if self.line_count == self.row_limit:
                 raise StopIteration
@@ -139,10 +190,6 @@ class CSVReader:
         # to determine what to do here
         fields_len = len(self._header)
         row_len = len(row)
-        stripped_row = [val.strip() for val in row]
-
-        # if we've made it here we can convert a row to a dict
-        field_map = dict(zip(self._header, stripped_row))
 
         if fields_len > row_len:
             raise ValueError(
@@ -160,18 +207,7 @@ class CSVReader:
             #     self.field_type_map['extra_cols'] = FieldType.str
             # field_map['extra_cols'] = row[fields_len:]
 
-        typed_field_map = {}
-
-        for field, field_value in field_map.items():
-            # Take the value and coerce it using self.field_type_map (field: FieldType)
-            # FIELD_TYPE is map of the field_type enum to the python
-            # to built-in type or custom extras defined in the source config
-            try:
-                typed_field_map[field] = FIELDTYPE_CLASS[self.field_type_map[field]](field_value)
-            except KeyError as key_error:
-                LOG.warning(key_error)
-
-        return typed_field_map
+        return row
 
     def _set_header(self):
         if isinstance(self.header, int):
@@ -185,6 +221,13 @@ class CSVReader:
             else:
                 self.field_type_map = {field: FieldType.str for field in self._header}
 
+        elif isinstance(self.header, list):
+            self._header = self.header
+            if self.field_type_map:
+                self._compare_headers_to_supplied_columns()
+            else:
+                self.field_type_map = {field: FieldType.str for field in self._header}
+
         elif self.header == 'infer':
             self._header = self._parse_header_line(skip_blank_or_commented_lines=True)
             LOG.info(f"headers for {self.name} parsed as {self._header}")
@@ -202,6 +245,33 @@ class CSVReader:
                     f"configure the 'columns' property in the source yaml"
                 )
 
+        self._set_converters()
+
+    def _set_converters(self):
+        """
+        Resolves the type converter for each column from self.field_type_map (field: FieldType)
+        once, rather than per row. FIELDTYPE_CLASS maps the field_type enum to the python
+        built-in type, str columns get no converter since they only need stripping.
+
+        Columns without a configured type are left out of the rows
+        """
+        fields = []
+        converters = []
+        column_indices = []
+        for index, field in enumerate(self._header):
+            if field not in self.field_type_map:
+                LOG.warning(f"No type configured for column {field} in {self.name}, skipping")
+                continue
+            field_type = FIELDTYPE_CLASS[self.field_type_map[field]]
+            fields.append(field)
+            converters.append(None if field_type is str else field_type)
+            column_indices.append(index)
+
+        self._fields = tuple(fields)
+        self._converters = tuple(converters)
+        if len(column_indices) < len(self._header):
+            self._column_indices = tuple(column_indices)
+
     def _parse_header_line(self, skip_blank_or_commented_lines: bool = False) -> List[str]:
         """
         Parse the header line and return a list of headers
@@ -1,5 +1,6 @@
 import json, yaml
 import logging
+import re
 from typing import IO, Any, Dict, Iterator, List, Union
 #from xmlrpc.client import Boolean
 
@@ -20,6 +21,7 @@ class JSONReader:
         name: str = 'json file',
         is_yaml: bool = False,
         row_limit: int = None,
+        streaming: bool = False,
     ):
         """
         :param io_str: Any IO stream that yields a string
@@ -28,13 +30,22 @@ class JSONReader:
         :param row_limit: integer number of non-header rows to process
         :param iterate_over: todo
         :param name: todo
+        :param streaming: parse the document incrementally, reading one element of
+                          the list at json_path at a time (json only, see JSONStream)
         """
         self.io_str = io_str
         self.required_properties = required_properties
         self.json_path = json_path
         self.name = name
+        self._rows = None
 
-
+        if streaming:
+            if is_yaml:
+                raise ValueError("Streaming is only supported for json files")
+            self._rows = iter(JSONStream(self.io_str, self.json_path))
+            self._line_num = 0
+            self._line_limit = row_limit if row_limit else None
+            return
 
         if self.json_path:
             if is_yaml:
@@ -53,12 +64,13 @@ class JSONReader:
             self._len = len(self.json_obj)
             self._line_num = 0
         else:
+            # a single object is a single row, as with JSONStream
             self.json_obj = [self.json_obj]
-            self._len = 0
+            self._len = 1
             self._line_num = 0
 
         if row_limit:
-            self._line_limit = row_limit
+            self._line_limit = min(row_limit, self._len)
         else:
             self._line_limit = self._len
 
@@ -71,7 +83,14 @@ class JSONReader:
             LOG.info(f"Finished processing {self.name}")
             raise StopIteration
 
-        next_obj = self.json_obj[self._line_num]
+        if self._rows is not None:
+            try:
+                next_obj = next(self._rows)
+            except StopIteration:
+                LOG.info(f"Finished processing {self.name}")
+                raise
+        else:
+            next_obj = self.json_obj[self._line_num]
 
         self._line_num += 1
 
@@ -90,3 +109,163 @@ class JSONReader:
                 )
 
         return next_obj
+
+
+class JSONStream:
+    """
+    Incrementally parses a JSON document, yielding the elements of the
+    list found at json_path one at a time, or the single object found there
+
+    Only the current element is held in memory, values outside of json_path
+    are scanned over without being parsed
+    """
+
+    _chunk_size = 1024 * 1024
+    _whitespace = re.compile(r'[ \t\n\r]*')
+    _structural = re.compile(r'["\[\]{}]')
+    _string_special = re.compile(r'["\\]')
+
+    def __init__(self, io_str: IO[str], json_path: List[Union[str, int]] = None):
+        """
+        :param io_str: Any IO stream that yields a string
+        :param json_path: path of object keys and list indices to the rows
+        """
+        self.io_str = io_str
+        self.json_path = json_path or []
+        self._decoder = json.JSONDecoder()
+        self._buffer = ''
+        self._pos = 0
+        self._eof = False
+
+    def __iter__(self) -> Iterator:
+        self._navigate()
+        if self._peek() != '[':
+            yield self._read_value()
+            return
+        self._pos += 1
+        if self._peek() == ']':
+            return
+        while True:
+            yield self._read_value()
+            if self._next_char(',]') == ']':
+                return
+
+    def _navigate(self):
+        """
+        Moves to the value at json_path, raising a KeyError or IndexError
+        like indexing into the loaded document would
+        """
+        for path in self.json_path:
+            if isinstance(path, int):
+                self._next_char('[')
+                if self._peek() == ']':
+                    raise IndexError(path)
+                for _ in range(path):
+                    self._skip_value()
+                    if self._next_char(',]') == ']':
+                        raise IndexError(path)
+            else:
+                self._next_char('{')
+                if self._peek() == '}':
+                    raise KeyError(path)
+                while True:
+                    key = self._read_value()
+                    self._next_char(':')
+                    if key == path:
+                        break
+                    self._skip_value()
+                    if self._next_char(',}') == '}':
+                        raise KeyError(path)
+
+    def _fill(self, size: int = 0) -> bool:
+        """
+        Drops the parsed part of the buffer and reads at least size more characters
+        :return: False if the end of the stream has been reached
+        """
+        if self._eof:
+            return False
+        chunk = self.io_str.read(max(size, self._chunk_size))
+        self._buffer = self._buffer[self._pos :] + chunk
+        self._pos = 0
+        if not chunk:
+            self._eof = True
+        return bool(chunk)
+
+    def _peek(self) -> str:
+        """
+        Skips whitespace and returns the next character without consuming it,
+        or an empty string at the end of the stream
+        """
+        while True:
+            self._pos = self._whitespace.match(self._buffer, self._pos).end()
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            if not self._fill():
+                return ''
+
+    def _next_char(self, expected: str) -> str:
+        char = self._peek()
+        if not char or char not in expected:
+            raise ValueError(f"Expected one of {expected!r} in json stream, found {char!r}")
+        self._pos += 1
+        return char
+
+    def _read_value(self) -> Any:
+        self._peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buffer, self._pos)
+                # a value that ends with the buffer may be incomplete, eg a number
+                if end < len(self._buffer) or self._eof:
+                    self._pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self._eof:
+                    raise
+            # read at least as much again so large values are not re-parsed too often
+            self._fill(len(self._buffer) - self._pos)
+
+    def _skip_value(self):
+        """
+        Scans over the next value without parsing it
+        """
+        if self._peek() not in '[{':
+            self._read_value()
+            return
+        depth = 0
+        in_string = False
+        while True:
+            if self._pos >= len(self._buffer):
+                if not self._fill():
+                    raise ValueError("Unexpected end of json stream")
+            if in_string:
+                match = self._string_special.search(self._buffer, self._pos)
+                if match is None:
+                    self._pos = len(self._buffer)
+                    continue
+                self._pos = match.start()
+                if self._buffer[self._pos] == '\\':
+                    if self._pos + 1 >= len(self._buffer):
+                        # keep the escape character until the next chunk is read
+                        if not self._fill():
+                            raise ValueError("Unexpected end of json stream")
+                        continue
+                    self._pos += 2
+                    continue
+                self._pos += 1
+                in_string = False
+            else:
+                match = self._structural.search(self._buffer, self._pos)
+                if match is None:
+                    self._pos = len(self._buffer)
+                    continue
+                char = match.group()
+                self._pos = match.end()
+                if char == '"':
+                    in_string = True
+                elif char in '[{':
+                    depth += 1
+                else:
+                    depth -= 1
+                    if depth == 0:
+                        return
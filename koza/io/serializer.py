@@ -0,0 +1,85 @@
+"""
+JSON serializers for writing nodes and edges as lines
+
+orjson or msgspec is used when installed, otherwise the json module.
+All of them keep non-ASCII characters as is and serialize pydantic models
+and dataclasses without converting them to dictionaries first
+"""
+import json
+from dataclasses import fields, is_dataclass
+from enum import Enum
+from functools import partial
+from typing import Any, Callable, Dict
+
+from pydantic import BaseModel
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+JSONSerializer = Callable[[Any], str]
+
+
+def _default(obj: Any) -> Any:
+    """
+    Converts the values the serializers don't support natively, one level at a time
+    """
+    if isinstance(obj, BaseModel):
+        return dict(obj)
+    if is_dataclass(obj) and not isinstance(obj, type):
+        return {field.name: getattr(obj, field.name) for field in fields(obj)}
+    if isinstance(obj, (set, frozenset, tuple)):
+        return list(obj)
+    if isinstance(obj, Enum):
+        return obj.value
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def _orjson_serializer() -> JSONSerializer:
+    dumps = orjson.dumps
+
+    def serialize(obj: Any) -> str:
+        return dumps(obj, default=_default).decode()
+
+    return serialize
+
+
+def _msgspec_serializer() -> JSONSerializer:
+    encode = msgspec.json.Encoder(enc_hook=_default).encode
+
+    def serialize(obj: Any) -> str:
+        return encode(obj).decode()
+
+    return serialize
+
+
+def _json_serializer() -> JSONSerializer:
+    return partial(json.dumps, ensure_ascii=False, default=_default)
+
+
+JSON_SERIALIZERS: Dict[str, Callable[[], JSONSerializer]] = {
+    'orjson': _orjson_serializer,
+    'msgspec': _msgspec_serializer,
+    'json': _json_serializer,
+}
+
+
+def get_json_serializer(name: str = None) -> JSONSerializer:
+    """
+    :param name: 'orjson', 'msgspec' or 'json', by default the
+                 first of them that is installed
+    :return: a function serializing an object to a line of JSON (without a newline)
+    """
+    if name is None:
+        name = 'orjson' if orjson else 'msgspec' if msgspec else 'json'
+    if name not in JSON_SERIALIZERS:
+        raise ValueError(f"Unknown JSON serializer: {name}")
+    if (name == 'orjson' and orjson is None) or (name == 'msgspec' and msgspec is None):
+        raise ImportError(f"{name} must be installed to use it as the JSON serializer")
+    return JSON_SERIALIZERS[name]()
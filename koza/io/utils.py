@@ -2,64 +2,415 @@
 """
 Set of functions to manage input and output
 """
+import bz2
 import gzip
-import tempfile
-from io import TextIOWrapper
+import hashlib
+import json
+import lzma
+import mmap
+import os
+import queue
+import shutil
+import struct
+import threading
+import uuid
+import zlib
+from io import BufferedReader, BufferedWriter, RawIOBase, TextIOWrapper
 from os import PathLike
 from pathlib import Path
-from typing import IO, Any, Dict, Union
+from typing import IO, Any, Dict, List, Tuple, Union
 
 import requests
 
+# Faster drop in replacements for the gzip module, if installed
+try:
+    from isal import igzip as gzip_backend
+except ImportError:
+    try:
+        from zlib_ng import gzip_ng as gzip_backend
+    except ImportError:
+        gzip_backend = gzip
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
 ##### Helper Functions for Reader classes #####
 
-def open_resource(resource: Union[str, PathLike]) -> IO[str]:
+COMPRESSION_MAGIC = {
+    'gzip': b'\x1f\x8b',
+    'bz2': b'BZh',
+    'xz': b'\xfd7zXZ\x00',
+    'zstd': b'\x28\xb5\x2f\xfd',
+}
+
+
+def detect_compression(binary_file: IO[bytes]) -> Union[str, None]:
+    """
+    Detects the compression of a seekable binary stream from its magic number,
+    leaving the stream at its current position
+
+    :param binary_file: A binary stream
+    :return: 'gzip', 'bz2', 'xz', 'zstd' or None if not compressed
+    """
+    position = binary_file.tell()
+    magic = binary_file.read(6)
+    binary_file.seek(position)
+    for compression, compression_magic in COMPRESSION_MAGIC.items():
+        if magic.startswith(compression_magic):
+            return compression
+    return None
+
+
+def decompress(binary_file: IO[bytes], compression: str) -> IO[bytes]:
+    """
+    Wraps a binary stream in a decompressing binary stream, using isal or
+    zlib-ng for gzip when either is installed
+    """
+    if compression == 'gzip':
+        return gzip_backend.open(binary_file, 'rb')
+    elif compression == 'bz2':
+        return bz2.open(binary_file, 'rb')
+    elif compression == 'xz':
+        return lzma.open(binary_file, 'rb')
+    elif compression == 'zstd':
+        if zstandard is None:
+            raise ImportError("zstandard must be installed to read zstd compressed files")
+        # outputs are written as several frames (see open_output)
+        return zstandard.ZstdDecompressor().stream_reader(
+            binary_file, read_across_frames=True, closefd=True
+        )
+    else:
+        raise ValueError(f"Unsupported compression: {compression}")
+
+
+class BackgroundReader(RawIOBase):
+    """
+    A read only binary stream that reads from another stream on a background
+    thread, eg so that decompression runs in parallel with parsing
+
+    Chunks are passed through a bounded queue, and the thread stops when
+    the reader is closed
+    """
+
+    def __init__(self, stream: IO[bytes], chunk_size: int = 1024 * 1024, max_chunks: int = 16):
+        self.name = getattr(stream, 'name', None)
+        self._stream = stream
+        self._queue: queue.Queue = queue.Queue(max_chunks)
+        self._stop = threading.Event()
+        self._chunk = memoryview(b'')
+        self._done = False
+        # The thread doesn't reference the reader, so an unclosed reader
+        # can still be garbage collected, which closes it and stops the thread
+        self._thread = threading.Thread(
+            target=BackgroundReader._read,
+            args=(stream, self._queue, self._stop, chunk_size),
+            daemon=True,
+        )
+        self._thread.start()
+
+    @staticmethod
+    def _read(stream: IO[bytes], chunks: queue.Queue, stop: threading.Event, chunk_size: int):
+        def put(item) -> bool:
+            while not stop.is_set():
+                try:
+                    chunks.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        try:
+            while True:
+                chunk = stream.read(chunk_size)
+                if not put(chunk) or not chunk:
+                    return
+        except Exception as e:
+            put(e)
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        while not self._chunk:
+            if self._done:
+                return 0
+            item = self._queue.get()
+            if isinstance(item, Exception):
+                raise item
+            if not item:
+                self._done = True
+                return 0
+            self._chunk = memoryview(item)
+        size = min(len(buffer), len(self._chunk))
+        buffer[:size] = self._chunk[:size]
+        self._chunk = self._chunk[size:]
+        return size
+
+    def close(self):
+        if not self.closed:
+            self._stop.set()
+            self._thread.join()
+            self._stream.close()
+        super().close()
+
+
+class FileRange(RawIOBase):
+    """
+    A read only binary stream over the [start, end) byte range of a local file
+    """
+
+    def __init__(self, path: Union[str, PathLike], start: int, end: int):
+        self.name = str(path)
+        self._file = open(path, 'rb')
+        self._file.seek(start)
+        self._remaining = end - start
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        if self._remaining <= 0:
+            return 0
+        with memoryview(buffer) as view:
+            bytes_read = self._file.readinto(view[: self._remaining])
+        self._remaining -= bytes_read
+        return bytes_read
+
+    def close(self):
+        self._file.close()
+        super().close()
+
+
+def split_resource(
+    resource: Union[str, PathLike], shards: int, start: int = 0
+) -> List[Tuple[int, int]]:
+    """
+    Splits a local uncompressed file into byte ranges aligned to line boundaries
+
+    Ranges are aligned to lines, not csv records, so a file with quoted fields
+    containing newlines must not be split (see Source.split_file)
+
+    :param resource: str or PathLike - local filepath
+    :param shards: int, number of ranges to split the file into, fewer ranges are
+                   returned if the file does not have enough lines
+    :param start: int, byte offset of the first range, eg the end of a header line
+    :return: List of (start, end) byte offsets
+    """
+    size = os.path.getsize(resource)
+    boundaries = [start]
+    with open(resource, 'rb') as resource_fh:
+        for index in range(1, shards):
+            offset = start + (size - start) * index // shards
+            if offset <= boundaries[-1]:
+                continue
+            # move to the start of the line following the offset
+            resource_fh.seek(offset - 1)
+            resource_fh.readline()
+            line_start = resource_fh.tell()
+            if boundaries[-1] < line_start < size:
+                boundaries.append(line_start)
+    return list(zip(boundaries, boundaries[1:] + [size]))
+
+
+def contains_bytes(resource: Union[str, PathLike], value: bytes, start: int = 0) -> bool:
+    """
+    Checks whether a local file contains value after the start byte offset
+    """
+    if os.path.getsize(resource) <= start:
+        return False
+    with open(resource, 'rb') as resource_fh, mmap.mmap(
+        resource_fh.fileno(), 0, access=mmap.ACCESS_READ
+    ) as resource_map:
+        return resource_map.find(value, start) != -1
+
+
+def get_cache_dir() -> Path:
+    """
+    Directory for koza's local caches, set with the KOZA_CACHE_DIR
+    environment variable, default ~/.cache/koza
+    """
+    return Path(os.environ.get('KOZA_CACHE_DIR', Path.home() / '.cache' / 'koza'))
+
+
+class DownloadReader(RawIOBase):
+    """
+    A read only binary stream over a file that is being downloaded by a
+    background thread, reads wait for data that has not arrived yet
+    """
+
+    def __init__(self, path: Path, download: threading.Thread, errors: List[Exception]):
+        self.name = str(path)
+        self._file = open(path, 'rb')
+        self._download = download
+        self._errors = errors
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._file.tell()
+
+    def seek(self, offset: int, whence: int = os.SEEK_SET) -> int:
+        return self._file.seek(offset, whence)
+
+    def readinto(self, buffer) -> int:
+        while True:
+            finished = not self._download.is_alive()
+            bytes_read = self._file.readinto(buffer)
+            if bytes_read:
+                return bytes_read
+            if self._errors:
+                raise self._errors[0]
+            if finished:
+                return 0
+            self._download.join(0.05)
+
+    def close(self):
+        self._file.close()
+        super().close()
+
+
+def fetch_resource(url: str, cache_dir: Union[str, PathLike] = None) -> IO[bytes]:
+    """
+    Downloads a remote file into a local cache keyed by url, or reuses the cached
+    copy when the server reports that it has not changed (ETag / Last-Modified)
+
+    The download is streamed to disk in chunks on a background thread, and the
+    returned stream can be read while the download is still in progress
+
+    :param url: http(s) url of the remote file
+    :param cache_dir: cache directory, default is get_cache_dir()
+    :return: a seekable binary stream of the file contents
+    """
+    download_dir = Path(cache_dir if cache_dir else get_cache_dir()) / 'downloads'
+    download_dir.mkdir(parents=True, exist_ok=True)
+    key = hashlib.sha256(url.encode()).hexdigest()
+    data_path = download_dir / key
+    metadata_path = download_dir / f"{key}.json"
+
+    headers = {}
+    if data_path.exists() and metadata_path.exists():
+        with open(metadata_path, 'r') as metadata_fh:
+            metadata = json.load(metadata_fh)
+        if metadata.get('etag'):
+            headers['If-None-Match'] = metadata['etag']
+        if metadata.get('last_modified'):
+            headers['If-Modified-Since'] = metadata['last_modified']
+
+    response = requests.get(url, headers=headers, stream=True)
+    if response.status_code == 304:
+        response.close()
+        return open(data_path, 'rb')
+    if response.status_code != 200:
+        raise ValueError(f"Remote file returned {response.status_code}: {response.text}")
+
+    # download to a unique file and move it into place once complete,
+    # so concurrent runs never read a partial cache entry
+    part_path = download_dir / f"{key}.{uuid.uuid4().hex}.part"
+    part_path.touch()
+    errors: List[Exception] = []
+
+    metadata_part_path = download_dir / f"{key}.json.{uuid.uuid4().hex}.part"
+
+    def download():
+        try:
+            with response, open(part_path, 'wb') as part_fh:
+                for chunk in response.iter_content(chunk_size=1024 * 1024):
+                    part_fh.write(chunk)
+                    part_fh.flush()
+            # the metadata is written before the data is moved into place and replaced after
+            # it, so an interrupted download leaves the old metadata, which doesn't match the
+            # server and the file is downloaded again
+            with open(metadata_part_path, 'w') as metadata_fh:
+                json.dump(
+                    {
+                        'url': url,
+                        'etag': response.headers.get('ETag'),
+                        'last_modified': response.headers.get('Last-Modified'),
+                    },
+                    metadata_fh,
+                )
+            os.replace(part_path, data_path)
+            os.replace(metadata_part_path, metadata_path)
+        except Exception as e:
+            errors.append(e)
+            for path in [part_path, metadata_part_path]:
+                try:
+                    path.unlink()
+                except FileNotFoundError:
+                    pass
+
+    download_thread = threading.Thread(target=download, daemon=True)
+    # open the partial file before the download can move it into place
+    download_reader = DownloadReader(part_path, download_thread, errors)
+    download_thread.start()
+    return BufferedReader(download_reader)
+
+
+def is_compressed(resource: Union[str, PathLike]) -> bool:
+    """
+    Checks for a known compression magic number at the start of a local file
+    """
+    with open(resource, 'rb') as resource_fh:
+        return detect_compression(resource_fh) is not None
+
+
+def open_resource(
+    resource: Union[str, PathLike],
+    byte_range: Tuple[int, int] = None,
+    background: bool = False,
+) -> IO[str]:
     """
     A generic function for opening a local or remote file
 
-    On remote files - files are written to a temporary file, returned as an IO[str]
-    and then deleted upon closing.  Users of this lib should be encouraged to
-    fetch remote files and store them locally using a more specialized tool
-    wget --timestamping with gmake works great see
+    On remote files - files are streamed to a local cache directory (see fetch_resource)
+    and only downloaded again when they have changed upstream.  Users of this lib
+    may still prefer to fetch remote files and store them locally using a more
+    specialized tool, wget --timestamping with gmake works great see
     https://github.com/monarch-initiative/DipperCache
 
     Currently no plans to support FTP, but note
     that requests does not support FTP (consider ftplib or urllib.request)
 
+    Compressed files (gzip, bz2, xz and zstd) are detected from their magic number
+
     :param resource: str or PathLike - local filepath or remote resource
+    :param byte_range: Optional (start, end) byte offsets, only read this range
+                       of a local uncompressed file (see split_resource)
+    :param background: decompress compressed files on a background thread
     :return: str, next line in resource
 
     """
-    if Path(resource).exists():
-        # Try gzip first
-        try:
-            file = gzip.open(resource, 'rt')
-            file.read(1)
-            file.seek(0)
-        except OSError:
-            file = open(resource, 'r')
-        return file
+    if byte_range and Path(resource).exists():
+        return TextIOWrapper(BufferedReader(FileRange(resource, *byte_range)))
 
-    elif isinstance(resource, str) and resource.startswith('http'):
-        tmp_file = tempfile.TemporaryFile('w+b')
-        request = requests.get(resource)
-        if request.status_code != 200:
-            raise ValueError(f"Remote file returned {request.status_code}: {request.text}")
-        tmp_file.write(request.content)
-        request.close()  # not sure this is needed
-        tmp_file.seek(0)
-        if resource.endswith('gz'):
-            # This should be more robust, either check headers
-            # or use https://github.com/ahupp/python-magic
-            remote_file = gzip.open(tmp_file, 'rt')
-            return remote_file
+    elif Path(resource).exists():
+        return _open_binary(open(resource, 'rb'), background)
 
-        else:
-            return TextIOWrapper(tmp_file)
+    elif isinstance(resource, str) and resource.startswith('http'):
+        return _open_binary(fetch_resource(resource), background)
 
     else:
         raise ValueError(f"Cannot open local or remote file: {resource}")
 
+
+def _open_binary(binary_file: IO[bytes], background: bool = False) -> IO[str]:
+    """
+    Opens a seekable binary stream as text, decompressing it if needed
+    """
+    compression = detect_compression(binary_file)
+    if compression is None:
+        return TextIOWrapper(binary_file)
+    decompressed = decompress(binary_file, compression)
+    if background:
+        decompressed = BufferedReader(BackgroundReader(decompressed))
+    return TextIOWrapper(decompressed)
+
 def check_data(entry, path) -> bool:
     """
     Given a dot delimited JSON tag path,
@@ -85,6 +436,268 @@ def check_data(entry, path) -> bool:
 
 ##### Helper functions for Writer classes #####
 
+# file extension added to output files for each output compression
+COMPRESSION_EXTENSIONS = {
+    'gzip': '.gz',
+    'bgzip': '.gz',
+    'zstd': '.zst',
+}
+
+# the empty block that ends a bgzip file
+BGZF_EOF = bytes.fromhex("1f8b08040000000000ff0600424302001b0003000000000000000000")
+
+
+class BgzfWriter(RawIOBase):
+    """
+    A write only binary stream that compresses to the blocked gzip format (BGZF)
+    used by bgzip, a series of gzip members of at most 64KiB of data each
+    """
+
+    block_size = 0xFF00
+
+    def __init__(self, file: IO[bytes], level: int = None):
+        self.name = getattr(file, 'name', None)
+        self._file = file
+        self._level = level if level is not None else zlib.Z_DEFAULT_COMPRESSION
+        self._buffer = bytearray()
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._buffer += data
+        while len(self._buffer) >= self.block_size:
+            self._file.write(bgzf_block(bytes(self._buffer[: self.block_size]), self._level))
+            del self._buffer[: self.block_size]
+        return len(data)
+
+    def close(self):
+        if not self.closed:
+            if self._buffer:
+                self._file.write(bgzf_block(bytes(self._buffer), self._level))
+            self._file.write(BGZF_EOF)
+            self._file.close()
+        super().close()
+
+
+def bgzf_block(data: bytes, level: int = zlib.Z_DEFAULT_COMPRESSION) -> bytes:
+    """
+    Compresses up to 64KiB of data to a single BGZF block
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+    compressed = compressor.compress(data) + compressor.flush()
+    # BSIZE, the size of the whole block minus one, is stored in the 'BC' extra field
+    header = b'\x1f\x8b\x08\x04\x00\x00\x00\x00\x00\xff\x06\x00BC\x02\x00' + struct.pack(
+        '<H', len(compressed) + 25
+    )
+    footer = struct.pack('<II', zlib.crc32(data), len(data))
+    return header + compressed + footer
+
+
+class BackgroundWriter(RawIOBase):
+    """
+    A write only binary stream that writes to another stream on a background
+    thread, eg so that compression runs in parallel with the transform
+
+    Chunks are passed through a bounded queue, an error in the thread
+    is raised by the next write or by close
+    """
+
+    def __init__(self, stream: IO[bytes], max_chunks: int = 16):
+        self.name = getattr(stream, 'name', None)
+        self._stream = stream
+        self._queue: queue.Queue = queue.Queue(max_chunks)
+        self._errors: List[Exception] = []
+        self._thread = threading.Thread(
+            target=BackgroundWriter._write,
+            args=(stream, self._queue, self._errors),
+            daemon=True,
+        )
+        self._thread.start()
+
+    @staticmethod
+    def _write(stream: IO[bytes], chunks: queue.Queue, errors: List[Exception]):
+        while True:
+            chunk = chunks.get()
+            if chunk is None:
+                break
+            if not errors:
+                try:
+                    stream.write(chunk)
+                except Exception as e:
+                    # keep taking chunks so the writer is never blocked
+                    errors.append(e)
+        try:
+            stream.close()
+        except Exception as e:
+            errors.append(e)
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        if self._errors:
+            raise self._errors[0]
+        # the caller may reuse its buffer
+        self._queue.put(bytes(data))
+        return len(data)
+
+    def close(self):
+        if not self.closed:
+            self._queue.put(None)
+            self._thread.join()
+            super().close()
+            if self._errors:
+                raise self._errors[0]
+
+
+def compress(data: bytes, compression: str, level: int = None) -> bytes:
+    """
+    Compresses data to a complete gzip member, bgzip block or zstd frame
+    """
+    if compression == 'gzip':
+        return gzip.compress(data, level if level is not None else 9, mtime=0)
+    elif compression == 'bgzip':
+        return bgzf_block(data, level if level is not None else zlib.Z_DEFAULT_COMPRESSION)
+    elif compression == 'zstd':
+        return _zstd_compressor(level).compress(data)
+    else:
+        raise ValueError(f"Unsupported output compression: {compression}")
+
+
+def _zstd_compressor(level: int = None):
+    if zstandard is None:
+        raise ImportError("zstandard must be installed to write zstd compressed files")
+    return zstandard.ZstdCompressor(level=level if level is not None else 3)
+
+
+def open_output(
+    file: Union[str, PathLike], compression: str = None, level: int = None, header: str = None
+) -> IO[str]:
+    """
+    Opens an output file for writing text, compressed on a background thread
+    when compression is 'gzip', 'bgzip' or 'zstd'
+
+    :param file: path to the output file
+    :param compression: optional output compression
+    :param level: compression level, the default depends on the compression
+    :param header: optional first line, compressed on its own (as a separate gzip
+                   member, bgzip block or zstd frame) so that merge_output_files
+                   can leave it out of merged shards
+    :return: a writable text stream
+    """
+    if compression is None:
+        output = open(file, 'w')
+        if header:
+            output.write(header)
+        return output
+
+    binary_file = open(file, 'wb')
+    if header:
+        binary_file.write(compress(header.encode(), compression, level))
+
+    if compression == 'gzip':
+        # GzipFile doesn't close a file object it is given
+        gzip_file = (
+            gzip_backend.open(binary_file, 'wb')
+            if level is None
+            else gzip_backend.open(binary_file, 'wb', compresslevel=level)
+        )
+        compressed = _ClosingWriter(gzip_file, binary_file)
+    elif compression == 'bgzip':
+        compressed = BgzfWriter(binary_file, level)
+    elif compression == 'zstd':
+        compressed = _zstd_compressor(level).stream_writer(binary_file, closefd=True)
+    else:
+        binary_file.close()
+        raise ValueError(f"Unsupported output compression: {compression}")
+
+    return TextIOWrapper(
+        BufferedWriter(BackgroundWriter(compressed), buffer_size=1024 * 1024), encoding='utf-8'
+    )
+
+
+class _ClosingWriter(RawIOBase):
+    """
+    Writes to a stream, closing it and then the file under it
+    """
+
+    def __init__(self, stream: IO[bytes], file: IO[bytes]):
+        self._stream = stream
+        self._file = file
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        return self._stream.write(data)
+
+    def close(self):
+        if not self.closed:
+            self._stream.close()
+            self._file.close()
+        super().close()
+
+
+def _first_member_size(binary_file: IO[bytes], compression: str) -> int:
+    """
+    Size of the first gzip member, bgzip block or zstd frame of a file
+    """
+    if compression == 'zstd':
+        if zstandard is None:
+            raise ImportError("zstandard must be installed to merge zstd compressed files")
+        decompressor = zstandard.ZstdDecompressor().decompressobj()
+    else:
+        decompressor = zlib.decompressobj(31)
+    consumed = 0
+    while True:
+        chunk = binary_file.read(64 * 1024)
+        if not chunk:
+            return consumed
+        decompressor.decompress(chunk)
+        consumed += len(chunk)
+        if decompressor.unused_data or getattr(decompressor, 'eof', False):
+            return consumed - len(decompressor.unused_data)
+
+
+def merge_output_files(
+    shard_files: List[Path], output_file: Path, header: bool = False, compression: str = None
+):
+    """
+    Concatenates output files written by separate transform shards into one file
+
+    Compressed shards are concatenated as they are, since gzip members, bgzip
+    blocks and zstd frames can follow each other in one file
+
+    :param shard_files: List of shard output files, in the order they are merged
+    :param output_file: Path to the merged file
+    :param header: True if each shard starts with a header line, in which
+                   case only the header of the first shard is kept
+                   (for compressed shards the header is expected to be
+                   compressed on its own, see open_output)
+    :param compression: the compression of the shards, if any
+    """
+    with open(output_file, 'wb') as output_fh:
+        for index, shard_file in enumerate(shard_files):
+            with open(shard_file, 'rb') as shard_fh:
+                if header and index > 0:
+                    if compression:
+                        shard_fh.seek(_first_member_size(shard_fh, compression))
+                    else:
+                        shard_fh.readline()
+                if compression == 'bgzip' and index < len(shard_files) - 1:
+                    # only the end of the merged file gets an end of file block
+                    start = shard_fh.tell()
+                    end = os.path.getsize(shard_file)
+                    shard_fh.seek(max(end - len(BGZF_EOF), start))
+                    if shard_fh.read() == BGZF_EOF:
+                        end -= len(BGZF_EOF)
+                    with FileRange(shard_file, start, end) as shard_range:
+                        shutil.copyfileobj(shard_range, output_fh)
+                else:
+                    shutil.copyfileobj(shard_fh, output_fh)
+
+
 # Biolink 2.0 "Knowledge Source" association slots,
 # including the deprecated 'provided_by' slot
 provenance_slot_types = {
@@ -103,6 +716,7 @@ column_types = {
     "synonym": list,
     "same_as": list,
     "negated": bool,
+    "xref": list,
     "xrefs": list,
 }
 
@@ -0,0 +1,321 @@
+"""
+De-duplication of nodes by id for another writer
+
+Node ids (or, with the merge policy, whole nodes) are kept in memory up to
+max_nodes, after that they are moved to a temporary sqlite database so memory
+stays bounded while de-duplication stays exact
+"""
+import json
+import logging
+import os
+import sqlite3
+import tempfile
+from typing import Dict, Iterable, Iterator, List, Optional, Union
+
+from koza.converter.kgx_converter import KGXConverter
+from koza.io.serializer import get_json_serializer
+from koza.io.utils import open_output, open_resource
+from koza.io.writer.writer import KozaWriter
+from koza.model.config.source_config import DedupPolicy, OutputFormat
+
+logger = logging.getLogger(__name__)
+
+
+class _SpillDatabase:
+    """
+    A temporary sqlite database, written in a single transaction without a
+    journal since it is deleted when closed
+    """
+
+    def __init__(self, directory: Optional[str], create_table: str):
+        handle, self.path = tempfile.mkstemp(prefix='koza-dedup-', suffix='.sqlite', dir=directory)
+        os.close(handle)
+        self.connection = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+        self.connection.execute('PRAGMA journal_mode = OFF')
+        self.connection.execute('PRAGMA synchronous = OFF')
+        self.connection.execute(create_table)
+        self.connection.execute('BEGIN')
+
+    def close(self):
+        self.connection.close()
+        os.remove(self.path)
+
+
+class NodeIdSet:
+    """
+    An exact set of node ids, in memory up to max_ids and in sqlite after that
+    """
+
+    def __init__(self, max_ids: int = 10_000_000, directory: str = None):
+        self.max_ids = max_ids
+        self.directory = directory
+        self._ids = set()
+        self._database: Optional[_SpillDatabase] = None
+
+    def add(self, node_id: str) -> bool:
+        """
+        :return: True if node_id was not in the set yet
+        """
+        if self._database is None:
+            if node_id in self._ids:
+                return False
+            self._ids.add(node_id)
+            if len(self._ids) >= self.max_ids:
+                self._spill()
+            return True
+        cursor = self._database.connection.execute(
+            'INSERT OR IGNORE INTO ids VALUES (?)', (node_id,)
+        )
+        return cursor.rowcount == 1
+
+    def _spill(self):
+        logger.info(f"More than {self.max_ids} node ids, de-duplicating them on disk")
+        self._database = _SpillDatabase(
+            self.directory, 'CREATE TABLE ids (id TEXT PRIMARY KEY) WITHOUT ROWID'
+        )
+        self._database.connection.executemany(
+            'INSERT INTO ids VALUES (?)', ((node_id,) for node_id in self._ids)
+        )
+        self._ids = set()
+
+    def close(self):
+        if self._database is not None:
+            self._database.close()
+            self._database = None
+
+
+class NodeStore:
+    """
+    Nodes by id in the order they were first added, in memory up to
+    max_nodes and in sqlite after that, merging nodes with the same id
+    """
+
+    def __init__(self, max_nodes: int = 1_000_000, directory: str = None):
+        self.max_nodes = max_nodes
+        self.directory = directory
+        self.conflicts = 0
+        self._nodes: Dict[str, Dict] = {}
+        self._database: Optional[_SpillDatabase] = None
+        self._serialize = get_json_serializer('json')
+
+    def add(self, record: Dict) -> bool:
+        """
+        Adds a node, merging it into the node with the same id if there is one
+
+        :return: True if there was no node with its id yet
+        """
+        node_id = str(record['id'])
+        if self._database is None:
+            existing = self._nodes.get(node_id)
+            if existing is None:
+                self._nodes[node_id] = dict(record)
+                if len(self._nodes) >= self.max_nodes:
+                    self._spill()
+                return True
+            self.merge(existing, record)
+            return False
+
+        connection = self._database.connection
+        row = connection.execute('SELECT record FROM nodes WHERE id = ?', (node_id,)).fetchone()
+        if row is None:
+            connection.execute(
+                'INSERT INTO nodes (id, record) VALUES (?, ?)', (node_id, self._serialize(record))
+            )
+            return True
+        existing = json.loads(row[0])
+        self.merge(existing, record)
+        connection.execute(
+            'UPDATE nodes SET record = ? WHERE id = ?', (self._serialize(existing), node_id)
+        )
+        return False
+
+    def merge(self, existing: Dict, record: Dict):
+        """
+        Merges record into existing, the values of list properties are combined
+        and other properties keep the first value that is not empty
+        """
+        for key, value in record.items():
+            if value is None or value == "" or value == []:
+                continue
+            current = existing.get(key)
+            if current is None or current == "" or current == []:
+                existing[key] = value
+            elif isinstance(current, list):
+                values = value if isinstance(value, (list, set, tuple)) else [value]
+                existing[key] = current + [item for item in values if item not in current]
+            elif current != value:
+                self.conflicts += 1
+
+    def _spill(self):
+        logger.info(f"More than {self.max_nodes} nodes, de-duplicating them on disk")
+        self._database = _SpillDatabase(
+            self.directory,
+            'CREATE TABLE nodes (position INTEGER PRIMARY KEY, id TEXT UNIQUE, record TEXT)',
+        )
+        self._database.connection.executemany(
+            'INSERT INTO nodes (id, record) VALUES (?, ?)',
+            ((node_id, self._serialize(record)) for node_id, record in self._nodes.items()),
+        )
+        self._nodes = {}
+
+    def __iter__(self) -> Iterator[Dict]:
+        if self._database is None:
+            return iter(self._nodes.values())
+        return (
+            json.loads(record)
+            for (record,) in self._database.connection.execute(
+                'SELECT record FROM nodes ORDER BY position'
+            )
+        )
+
+    def close(self):
+        if self._database is not None:
+            self._database.close()
+            self._database = None
+
+
+class DedupWriter(KozaWriter):
+    """
+    Writes each node id once, through another writer
+
+    With the first policy the first node written with an id is kept and
+    later ones are dropped as they are written. With the merge policy nodes
+    with the same id are merged (see NodeStore.merge) and all nodes are
+    written when the writer is finalized. Edges are always written as is
+    """
+
+    def __init__(
+        self,
+        writer: KozaWriter,
+        policy: DedupPolicy = DedupPolicy.first,
+        max_nodes: int = None,
+        directory: str = None,
+    ):
+        """
+        :param writer: the writer to write the de-duplicated nodes and the edges with
+        :param policy: first or merge
+        :param max_nodes: number of node ids (first) or nodes (merge) to keep in memory,
+                          after that they are kept in a temporary sqlite database
+        :param directory: directory for the temporary database, by default the system one
+        """
+        self.writer = writer
+        self.policy = DedupPolicy(policy)
+        self.converter = KGXConverter()
+        self.nodes = 0
+        self.duplicates = 0
+        if self.policy == DedupPolicy.first:
+            self._node_ids = NodeIdSet(max_nodes or 10_000_000, directory)
+        else:
+            self._node_store = NodeStore(max_nodes or 1_000_000, directory)
+
+    def write(self, entities: Iterable):
+        (nodes, edges) = self.converter.split(entities)
+
+        if nodes:
+            self.nodes += len(nodes)
+            if self.policy == DedupPolicy.first:
+                unique_nodes = [node for node in nodes if self._node_ids.add(str(node.id))]
+                self.duplicates += len(nodes) - len(unique_nodes)
+                nodes = unique_nodes
+            else:
+                for node in nodes:
+                    if not self._node_store.add(self.converter.convert_node(node)):
+                        self.duplicates += 1
+                nodes = []
+
+        if nodes or edges:
+            self.writer.write(nodes + edges)
+
+    def write_converted(self, nodes: List[Dict], edges: List[Dict]):
+        if nodes:
+            self.nodes += len(nodes)
+            if self.policy == DedupPolicy.first:
+                unique_nodes = [node for node in nodes if self._node_ids.add(str(node['id']))]
+                self.duplicates += len(nodes) - len(unique_nodes)
+                nodes = unique_nodes
+            else:
+                for node in nodes:
+                    if not self._node_store.add(node):
+                        self.duplicates += 1
+                nodes = []
+
+        if nodes or edges:
+            self.writer.write_converted(nodes, edges)
+
+    def write_node(self, record: Dict):
+        self.write_converted([record], [])
+
+    def write_edge(self, record: Dict):
+        self.writer.write_edge(record)
+
+    def finalize(self):
+        try:
+            if self.policy == DedupPolicy.merge:
+                for record in self._node_store:
+                    self.writer.write_node(record)
+            self.writer.finalize()
+        finally:
+            if self.policy == DedupPolicy.first:
+                self._node_ids.close()
+            else:
+                self._node_store.close()
+                if self._node_store.conflicts:
+                    logger.warning(
+                        f"{self._node_store.conflicts} node properties had conflicting values "
+                        "for the same id, the first value was kept"
+                    )
+        logger.info(
+            f"Wrote {self.nodes - self.duplicates} of {self.nodes} nodes, "
+            f"{self.duplicates} duplicates"
+        )
+
+
+def merge_unique_nodes(
+    shard_files: List[Union[str, os.PathLike]],
+    output_file: Union[str, os.PathLike],
+    output_format: OutputFormat,
+    node_ids: NodeIdSet,
+    compression: str = None,
+    compression_level: int = None,
+) -> int:
+    """
+    Merges tsv or jsonl node files like merge_output_files (koza.io.utils),
+    leaving out the nodes whose id is already in node_ids
+
+    Shards de-duplicated with the first policy keep their first node with
+    each id, so merging them in order keeps the same nodes as a single run
+
+    :param node_ids: ids of the nodes written so far, the ids of the merged nodes are added
+    :return: the number of nodes written
+    """
+    tsv = OutputFormat(output_format) == OutputFormat.tsv
+    header = None
+    if tsv:
+        with open_resource(shard_files[0]) as shard_fh:
+            header = shard_fh.readline()
+
+    rows = 0
+    output_fh = open_output(output_file, compression, compression_level, header=header)
+    try:
+        for shard_file in shard_files:
+            with open_resource(shard_file) as shard_fh:
+                if tsv:
+                    id_index = shard_fh.readline().rstrip('\n').split('\t').index('id')
+                lines = []
+                for line in shard_fh:
+                    if tsv:
+                        node_id = line.rstrip('\n').split('\t', id_index + 1)[id_index]
+                    else:
+                        node_id = str(json.loads(line)['id'])
+                    if node_ids.add(node_id):
+                        lines.append(line)
+                    if len(lines) >= 10000:
+                        output_fh.write(''.join(lines))
+                        rows += len(lines)
+                        lines = []
+                if lines:
+                    output_fh.write(''.join(lines))
+                    rows += len(lines)
+    finally:
+        output_fh.close()
+    return rows
@@ -1,9 +1,11 @@
-import json
 import os
-from typing import Iterable, List, Optional
+from typing import Dict, Iterable, List, Optional
 
 from koza.converter.kgx_converter import KGXConverter
-from koza.io.writer.writer import KozaWriter
+from koza.io.serializer import get_json_serializer
+from koza.io.utils import COMPRESSION_EXTENSIONS, open_output
+from koza.io.writer.writer import KozaWriter, LineBuffer, ShardedLineBuffer, write_manifest
+from koza.model.config.source_config import OutputCompression, OutputShardConfig
 
 
 class JSONLWriter(KozaWriter):
@@ -13,35 +15,90 @@ class JSONLWriter(KozaWriter):
         source_name: str,
         node_properties: List[str],
         edge_properties: Optional[List[str]] = [],
+        batch_size: int = 10000,
+        batch_bytes: int = 4 * 1024 * 1024,
+        compression: OutputCompression = None,
+        compression_level: int = None,
+        json_serializer: str = None,
+        shards: OutputShardConfig = None,
     ):
+        """
+        :param batch_size: number of lines to collect before writing them to a file
+        :param batch_bytes: number of characters to collect before writing them to a file
+        :param compression: optional output compression, done on a background thread
+        :param compression_level: optional compression level
+        :param json_serializer: 'orjson', 'msgspec' or 'json', by default the
+                                fastest one installed (see koza.io.serializer)
+        :param shards: optionally split outputs into numbered files, listed in
+                       {source_name}_manifest.json (see OutputShardConfig)
+        """
 
         self.output_dir = output_dir
         self.source_name = source_name
+        self.compression = OutputCompression(compression).value if compression else None
+        self.compression_level = compression_level
+        self.shards = shards
+        extension = COMPRESSION_EXTENSIONS[self.compression] if self.compression else ""
 
         self.converter = KGXConverter()
+        self.serialize = get_json_serializer(json_serializer)
 
         os.makedirs(output_dir, exist_ok=True)
         if node_properties:
-            self.nodes_file = open(f"{output_dir}/{source_name}_nodes.jsonl", "w")
+            self.nodes_file = self._line_buffer(
+                f"{source_name}_nodes", f".jsonl{extension}", batch_size, batch_bytes
+            )
         if edge_properties:
-            self.edges_file = open(f"{output_dir}/{source_name}_edges.jsonl", "w")
+            self.edges_file = self._line_buffer(
+                f"{source_name}_edges", f".jsonl{extension}", batch_size, batch_bytes
+            )
+
+    def _line_buffer(self, stem: str, suffix: str, batch_size: int, batch_bytes: int):
+        """
+        Opens the output file {stem}{suffix}, or the numbered output files
+        {stem}_NNNNN{suffix} when outputs are sharded
+        """
+        stem = f"{self.output_dir}/{stem}"
+        if self.shards:
+            return ShardedLineBuffer(
+                self._open_output, stem, suffix, self.shards, batch_size, batch_bytes
+            )
+        return LineBuffer(self._open_output(stem + suffix), batch_size, batch_bytes)
+
+    def _open_output(self, file_name: str):
+        return open_output(file_name, self.compression, self.compression_level)
 
     def write(self, entities: Iterable):
 
-        (nodes, edges) = self.converter.convert(entities)
+        # entities are serialized as is, the serializer converts them
+        (nodes, edges) = self.converter.split(entities)
 
+        serialize = self.serialize
         if nodes:
             for n in nodes:
-                node = json.dumps(n, ensure_ascii=False)
-                self.nodes_file.write(node + '\n')
+                self.nodes_file.write(serialize(n) + '\n', n.id)
 
         if edges:
             for e in edges:
-                edge = json.dumps(e, ensure_ascii=False)
-                self.edges_file.write(edge + '\n')
+                self.edges_file.write(serialize(e) + '\n', e.subject)
+
+    def write_node(self, record: Dict):
+        self.nodes_file.write(self.serialize(record) + '\n', record.get('id'))
+
+    def write_edge(self, record: Dict):
+        self.edges_file.write(self.serialize(record) + '\n', record.get('subject'))
 
     def finalize(self):
         if hasattr(self, 'nodes_file'):
             self.nodes_file.close()
-        if hasattr(self, 'edge_file'):
+        if hasattr(self, 'edges_file'):
             self.edges_file.close()
+        if self.shards:
+            write_manifest(
+                self.output_dir,
+                self.source_name,
+                {
+                    'nodes': self.nodes_file.manifest() if hasattr(self, 'nodes_file') else None,
+                    'edges': self.edges_file.manifest() if hasattr(self, 'edges_file') else None,
+                },
+            )
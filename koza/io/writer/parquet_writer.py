@@ -0,0 +1,212 @@
+"""
+Writes nodes and edges to Parquet files, requires pyarrow
+
+Columns are typed from column_types (koza.io.utils), list columns such as
+category, publications and xref are written as lists of strings, boolean
+columns as booleans and everything else as strings
+"""
+import os
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Union
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+from koza.converter.kgx_converter import KGXConverter
+from koza.io.utils import column_types, remove_null
+from koza.io.writer.dedup_writer import NodeIdSet
+from koza.io.writer.tsv_writer import TSVWriter
+from koza.io.writer.writer import KozaWriter
+from koza.model.config.source_config import OutputCompression
+
+# Parquet codecs for output compressions, bgzip only applies to text files
+PARQUET_CODECS = {
+    'gzip': 'gzip',
+    'zstd': 'zstd',
+}
+
+
+def parquet_codec(compression: OutputCompression = None) -> str:
+    """
+    :return: the Parquet codec for an output compression, snappy by default
+    """
+    if not compression:
+        return 'snappy'
+    compression = OutputCompression(compression).value
+    if compression not in PARQUET_CODECS:
+        raise ValueError(f"{compression} compression is not supported for parquet output")
+    return PARQUET_CODECS[compression]
+
+
+class _RowGroupBuffer:
+    """
+    Collects rows column by column and writes them to a Parquet
+    file as a row group once row_group_size rows have been collected
+    """
+
+    def __init__(
+        self,
+        file_name: str,
+        columns: Iterable[str],
+        row_group_size: int,
+        compression: str,
+        compression_level: int = None,
+    ):
+        self.columns = tuple(columns)
+        self.list_columns = {column for column in self.columns if column_types.get(column) is list}
+        self.bool_columns = {column for column in self.columns if column_types.get(column) is bool}
+        self.schema = pa.schema([(column, self._column_type(column)) for column in self.columns])
+        self.row_group_size = row_group_size
+        self._writer = pq.ParquetWriter(
+            file_name, self.schema, compression=compression, compression_level=compression_level
+        )
+        self._values: Dict[str, List[Any]] = {column: [] for column in self.columns}
+        self._rows = 0
+
+    def _column_type(self, column: str):
+        if column in self.list_columns:
+            return pa.list_(pa.string())
+        if column in self.bool_columns:
+            return pa.bool_()
+        return pa.string()
+
+    def write(self, record: Dict):
+        for column in self.columns:
+            self._values[column].append(self._export_value(column, record.get(column)))
+        self._rows += 1
+        if self._rows >= self.row_group_size:
+            self.flush()
+
+    def _export_value(self, column: str, value: Any) -> Any:
+        if value is None:
+            return None
+        if column in self.list_columns:
+            if isinstance(value, (list, set, tuple)):
+                value = remove_null(value)
+                return [str(item) for item in value] if value else None
+            return [str(value)]
+        if column in self.bool_columns:
+            return bool(value)
+        if isinstance(value, (list, set, tuple)):
+            # a list for a column that isn't typed as one, joined as in TSV output
+            value = remove_null(value)
+            return '|'.join(str(item) for item in value) if value else None
+        return str(value)
+
+    def flush(self):
+        if self._rows:
+            self._writer.write_table(
+                pa.Table.from_pydict(self._values, schema=self.schema),
+                row_group_size=self._rows,
+            )
+            self._values = {column: [] for column in self.columns}
+            self._rows = 0
+
+    def close(self):
+        self.flush()
+        self._writer.close()
+
+
+class ParquetWriter(KozaWriter):
+    def __init__(
+        self,
+        output_dir: str,
+        source_name: str,
+        node_properties: List[str],
+        edge_properties: Optional[List[str]] = [],
+        row_group_size: int = 100000,
+        compression: OutputCompression = None,
+        compression_level: int = None,
+    ):
+        """
+        :param row_group_size: number of rows to collect before writing them as a row group
+        :param compression: optional compression, gzip or zstd (snappy by default)
+        :param compression_level: optional compression level
+        """
+        if pa is None:
+            raise ImportError("Parquet output requires pyarrow to be installed")
+
+        self.output_dir = output_dir
+        self.source_name = source_name
+        codec = parquet_codec(compression)
+
+        self.converter = KGXConverter()
+
+        os.makedirs(output_dir, exist_ok=True)
+        if node_properties:
+            self.node_columns = TSVWriter._order_node_columns(node_properties)
+            self.nodes_file = _RowGroupBuffer(
+                f"{output_dir}/{source_name}_nodes.parquet",
+                self.node_columns,
+                row_group_size,
+                codec,
+                compression_level,
+            )
+        if edge_properties:
+            self.edge_columns = TSVWriter._order_edge_columns(edge_properties)
+            self.edges_file = _RowGroupBuffer(
+                f"{output_dir}/{source_name}_edges.parquet",
+                self.edge_columns,
+                row_group_size,
+                codec,
+                compression_level,
+            )
+
+    def write(self, entities: Iterable):
+
+        (nodes, edges) = self.converter.convert(entities)
+
+        if nodes:
+            for node in nodes:
+                self.nodes_file.write(node)
+
+        if edges:
+            for edge in edges:
+                self.edges_file.write(edge)
+
+    def write_node(self, record: Dict):
+        self.nodes_file.write(record)
+
+    def write_edge(self, record: Dict):
+        self.edges_file.write(record)
+
+    def finalize(self):
+        if hasattr(self, 'nodes_file'):
+            self.nodes_file.close()
+        if hasattr(self, 'edges_file'):
+            self.edges_file.close()
+
+
+def merge_parquet_files(
+    shard_files: List[Union[str, os.PathLike]],
+    output_file: Union[str, os.PathLike],
+    compression: OutputCompression = None,
+    compression_level: int = None,
+    node_ids: NodeIdSet = None,
+):
+    """
+    Merges the Parquet outputs of a sharded transform into a single file,
+    row group by row group
+
+    :param node_ids: for node files, the ids of the nodes written so far
+                     rows with those ids are left out
+    """
+    schema = pq.read_schema(shard_files[0])
+    with pq.ParquetWriter(
+        Path(output_file),
+        schema,
+        compression=parquet_codec(compression),
+        compression_level=compression_level,
+    ) as writer:
+        for shard_file in shard_files:
+            parquet_file = pq.ParquetFile(shard_file)
+            for row_group in range(parquet_file.num_row_groups):
+                table = parquet_file.read_row_group(row_group)
+                if node_ids is not None:
+                    unique = [node_ids.add(str(node_id)) for node_id in table['id'].to_pylist()]
+                    table = table.filter(pa.array(unique, type=pa.bool_()))
+                writer.write_table(table)
@@ -4,13 +4,21 @@
 # - May want to rename to KGXWriter at some point, if we develop writers for other models non biolink/kgx specific
 
 import os
-from typing import Dict, Iterable, List, Optional, Set
+from functools import partial
+from typing import Dict, Iterable, List, Optional, Set, Tuple
 
 from ordered_set import OrderedSet
 
 from koza.converter.kgx_converter import KGXConverter
-from koza.io.utils import build_export_row
-from koza.io.writer.writer import KozaWriter
+from koza.io.utils import (
+    COMPRESSION_EXTENSIONS,
+    _sanitize_export_property,
+    column_types,
+    open_output,
+    remove_null,
+)
+from koza.io.writer.writer import KozaWriter, LineBuffer, ShardedLineBuffer, write_manifest
+from koza.model.config.source_config import OutputCompression, OutputShardConfig
 
 
 class TSVWriter(KozaWriter):
@@ -20,9 +28,26 @@ class TSVWriter(KozaWriter):
         source_name: str,
         node_properties: List[str],
         edge_properties: Optional[List[str]] = [],
+        batch_size: int = 10000,
+        batch_bytes: int = 4 * 1024 * 1024,
+        compression: OutputCompression = None,
+        compression_level: int = None,
+        shards: OutputShardConfig = None,
     ):
+        """
+        :param batch_size: number of rows to collect before writing them to a file
+        :param batch_bytes: number of characters to collect before writing them to a file
+        :param compression: optional output compression, done on a background thread
+        :param compression_level: optional compression level
+        :param shards: optionally split outputs into numbered files, listed in
+                       {source_name}_manifest.json (see OutputShardConfig)
+        """
         self.dirname = output_dir
         self.basename = source_name
+        self.compression = OutputCompression(compression) if compression else None
+        self.compression_level = compression_level
+        self.shards = shards
+        extension = COMPRESSION_EXTENSIONS[self.compression.value] if self.compression else ""
 
         self.delimiter = "\t"
         self.list_delimiter = "|"
@@ -34,27 +59,42 @@ class TSVWriter(KozaWriter):
 
         if node_properties:
             self.node_properties = node_properties
-            self.nodes_file_basename = f"{self.basename}_nodes.tsv"
+            self.nodes_file_basename = f"{self.basename}_nodes.tsv{extension}"
             self.ordered_node_columns = TSVWriter._order_node_columns(self.node_properties)
+            self._node_columns = tuple(self.ordered_node_columns)
+            self._node_id_index = (
+                self._node_columns.index("id") if "id" in self._node_columns else None
+            )
 
             # Create and write to nodes output file
             self.nodes_file_name = os.path.join(
                 self.dirname if self.dirname else "", self.nodes_file_basename
             )
-            self.NFH = open(self.nodes_file_name, "w")
-            self.NFH.write(self.delimiter.join(self.ordered_node_columns) + "\n")
+            self.NFH = self._line_buffer(
+                f"{self.basename}_nodes",
+                f".tsv{extension}",
+                self.ordered_node_columns,
+                batch_size,
+                batch_bytes,
+            )
 
         if edge_properties:
             self.edge_properties = edge_properties
-            self.edges_file_basename = f"{self.basename}_edges.tsv"
+            self.edges_file_basename = f"{self.basename}_edges.tsv{extension}"
             self.ordered_edge_columns = TSVWriter._order_edge_columns(self.edge_properties)
+            self._edge_columns = tuple(self.ordered_edge_columns)
 
             # Create and write to edges output file
             self.edges_file_name = os.path.join(
                 self.dirname if self.dirname else "", self.edges_file_basename
             )
-            self.EFH = open(self.edges_file_name, "w")
-            self.EFH.write(self.delimiter.join(self.ordered_edge_columns) + "\n")
+            self.EFH = self._line_buffer(
+                f"{self.basename}_edges",
+                f".tsv{extension}",
+                self.ordered_edge_columns,
+                batch_size,
+                batch_bytes,
+            )
 
     def write(self, entities: Iterable):
         """
@@ -79,15 +119,12 @@ class TSVWriter(KozaWriter):
         record: Dict
             A node record
         """
-        row = build_export_row(record, list_delimiter=self.list_delimiter)
-        row["id"] = record["id"]
-        values = []
-        for c in self.ordered_node_columns:
-            if c in row:
-                values.append(str(row[c]))
-            else:
-                values.append("")
-        self.NFH.write(self.delimiter.join(values) + "\n")
+        values = self._export_values(record, self._node_columns)
+        # the node id is written as is, rather than sanitized
+        node_id = str(record["id"])
+        if self._node_id_index is not None:
+            values[self._node_id_index] = node_id
+        self.NFH.write(self.delimiter.join(values) + "\n", node_id)
 
     def write_edge(self, record: Dict) -> None:
         """
@@ -97,23 +134,87 @@ class TSVWriter(KozaWriter):
         record: Dict
             An edge record
         """
-        row = build_export_row(record, list_delimiter=self.list_delimiter)
+        self.EFH.write(
+            self.delimiter.join(self._export_values(record, self._edge_columns)) + "\n",
+            record.get("subject"),
+        )
+
+    def _line_buffer(
+        self, stem: str, suffix: str, columns: Iterable[str], batch_size: int, batch_bytes: int
+    ):
+        """
+        Opens the output file {stem}{suffix}, or the numbered output files
+        {stem}_NNNNN{suffix} when outputs are sharded
+        """
+        stem = os.path.join(self.dirname if self.dirname else "", stem)
+        if self.shards:
+            return ShardedLineBuffer(
+                partial(self._open_output, columns=columns),
+                stem,
+                suffix,
+                self.shards,
+                batch_size,
+                batch_bytes,
+            )
+        return LineBuffer(self._open_output(stem + suffix, columns), batch_size, batch_bytes)
+
+    def _open_output(self, file_name: str, columns: Iterable[str]):
+        """
+        Opens an output file and writes its header line
+        """
+        return open_output(
+            file_name,
+            self.compression.value if self.compression else None,
+            self.compression_level,
+            header=self.delimiter.join(columns) + "\n",
+        )
+
+    def _export_values(self, record: Dict, columns: Tuple[str, ...]) -> List[str]:
+        """
+        Formats the values of a record for the output columns, giving the same
+        result as build_export_row (koza.io.utils) for those columns without
+        sanitizing the properties that aren't written
+
+        Plain strings, the most common values, are sanitized inline, other
+        values go through remove_null and _sanitize_export_property
+        """
         values = []
-        for c in self.ordered_edge_columns:
-            if c in row:
-                values.append(str(row[c]))
-            else:
+        for column in columns:
+            value = record.get(column)
+            if type(value) is str and column_types.get(column) is not bool:
+                if value == "" or value == " ":
+                    values.append("")
+                else:
+                    values.append(value.replace("\n", " ").replace('\\"', "").replace("\t", " "))
+            elif value is None:
                 values.append("")
-        self.EFH.write(self.delimiter.join(values) + "\n")
+            else:
+                value = remove_null(value)
+                if value:
+                    values.append(
+                        str(_sanitize_export_property(column, value, self.list_delimiter))
+                    )
+                else:
+                    values.append("")
+        return values
 
     def finalize(self):
         """
-        Close file handles and create an archive if compression mode is defined.
+        Write any buffered rows and close file handles.
         """
         if hasattr(self, 'NFH'):
             self.NFH.close()
         if hasattr(self, 'EFH'):
             self.EFH.close()
+        if self.shards:
+            write_manifest(
+                self.dirname,
+                self.basename,
+                {
+                    'nodes': self.NFH.manifest() if hasattr(self, 'NFH') else None,
+                    'edges': self.EFH.manifest() if hasattr(self, 'EFH') else None,
+                },
+            )
 
     @staticmethod
     def _order_node_columns(cols: Set) -> OrderedSet:
@@ -1,5 +1,12 @@
+import json
+import os
+import queue
+import threading
+import zlib
 from abc import ABC, abstractmethod
-from typing import Iterable
+from typing import IO, Callable, Dict, Iterable, List, Optional, Tuple
+
+from koza.model.config.source_config import OutputShardConfig
 
 
 class KozaWriter(ABC):
@@ -18,3 +25,237 @@ class KozaWriter(ABC):
     @abstractmethod
     def finalize(self):
         pass
+
+    @abstractmethod
+    def write_node(self, record: Dict):
+        """
+        Writes a node that is already converted to a dictionary (see KGXConverter)
+        """
+        pass
+
+    @abstractmethod
+    def write_edge(self, record: Dict):
+        """
+        Writes an edge that is already converted to a dictionary (see KGXConverter)
+        """
+        pass
+
+    def write_converted(self, nodes: List[Dict], edges: List[Dict]):
+        """
+        Writes nodes and edges that are already converted to dictionaries,
+        eg by KGXConverter.convert
+        """
+        for node in nodes:
+            self.write_node(node)
+        for edge in edges:
+            self.write_edge(edge)
+
+
+class LineBuffer:
+    """
+    Collects serialized lines for an output file and writes them
+    with a single write() call once batch_size lines or batch_bytes
+    characters have been collected, or when flushed
+    """
+
+    def __init__(self, file: IO[str], batch_size: int = 10000, batch_bytes: int = 4 * 1024 * 1024):
+        """
+        :param file: An open output file
+        :param batch_size: number of lines to collect before writing
+        :param batch_bytes: number of characters to collect before writing
+        """
+        self.file = file
+        self.batch_size = batch_size
+        self.batch_bytes = batch_bytes
+        self._lines: List[str] = []
+        self._size = 0
+
+    def write(self, line: str, key: str = None):
+        """
+        :param line: the line to write
+        :param key: unused, see ShardedLineBuffer
+        """
+        self._lines.append(line)
+        self._size += len(line)
+        if len(self._lines) >= self.batch_size or self._size >= self.batch_bytes:
+            self.flush()
+
+    def flush(self):
+        if self._lines:
+            self.file.write(''.join(self._lines))
+            self._lines = []
+            self._size = 0
+
+    def close(self):
+        self.flush()
+        self.file.close()
+
+
+def shard_file_name(stem: str, suffix: str, index: int) -> str:
+    """
+    :return: the name of a numbered output file, eg {name}_edges_00003.tsv.gz
+    """
+    return f"{stem}_{index:05d}{suffix}"
+
+
+class ShardedLineBuffer:
+    """
+    A LineBuffer over numbered output files (see OutputShardConfig)
+
+    Lines go to the current file until it has max_rows lines or max_bytes
+    characters, or with partitions to the file chosen by the crc32 of their
+    key. The rows written to each file are listed by manifest()
+    """
+
+    def __init__(
+        self,
+        open_file: Callable[[str], IO[str]],
+        stem: str,
+        suffix: str,
+        shards: OutputShardConfig,
+        batch_size: int = 10000,
+        batch_bytes: int = 4 * 1024 * 1024,
+    ):
+        """
+        :param open_file: opens a file by name for writing (and writes its header)
+        :param stem: file name up to the shard number
+        :param suffix: file name after the shard number
+        """
+        self.open_file = open_file
+        self.stem = stem
+        self.suffix = suffix
+        self.shards = shards
+        self.batch_size = batch_size
+        self.batch_bytes = batch_bytes
+        self.files: List[str] = []
+        self.rows: List[int] = []
+        self._buffers: List[LineBuffer] = []
+        self._size = 0
+        for _ in range(shards.partitions or 1):
+            self._open_next()
+
+    def _open_next(self):
+        file_name = shard_file_name(self.stem, self.suffix, len(self.files))
+        self._buffers.append(
+            LineBuffer(self.open_file(file_name), self.batch_size, self.batch_bytes)
+        )
+        self.files.append(file_name)
+        self.rows.append(0)
+        self._size = 0
+
+    def write(self, line: str, key: str = None):
+        if self.shards.partitions:
+            index = zlib.crc32(str(key).encode()) % self.shards.partitions
+        else:
+            index = len(self._buffers) - 1
+            if self.rows[index] and (
+                (self.shards.max_rows and self.rows[index] >= self.shards.max_rows)
+                or (self.shards.max_bytes and self._size + len(line) > self.shards.max_bytes)
+            ):
+                # files are closed once full so only one is open at a time
+                self._buffers[index].close()
+                self._open_next()
+                index += 1
+            self._size += len(line)
+        self._buffers[index].write(line)
+        self.rows[index] += 1
+
+    def manifest(self) -> List[Dict]:
+        return [
+            {'file': os.path.basename(file_name), 'rows': rows}
+            for file_name, rows in zip(self.files, self.rows)
+        ]
+
+    def close(self):
+        if self.shards.partitions:
+            buffers = self._buffers
+        else:
+            buffers = self._buffers[-1:]
+        for buffer in buffers:
+            buffer.close()
+
+
+def write_manifest(output_dir: str, source_name: str, outputs: Dict[str, Optional[List[Dict]]]):
+    """
+    Writes {source_name}_manifest.json, listing the files of each sharded
+    output (nodes, edges) with the number of rows in each
+    """
+    manifest = {output: files for output, files in outputs.items() if files is not None}
+    with open(os.path.join(output_dir, f"{source_name}_manifest.json"), 'w') as manifest_fh:
+        json.dump(manifest, manifest_fh, indent=2)
+
+
+class ThreadedWriter(KozaWriter):
+    """
+    Runs another writer on a background thread, so converting and writing
+    entities overlaps with the transform
+
+    Entities from batch_size write() calls are passed to the thread at a time
+    through a queue of at most queue_size batches, so a slow writer blocks
+    the transform instead of letting memory grow. An error in the writer is
+    raised by the next write() or by finalize(). Entities are written after
+    write() returns, so they must not be modified once they are written
+    """
+
+    def __init__(self, writer: KozaWriter, queue_size: int = 16, batch_size: int = 1000):
+        """
+        :param writer: the writer to run on the background thread
+        :param queue_size: number of batches that can wait to be written
+        :param batch_size: number of write() calls to pass to the thread at a time
+        """
+        self.writer = writer
+        self.batch_size = batch_size
+        self._batch: List[Tuple[Callable, tuple]] = []
+        self._queue: queue.Queue = queue.Queue(queue_size)
+        self._errors: List[Exception] = []
+        self._thread = threading.Thread(target=self._write_batches, daemon=True)
+        self._thread.start()
+
+    def _write_batches(self):
+        while True:
+            batch = self._queue.get()
+            if batch is None:
+                break
+            if self._errors:
+                # keep taking batches so write() is never blocked
+                continue
+            try:
+                for write, args in batch:
+                    write(*args)
+            except Exception as e:
+                self._errors.append(e)
+
+    def write(self, entities: Iterable):
+        self._add(self.writer.write, (entities,))
+
+    def write_converted(self, nodes: List[Dict], edges: List[Dict]):
+        self._add(self.writer.write_converted, (nodes, edges))
+
+    def write_node(self, record: Dict):
+        self._add(self.writer.write_node, (record,))
+
+    def write_edge(self, record: Dict):
+        self._add(self.writer.write_edge, (record,))
+
+    def _add(self, write: Callable, args: tuple):
+        if self._errors:
+            raise self._errors[0]
+        self._batch.append((write, args))
+        if len(self._batch) >= self.batch_size:
+            self._queue.put(self._batch)
+            self._batch = []
+
+    def finalize(self):
+        """
+        Waits for the queued entities to be written and finalizes the writer
+        """
+        if self._batch:
+            self._queue.put(self._batch)
+            self._batch = []
+        self._queue.put(None)
+        self._thread.join()
+        try:
+            self.writer.finalize()
+        finally:
+            if self._errors:
+                raise self._errors[0]
@@ -8,7 +8,14 @@ import os
 import typer
 
 from koza.cli_runner import transform_source, validate_file
-from koza.model.config.source_config import FormatType, OutputFormat
+from koza.model.config.source_config import (
+    DedupPolicy,
+    FormatType,
+    OutputCompression,
+    OutputFormat,
+    OutputShardConfig,
+    ValidationConfig,
+)
 
 typer_app = typer.Typer()
 
@@ -30,6 +37,51 @@ def transform(
     row_limit: int = typer.Option(
         None, help="Number of rows to process (if skipped, processes entire source file)"
     ),
+    workers: int = typer.Option(
+        None,
+        help="Number of worker processes, maps are loaded concurrently and input files (split "
+        "into byte ranges when there are more workers than files) are transformed in parallel",
+    ),
+    map_cache_dir: str = typer.Option(
+        None,
+        help="Directory to cache loaded maps in, maps are rebuilt only when their config, "
+        "input files or transform code change",
+    ),
+    compression: OutputCompression = typer.Option(
+        None, help="Compress output files, compression is done on a background thread"
+    ),
+    compression_level: int = typer.Option(None, help="Compression level for --compression"),
+    background_write: bool = typer.Option(
+        False,
+        help="Convert and write output on a background thread, so writing overlaps with the "
+        "transform",
+    ),
+    dedup_nodes: DedupPolicy = typer.Option(
+        None,
+        help="Write each node id once, keeping the first node (first) or merging the "
+        "properties of all nodes with the id (merge). With workers, only first is "
+        "supported",
+    ),
+    shard_rows: int = typer.Option(
+        None, help="Split outputs into numbered files of at most this many rows"
+    ),
+    shard_bytes: int = typer.Option(
+        None,
+        help="Split outputs into numbered files of at most this many (uncompressed) characters",
+    ),
+    partitions: int = typer.Option(
+        None,
+        help="Split outputs into this many numbered files by a hash of the node id or edge subject",
+    ),
+    validate_sample: float = typer.Option(
+        None, help="Validate this fraction (0 to 1) of the written entities against --schema"
+    ),
+    validate_first: int = typer.Option(
+        None, help="Validate only the first this many written entities against --schema"
+    ),
+    validation_workers: int = typer.Option(
+        None, help="Number of worker processes validating batches of entities against --schema"
+    ),
     quiet: bool = typer.Option(False, help="Optional quiet mode - set true to suppress output"),
     debug: bool = typer.Option(
         False, help="Optional debug mode - set true for additional debug output"
@@ -57,7 +109,25 @@ def transform(
         output_path.mkdir(parents=True)
 
     transform_source(
-        source, output_dir, output_format, global_table, local_table, schema, row_limit
+        source,
+        output_dir,
+        output_format,
+        global_table,
+        local_table,
+        schema,
+        row_limit,
+        workers,
+        map_cache_dir,
+        compression,
+        compression_level,
+        background_write,
+        dedup_nodes,
+        OutputShardConfig(shard_rows, shard_bytes, partitions)
+        if shard_rows or shard_bytes or partitions
+        else None,
+        ValidationConfig(validate_sample, validate_first, validation_workers)
+        if validate_sample or validate_first or validation_workers
+        else None,
     )
 
 
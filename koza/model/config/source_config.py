@@ -29,6 +29,19 @@ class MapErrorEnum(str, Enum):
     error = 'error'
 
 
+class MapMode(str, Enum):
+    """
+    Enum for how a key/values map is stored in memory
+    dict stores a dictionary of the value columns per key, compact
+    stores the values of each key positionally (see CompactMapDict),
+    lazy only indexes the file and reads values on lookup (see LazyMapDict)
+    """
+
+    dict = 'dict'
+    compact = 'compact'
+    lazy = 'lazy'
+
+
 class FormatType(str, Enum):
     """
     Enum for supported file types
@@ -92,18 +105,43 @@ class OutputFormat(str, Enum):
     tsv = 'tsv'
     jsonl = 'jsonl'
     kgx = 'kgx'
+    parquet = 'parquet'
+
+
+class OutputCompression(str, Enum):
+    """
+    Output compressions, bgzip is gzip compatible and written
+    in independent blocks (eg for indexing with tabix)
+    """
+
+    gzip = 'gzip'
+    bgzip = 'bgzip'
+    zstd = 'zstd'
+
+
+class DedupPolicy(str, Enum):
+    """
+    How nodes written more than once with the same id are de-duplicated,
+    first keeps the first node, merge combines the properties of all of them
+    """
+
+    first = 'first'
+    merge = 'merge'
 
 
 class TransformMode(str, Enum):
     """
     Configures how an external transform file is processed
-    flat uses importlib and watches for a StopIteration
-    exception, loop runs the code once and expects that
-    a for loop is being used to iterate over a file
+    flat compiles the file once, runs it per row and watches for
+    a StopIteration exception, loop runs the code once and expects
+    that a for loop is being used to iterate over a file, batch
+    works like flat but runs the code per batch of rows read
+    as columns (csv only, requires pyarrow or numpy)
     """
 
     flat = 'flat'
     loop = 'loop'
+    batch = 'batch'
 
 
 class HeaderMode(str, Enum):
@@ -123,6 +161,48 @@ class ColumnFilter:
     value: Union[StrictInt, StrictFloat, StrictStr, List[Union[StrictInt, StrictFloat, StrictStr]]]
 
 
+@dataclass(frozen=True)
+class OutputShardConfig:
+    """
+    Splits each output into numbered files, either rolling over to the next
+    file after max_rows rows or max_bytes characters, or partitioning rows
+    into partitions files by a hash of their id (nodes) or subject (edges)
+    """
+
+    max_rows: int = None
+    max_bytes: int = None
+    partitions: int = None
+
+    def __post_init__(self):
+        if self.partitions and (self.max_rows or self.max_bytes):
+            raise ValueError("Outputs can be partitioned or rolled over by size, not both")
+        if not (self.partitions or self.max_rows or self.max_bytes):
+            raise ValueError("One of max_rows, max_bytes or partitions is required")
+
+
+@dataclass(frozen=True)
+class ValidationConfig:
+    """
+    Limits schema validation to a sample of the written entities, either
+    the first first entities or a sample_rate fraction of them (or the sample
+    of the first entities with both), validated in batches of batch_size in
+    workers processes when workers is more than one
+    """
+
+    sample_rate: float = None
+    first: int = None
+    workers: int = None
+    batch_size: int = 1000
+
+    def __post_init__(self):
+        if self.sample_rate is not None and not 0 < self.sample_rate <= 1:
+            raise ValueError("The validation sample rate must be more than 0 and at most 1")
+        if self.first is not None and self.first < 1:
+            raise ValueError("The number of entities to validate must be at least 1")
+        if self.batch_size < 1:
+            raise ValueError("The validation batch size must be at least 1")
+
+
 @dataclass(frozen=True)
 class DatasetDescription:
     """
@@ -163,6 +243,9 @@ class SourceConfig:
     https://docs.python.org/3/library/stdtypes.html#str.split
 
     required_properties: A list of required top level properties in a json object
+
+    json_streaming: parse json files incrementally, reading one element of the
+    list at json_path at a time instead of loading the whole document
     """
 
     name: str
@@ -179,8 +262,10 @@ class SourceConfig:
     skip_blank_lines: bool = True
     filters: List[ColumnFilter] = field(default_factory=list)
     json_path: List[Union[StrictStr, StrictInt]] = None
+    json_streaming: bool = False
     transform_code: str = None
     transform_mode: TransformMode = TransformMode.flat
+    batch_size: int = 10000
     global_table: Union[str, Dict] = None
     local_table: Union[str, Dict] = None
 
@@ -277,6 +362,18 @@ class SourceConfig:
                 "either set format to jsonl or change properties to columns in the config"
             )
 
+        if self.json_streaming and self.format != FormatType.json:
+            raise ValueError(
+                "json_streaming has been configured but format is not json\n"
+                "either set format to json or remove json_streaming in the configuration"
+            )
+
+        if self.transform_mode == TransformMode.batch and self.format != FormatType.csv:
+            raise ValueError(
+                "batch transform mode has been configured but format is not csv\n"
+                "either set format to csv or change the transform mode to flat or loop"
+            )
+
         if self.columns and self.format != FormatType.csv:
             raise ValueError(
                 "columns have been configured but format is not csv\n"
@@ -322,7 +419,16 @@ class PrimaryFileConfig(SourceConfig):
 
 @dataclass(config=PydanticConfig)
 class MapFileConfig(SourceConfig):
+    """
+    key and values configure a declarative map, map_mode configures
+    how it is stored in memory (maps built by custom code are always dicts)
+
+    lazy_cache_size: the number of recently looked up values a lazy map keeps
+    """
+
     key: str = None
     values: List[str] = None
     curie_prefix: str = None
     add_curie_prefix_to_columns: List[str] = None
+    map_mode: MapMode = MapMode.dict
+    lazy_cache_size: int = 100000
@@ -1,14 +1,407 @@
+import hashlib
+import json
+import logging
+import os
+import pickle
+import sys
+import uuid
+from collections import Counter
+from collections.abc import Mapping, MutableMapping
+from functools import lru_cache, partial
+from pathlib import Path
+from time import perf_counter
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
 from koza.exceptions import MapItemException
+from koza.io.reader.csv_reader import CSVReader
+from koza.io.utils import get_cache_dir, is_compressed
+from koza.model.config.source_config import FormatType, MapFileConfig
+from koza.row_filter import RowFilter
+
+LOG = logging.getLogger(__name__)
+
+
+class MapStats:
+    """
+    Lookup counters for a map
+
+    Every lookup and miss is counted, and one in sample_interval lookups
+    is timed to estimate the total time spent in lookups. Missing keys are
+    counted individually for up to max_missing_keys distinct keys
+    """
+
+    sample_interval = 1000
+    max_missing_keys = 100000
+
+    def __init__(self):
+        self.lookups = 0
+        self.misses = 0
+        self.missing_keys = Counter()
+        self.sampled_lookups = 0
+        self.sampled_time = 0.0
+
+    def lookup(self, get: Callable[[Any], Any], key, map_name: str = None):
+        """
+        Counts a lookup of key with get, a KeyError from get is
+        counted as a miss and raised as a MapItemException
+        """
+        self.lookups += 1
+        try:
+            if self.lookups % self.sample_interval:
+                return get(key)
+            return self.timed(get, key)
+        except KeyError as key_error:
+            raise self.miss(key, key_error, map_name)
+
+    def timed(self, get: Callable[[Any], Any], key):
+        start = perf_counter()
+        try:
+            return get(key)
+        finally:
+            self.sampled_lookups += 1
+            self.sampled_time += perf_counter() - start
+
+    def miss(self, key, key_error: KeyError, map_name: str = None) -> MapItemException:
+        """
+        Counts a missing key
+
+        :return: the MapItemException to raise for the KeyError
+        """
+        self.misses += 1
+        if key in self.missing_keys or len(self.missing_keys) < self.max_missing_keys:
+            self.missing_keys[key] += 1
+        map_item_exception = MapItemException(*key_error.args)
+        map_item_exception.map_name = map_name
+        return map_item_exception
+
+    @property
+    def lookup_time(self) -> float:
+        """
+        Estimated seconds spent in lookups
+        """
+        if not self.sampled_lookups:
+            return 0.0
+        return self.sampled_time / self.sampled_lookups * self.lookups
+
+    def summary(self, map_name: str, top_n: int = 10) -> str:
+        hit_rate = (self.lookups - self.misses) / self.lookups if self.lookups else 0.0
+        summary = (
+            f"Map {map_name}: {self.lookups} lookups, {hit_rate:.2%} hit rate, "
+            f"{self.misses} misses, {self.lookup_time:.3f}s in lookups (estimated)"
+        )
+        if self.missing_keys:
+            top_missing = ', '.join(
+                f"{key} ({count})" for key, count in self.missing_keys.most_common(top_n)
+            )
+            summary += f"\nMost frequently missing keys in {map_name}: {top_missing}"
+        return summary
 
 
 class MapDict(dict):
     """
     A custom dictionary that raises a special KeyError exception
     MapItemException
+
+    Lookups are counted in stats (see MapStats)
     """
 
+    name: Optional[str] = None
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stats = MapStats()
+
     def __getitem__(self, key):
+        # MapStats.lookup inlined, since this is called for every lookup in every row
+        stats = self.stats
+        stats.lookups += 1
         try:
-            return super().__getitem__(key)
+            if stats.lookups % stats.sample_interval:
+                return _dict_getitem(self, key)
+            return stats.timed(partial(_dict_getitem, self), key)
         except KeyError as key_error:
-            raise MapItemException(*key_error.args)
+            raise stats.miss(key, key_error, self.name)
+
+
+_dict_getitem = dict.__getitem__
+
+
+class _Missing:
+    """
+    Placeholder for value columns that were missing from a row
+    """
+
+    def __reduce__(self):
+        # unpickles as the module level instance
+        return '_MISSING'
+
+
+_MISSING = _Missing()
+
+
+class CompactMapDict(MutableMapping):
+    """
+    A memory compact alternative to MapDict for key/values maps
+
+    Instead of a dictionary per key, the values of each entry are stored
+    positionally as a tuple in the order of value_columns (or as the bare
+    value when there is a single value column), with string values interned
+    so repeated values such as taxon ids are stored once. Looking up a key
+    returns a new dictionary of the value columns, so koza_map[key]['entrez']
+    works as it does with MapDict, and missing keys raise MapItemException
+    """
+
+    name: Optional[str] = None
+
+    def __init__(self, value_columns: List[str]):
+        self.value_columns = tuple(value_columns)
+        self._entries: Dict[Any, Any] = {}
+        self.stats = MapStats()
+
+    def __getitem__(self, key) -> Dict[str, Any]:
+        return self.stats.lookup(self._get, key, self.name)
+
+    def _get(self, key) -> Dict[str, Any]:
+        entry = self._entries[key]
+        if len(self.value_columns) == 1:
+            entry = (entry,)
+        return {
+            column: value
+            for column, value in zip(self.value_columns, entry)
+            if value is not _MISSING
+        }
+
+    def get(self, key, default=None):
+        # like dict.get for MapDict, neither counted as a lookup nor a miss
+        if key in self._entries:
+            return self._get(key)
+        return default
+
+    def __setitem__(self, key, value: Dict[str, Any]):
+        entry = tuple(
+            sys.intern(column_value) if type(column_value) is str else column_value
+            for column_value in (value.get(column, _MISSING) for column in self.value_columns)
+        )
+        self._entries[key] = entry[0] if len(entry) == 1 else entry
+
+    def __delitem__(self, key):
+        del self._entries[key]
+
+    def __contains__(self, key) -> bool:
+        return key in self._entries
+
+    def __iter__(self) -> Iterator:
+        return iter(self._entries)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class _LineSource:
+    """
+    An iterator of lines that a csv reader can be pointed at different
+    parts of a file through, by replacing lines
+    """
+
+    def __init__(self):
+        self.lines: Iterator[str] = iter(())
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> str:
+        return next(self.lines)
+
+
+class LazyMapDict(Mapping):
+    """
+    A map for key/values maps that only reads values when a key is looked up
+
+    On creation each file is indexed once, from key to the byte offset of its
+    row. The index is saved in index_dir (the map cache directory), by default
+    {get_cache_dir()}/map-indexes, so later runs only need to load it. Looking up a key seeks to its row and
+    parses it, the most recently used values are kept in an LRU cache. When a
+    key appears more than once the same row is used as for MapDict.
+
+    Supports local uncompressed csv and jsonl files (see supports_config)
+    """
+
+    def __init__(self, config: MapFileConfig, index_dir: str = None):
+        self.config = config
+        self.index_dir = index_dir
+        self.name = config.name
+        self.value_columns = tuple(config.values)
+        self.stats = MapStats()
+        self._index: Dict[Any, int] = {}
+        self._headers: List[Optional[List[str]]] = [None] * len(config.files)
+        files = len(config.files)
+        # Source reads files from last to first, so rows in earlier files take precedence
+        for file_index in reversed(range(files)):
+            offsets, self._headers[file_index] = self._load_index(config.files[file_index])
+            # the file and offset of each row are packed into a single int
+            self._index.update(
+                (key, offset * files + file_index) for key, offset in offsets.items()
+            )
+        self._open()
+
+    @staticmethod
+    def supports_config(config: MapFileConfig) -> bool:
+        return config.format in [FormatType.csv, FormatType.jsonl] and all(
+            Path(file).is_file() and not is_compressed(file) for file in config.files
+        )
+
+    def __getitem__(self, key) -> Dict[str, Any]:
+        return self.stats.lookup(self._get, key, self.name)
+
+    def _get(self, key) -> Dict[str, Any]:
+        return self._read_value(self._index[key])
+
+    def get(self, key, default=None):
+        # like dict.get for MapDict, neither counted as a lookup nor a miss
+        if key in self._index:
+            return self._get(key)
+        return default
+
+    def __contains__(self, key) -> bool:
+        return key in self._index
+
+    def __iter__(self) -> Iterator:
+        return iter(self._index)
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def __getstate__(self):
+        return {
+            'config': self.config,
+            'index_dir': self.index_dir,
+            '_index': self._index,
+            '_headers': self._headers,
+        }
+
+    def __setstate__(self, state):
+        self.config = state['config']
+        self.index_dir = state.get('index_dir')
+        self.name = self.config.name
+        self.stats = MapStats()
+        self.value_columns = tuple(self.config.values)
+        self._index = state['_index']
+        self._headers = state['_headers']
+        self._open()
+
+    def _open(self):
+        self._files = [open(file, 'rb') for file in self.config.files]
+        self._readers = []
+        for header in self._headers:
+            if header is None:
+                self._readers.append(None)
+                continue
+            line_source = _LineSource()
+            self._readers.append((line_source, self._csv_reader(line_source, header)))
+        self._read_value = lru_cache(maxsize=self.config.lazy_cache_size)(self._read_row)
+
+    def _read_row(self, position: int) -> Dict[str, Any]:
+        offset, file_index = divmod(position, len(self._files))
+        file_fh = self._files[file_index]
+        file_fh.seek(offset)
+        if self.config.format == FormatType.jsonl:
+            row = json.loads(file_fh.readline())
+        else:
+            line_source, csv_reader = self._readers[file_index]
+            line_source.lines = (line.decode() for line in file_fh)
+            row = next(csv_reader)
+        return {key: value for key, value in row.items() if key in self.value_columns}
+
+    def _csv_reader(self, lines: Iterator[str], header) -> CSVReader:
+        return CSVReader(
+            lines,
+            name=self.config.name,
+            field_type_map=dict(self.config.field_type_map),
+            delimiter=self.config.delimiter,
+            header_delimiter=self.config.header_delimiter,
+            header=header,
+            comment_char=self.config.comment_char,
+        )
+
+    def _load_index(self, file: Path) -> Tuple[Dict[Any, int], Optional[List[str]]]:
+        """
+        Loads the saved index of a file if it is still current, otherwise builds it
+        and saves it, unless the index directory isn't writable
+
+        :return: tuple of the key to byte offset index and the parsed csv header
+        """
+        index_dir = Path(self.index_dir) if self.index_dir else get_cache_dir() / 'map-indexes'
+        # keyed by the path of the file and the map config
+        index_key = hashlib.sha256(f"{Path(file).resolve()}\n{self.config!r}".encode()).hexdigest()
+        index_file = index_dir / f"{index_key[:32]}.index"
+        stat = os.stat(file)
+        if index_file.exists():
+            try:
+                with open(index_file, 'rb') as index_fh:
+                    index = pickle.load(index_fh)
+                if (index['size'], index['mtime_ns']) == (stat.st_size, stat.st_mtime_ns):
+                    return index['offsets'], index['header']
+            except (EOFError, pickle.UnpicklingError, KeyError, ValueError) as error:
+                LOG.warning(f"Rebuilding unreadable map index {index_file}: {error}")
+
+        offsets, header = self._build_index(file)
+        # written to a temporary file that is moved into place, so concurrent
+        # runs never read a partial index
+        tmp_file = index_dir / f"{index_key[:32]}.{uuid.uuid4().hex}.tmp"
+        try:
+            index_dir.mkdir(parents=True, exist_ok=True)
+            with open(tmp_file, 'wb') as index_fh:
+                pickle.dump(
+                    {
+                        'size': stat.st_size,
+                        'mtime_ns': stat.st_mtime_ns,
+                        'offsets': offsets,
+                        'header': header,
+                    },
+                    index_fh,
+                    protocol=pickle.HIGHEST_PROTOCOL,
+                )
+            os.replace(tmp_file, index_file)
+        except OSError as os_error:
+            LOG.warning(f"Could not save map index {index_file}: {os_error}")
+            if tmp_file.exists():
+                tmp_file.unlink()
+        return offsets, header
+
+    def _build_index(self, file: Path) -> Tuple[Dict[Any, int], Optional[List[str]]]:
+        key_column = self.config.key
+        row_filter = RowFilter(self.config.filters)
+        offsets = {}
+        position = 0
+
+        def read_lines():
+            # track the bytes read so rows can be found again by offset
+            nonlocal position
+            with open(file, 'rb') as file_fh:
+                for line in file_fh:
+                    position += len(line)
+                    yield line
+
+        if self.config.format == FormatType.jsonl:
+            for line in read_lines():
+                offset = position - len(line)
+                if not line.strip():
+                    continue
+                row = json.loads(line)
+                if row_filter.include_row(row):
+                    offsets[row[key_column]] = offset
+            return offsets, None
+
+        csv_reader = self._csv_reader((line.decode() for line in read_lines()), self.config.header)
+        csv_reader._set_header()
+        while True:
+            # a row starts where the previous one ended, blank and commented lines
+            # in between are skipped again when the row is read
+            offset = position
+            try:
+                row = next(csv_reader)
+            except StopIteration:
+                break
+            if row_filter.include_row(row):
+                offsets[row[key_column]] = offset
+        return offsets, csv_reader._header
@@ -1,15 +1,21 @@
-from typing import Any, Dict, Iterator, List, Optional, Union
+import logging
+import os
+from pathlib import Path
+from typing import IO, Any, Dict, Iterator, List, Optional, Tuple, Union
 
 import yaml
 
+from koza.io.reader.columnar import batch_num_rows, filter_batch
 from koza.io.reader.csv_reader import CSVReader
 from koza.io.reader.json_reader import JSONReader
 from koza.io.reader.jsonl_reader import JSONLReader
-from koza.io.utils import open_resource
+from koza.io.utils import contains_bytes, open_resource, split_resource
 from koza.io.yaml_loader import UniqueIncludeLoader
 from koza.model.config.source_config import MapFileConfig, PrimaryFileConfig, SourceConfig
 from koza.row_filter import RowFilter
 
+logger = logging.getLogger(__name__)
+
 
 class Source:
     """
@@ -21,10 +27,18 @@ class Source:
     config: Source config
     reader: An iterator that takes in an IO[str] as its first argument
     and yields a dictionary
+    byte_range: Optional (start, end) byte offsets to read from each file,
+    used to split one large file across processes (see split_file)
+    header: Optional already parsed csv header, for byte ranges that start
+    after the header line
     """
 
     def __init__(
-        self, config: Union[PrimaryFileConfig, MapFileConfig], row_limit: Optional[int] = None
+        self,
+        config: Union[PrimaryFileConfig, MapFileConfig],
+        row_limit: Optional[int] = None,
+        byte_range: Optional[Tuple[int, int]] = None,
+        header: Optional[List[str]] = None,
     ):
 
         self.config = config
@@ -32,10 +46,12 @@ class Source:
         self._filter = RowFilter(config.filters)
         self._reader = None
         self._readers: List = []
+        self._resources: List[IO[str]] = []
         self.last_row: Optional[Dict] = None
 
         for file in config.files:
-            resource_io = open_resource(file)
+            resource_io = open_resource(file, byte_range, background=True)
+            self._resources.append(resource_io)
             if self.config.format == 'csv':
                 self._readers.append(
                     CSVReader(
@@ -44,7 +60,7 @@ class Source:
                         field_type_map=config.field_type_map,
                         delimiter=config.delimiter,
                         header_delimiter=config.header_delimiter,
-                        header=config.header,
+                        header=header if header else config.header,
                         comment_char=self.config.comment_char,
                         row_limit=self.row_limit,
                     )
@@ -67,6 +83,7 @@ class Source:
                         required_properties=config.required_properties,
                         is_yaml=(self.config.format == 'yaml'),
                         row_limit=self.row_limit,
+                        streaming=self.config.json_streaming,
                     )
                 )
             else:
@@ -88,8 +105,38 @@ class Source:
                 row = self._get_row()
         return row
 
+    def close(self):
+        """
+        Closes the files of the source, which also stops their background readers
+        """
+        for resource_io in self._resources:
+            resource_io.close()
+        self._resources = []
+
+    def next_batch(self) -> Any:
+        """
+        Reads the next config.batch_size rows as a column batch, a pyarrow
+        RecordBatch or a dictionary of NumPy arrays, with filters applied as
+        a vectorized mask (see koza.io.reader.columnar)
+        """
+        if self._reader is None:
+            self._reader = self._readers.pop()
+        while True:
+            try:
+                batch = self._reader.next_batch(self.config.batch_size)
+            except StopIteration as si:
+                if len(self._readers) == 0:
+                    raise si
+                self._reader = self._readers.pop()
+                continue
+            if self._filter.filters:
+                batch = filter_batch(batch, self._filter.filters)
+                if batch_num_rows(batch) == 0:
+                    continue
+            return batch
+
     def _get_row(self):
-        if self._filter:
+        if self._filter.filters:
             row = next(self._reader)
             while not self._filter.include_row(row):
                 # TODO log filtered out lines
@@ -99,3 +146,55 @@ class Source:
         # Retain the most recent row so that it can be logged alongside validation errors
         self.last_row = row
         return row
+
+    @staticmethod
+    def split_file(
+        config: Union[PrimaryFileConfig, MapFileConfig], file: Union[str, Path], shards: int
+    ) -> Tuple[List[Tuple[int, int]], Optional[List[str]]]:
+        """
+        Splits a local uncompressed csv or jsonl file into line aligned byte ranges
+
+        For csv files the header is parsed once, the ranges start after the
+        header line and the parsed header is returned so that it can be
+        shared by every range. Ranges are aligned to lines, so a csv file
+        with a quote character after its header, which could be a quoted field
+        containing a newline, is not split and returned as a single range
+
+        :param config: Source config
+        :param file: path to a file in config.files
+        :param shards: number of byte ranges to split the file into
+        :return: tuple of (start, end) byte ranges and the parsed csv header
+        """
+        if config.format == 'jsonl':
+            return split_resource(file, shards), None
+
+        elif config.format == 'csv':
+            header_end = 0
+
+            def read_lines():
+                # track the bytes read so the range can start after the header
+                nonlocal header_end
+                with open(file, 'rb') as file_fh:
+                    for line in file_fh:
+                        header_end += len(line)
+                        yield line.decode()
+
+            lines = read_lines()
+            reader = CSVReader(
+                lines,
+                name=config.name,
+                field_type_map=dict(config.field_type_map),
+                delimiter=config.delimiter,
+                header_delimiter=config.header_delimiter,
+                header=config.header,
+                comment_char=config.comment_char,
+            )
+            reader._set_header()
+            lines.close()
+            if contains_bytes(file, b'"', header_end):
+                logger.info(f"Not splitting {file}, it has quoted fields that may contain newlines")
+                return [(header_end, os.path.getsize(file))], reader._header
+            return split_resource(file, shards, header_end), reader._header
+
+        else:
+            raise ValueError(f"Splitting files of type {config.format} is not supported")
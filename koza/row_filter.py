@@ -1,5 +1,5 @@
 from operator import eq, ge, gt, le, lt, ne
-from typing import List
+from typing import Any, Callable, Dict, List
 
 from koza.model.config.source_config import ColumnFilter, FilterInclusion
 
@@ -7,6 +7,9 @@ from koza.model.config.source_config import ColumnFilter, FilterInclusion
 class RowFilter:
     """
     A Filter class that is initialized with a List of column filters, each specifying a column, an operator and a value
+
+    The filters are compiled once into a single predicate that stops
+    evaluating as soon as a row is rejected
     """
 
     def __init__(self, filters: List[ColumnFilter] = None):
@@ -23,34 +26,72 @@ class RowFilter:
             'ne': ne,
             'in': self.inlist,  # not using operator.contains because the it expects opposite argument order
         }
+        self._predicate = self._compile()
 
     def include_row(self, row) -> bool:
         """
         :param row: A dictionary representing a single row
         :return: bool for whether the row should be included
         """
+        return self._predicate(row)
 
-        if not self.filters:
-            return True
+    def inlist(self, column_value, filter_value):
+        return column_value in filter_value
 
-        include_row = True
+    def _compile(self) -> Callable[[Dict[str, Any]], bool]:
+        """
+        Builds a predicate for all filters with the operators and
+        values bound, 'in' lists are converted to frozensets when their values are hashable
+        """
+        if not self.filters:
+            return lambda row: True
 
+        checks = []
         column_filter: ColumnFilter
         for column_filter in self.filters:
-            # None can't be greater, less than or equal to any specified value, right?
-            if row.get(column_filter.column) is None:
-                return False
+            if column_filter.filter_code == 'in':
+                comparison_method = self._compile_inlist(column_filter.value)
+            else:
+                comparison_method = self.operators[column_filter.filter_code]
+            checks.append(
+                (
+                    column_filter.column,
+                    comparison_method,
+                    column_filter.value,
+                    column_filter.inclusion == FilterInclusion.include,
+                )
+            )
+        checks = tuple(checks)
 
-            include = column_filter.inclusion == FilterInclusion('include')
-            exclude = column_filter.inclusion == FilterInclusion('exclude')
+        def predicate(row) -> bool:
+            for column, comparison_method, value, include in checks:
+                column_value = row.get(column)
+                # None can't be greater, less than or equal to any specified value, right?
+                if column_value is None:
+                    return False
+                comparison_match = comparison_method(column_value, value)
+                if include:
+                    if not comparison_match:
+                        return False
+                elif comparison_match:
+                    return False
+            return True
 
-            comparison_method = self.operators.get(column_filter.filter_code)
-            comparison_match = comparison_method(row.get(column_filter.column), column_filter.value)
+        return predicate
 
-            if (include and not comparison_match) or (exclude and comparison_match):
-                include_row = False
+    @staticmethod
+    def _compile_inlist(filter_value: List) -> Callable[[Any, Any], bool]:
+        try:
+            filter_set = frozenset(filter_value)
+        except TypeError:
+            # unhashable filter values, eg nested lists, are compared one by one
+            return lambda column_value, _: column_value in filter_value
 
-        return include_row
+        def inlist(column_value, _) -> bool:
+            try:
+                return column_value in filter_set
+            except TypeError:
+                # unhashable column values, eg lists in json rows
+                return column_value in filter_value
 
-    def inlist(self, column_value, filter_value):
-        return column_value in filter_value
+        return inlist
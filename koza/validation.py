@@ -0,0 +1,228 @@
+"""
+Validation of written entities against a LinkML schema
+
+Generating the json schema of a LinkML schema is slow, so it is done once
+per schema and process and shared by every KozaApp validating against it
+(see get_schema_validator). The json schema validator of each class is
+compiled once, rather than per validated record as in linkml_validator
+"""
+import json
+import logging
+import random
+from collections import Counter, defaultdict
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import jsonschema
+from jsonschema.validators import validator_for
+from linkml.generators.jsonschemagen import JsonSchemaGenerator
+from linkml_runtime.utils.formatutils import camelcase
+
+from koza.model.config.source_config import ValidationConfig
+
+logger = logging.getLogger(__name__)
+
+# (entity class name, schema class, record) of a record to validate
+ValidationItem = Tuple[str, str, Dict]
+
+# SchemaValidator by schema, see get_schema_validator
+_schema_validators: Dict[str, 'SchemaValidator'] = {}
+
+
+def get_schema_validator(schema: str) -> 'SchemaValidator':
+    """
+    Returns the SchemaValidator for schema, creating it the first time
+    schema is used in this process
+
+    Worker processes forked after a schema is loaded inherit its validator
+    """
+    try:
+        return _schema_validators[str(schema)]
+    except KeyError:
+        pass
+    logger.info(f"Compiling schema {schema} for validation")
+    schema_validator = SchemaValidator(str(schema))
+    _schema_validators[str(schema)] = schema_validator
+    return schema_validator
+
+
+class SchemaValidator:
+    """
+    Validates records against the classes of a LinkML schema
+    """
+
+    def __init__(self, schema: str):
+        self.schema = schema
+        generator = JsonSchemaGenerator(schema, mergeimports=True, not_closed=False)
+        # the json schema of the whole LinkML schema, with the definition of each class
+        self._jsonschema = json.loads(generator.serialize())
+        # records can be validated as any class that isn't abstract or a mixin
+        self._classes = {
+            camelcase(name)
+            for name, class_def in generator.schemaview.all_classes().items()
+            if not class_def.abstract and not class_def.mixin
+        }
+        self._class_validators: Dict[str, Callable[[Dict], List[str]]] = {}
+
+    def errors(self, record: Dict, target_class: str) -> List[str]:
+        """
+        :return: the validation error messages of record as an instance of target_class
+        """
+        try:
+            class_validator = self._class_validators[target_class]
+        except KeyError:
+            class_validator = self._compile(target_class)
+            self._class_validators[target_class] = class_validator
+        return class_validator(record)
+
+    def _compile(self, target_class: str) -> Callable[[Dict], List[str]]:
+        if target_class not in self._classes:
+            raise ValueError(f"{target_class} is not a class of the schema {self.schema}")
+        class_definition = self._jsonschema['$defs'][target_class]
+        # the schema of the class, keeping the definitions of the classes it refers to
+        jsonschema_obj = {
+            **self._jsonschema,
+            'properties': class_definition.get('properties', {}),
+            'required': class_definition.get('required', []),
+        }
+        validator_class = validator_for(jsonschema_obj, default=jsonschema.Draft7Validator)
+        validator = validator_class(jsonschema_obj)
+
+        def errors(record: Dict) -> List[str]:
+            return [
+                f"{'.'.join(map(str, error.absolute_path))}: {error.message}"
+                if error.absolute_path
+                else error.message
+                for error in validator.iter_errors(record)
+            ]
+
+        return errors
+
+
+class ValidationSummary:
+    """
+    Validation counts per entity class, with the errors of the first
+    max_examples invalid records of each class
+    """
+
+    max_examples = 5
+
+    def __init__(self):
+        self.validated = Counter()
+        self.invalid = Counter()
+        self.examples: Dict[str, List[str]] = defaultdict(list)
+
+    def add(self, entity_class: str, record: Dict, errors: List[str]):
+        self.validated[entity_class] += 1
+        if errors:
+            self.invalid[entity_class] += 1
+            if len(self.examples[entity_class]) < self.max_examples:
+                self.examples[entity_class].append(f"{record.get('id')}: {'; '.join(errors)}")
+
+    def update(self, other: 'ValidationSummary'):
+        self.validated.update(other.validated)
+        self.invalid.update(other.invalid)
+        for entity_class, examples in other.examples.items():
+            room = self.max_examples - len(self.examples[entity_class])
+            self.examples[entity_class].extend(examples[:room])
+
+    @property
+    def valid(self) -> bool:
+        return not self.invalid
+
+    def summary(self) -> str:
+        lines = [
+            f"{entity_class}: {self.invalid[entity_class]} of {validated} validated "
+            f"records are invalid"
+            for entity_class, validated in sorted(self.validated.items())
+        ]
+        for entity_class, examples in sorted(self.examples.items()):
+            lines.extend(f"  {entity_class} {example}" for example in examples)
+        return "\n".join(lines)
+
+
+def validate_batch(schema: str, items: Sequence[ValidationItem]) -> ValidationSummary:
+    """
+    Validates a batch of records, also the entry point for worker processes
+    """
+    schema_validator = get_schema_validator(schema)
+    summary = ValidationSummary()
+    for (entity_class, target_class, record) in items:
+        summary.add(entity_class, record, schema_validator.errors(record, target_class))
+    return summary
+
+
+class EntityValidator:
+    """
+    Validates the converted nodes and edges of a KozaApp, or a sample of
+    them (see ValidationConfig)
+
+    Records are validated in batches, in worker processes when configured.
+    Invalid records don't stop the transform, they are counted per entity
+    class and summarized by finish
+    """
+
+    def __init__(self, schema: str, config: ValidationConfig = None):
+        self.schema = str(schema)
+        self.config = config or ValidationConfig()
+        self.summary = ValidationSummary()
+        self.seen = 0
+        self._random = random.Random(0)
+        self._batch: List[ValidationItem] = []
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._pending: List[Future] = []
+        # compiled here so worker processes inherit it, rather than compiling it again
+        get_schema_validator(self.schema)
+
+    def add(self, entities: Sequence, records: Sequence[Dict], target_class: str):
+        """
+        Queues the selected records of entities for validation
+
+        :param entities: the entities, used for their class names
+        :param records: the converted entities, in the same order
+        :param target_class: the schema class to validate the records as
+        """
+        first = self.config.first
+        sample_rate = self.config.sample_rate
+        for entity, record in zip(entities, records):
+            self.seen += 1
+            if first is not None and self.seen > first:
+                break
+            if sample_rate is not None and self._random.random() >= sample_rate:
+                continue
+            self._batch.append((type(entity).__name__, target_class, record))
+        if len(self._batch) >= self.config.batch_size:
+            self._flush()
+
+    def _flush(self):
+        if not self._batch:
+            return
+        batch = self._batch
+        self._batch = []
+        if not self.config.workers or self.config.workers < 2:
+            self.summary.update(validate_batch(self.schema, batch))
+            return
+
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.config.workers)
+        # at most two batches per worker are in flight, which bounds the memory they use
+        self._pending.append(self._pool.submit(validate_batch, self.schema, batch))
+        while len(self._pending) > 2 * self.config.workers:
+            self.summary.update(self._pending.pop(0).result())
+
+    def finish(self) -> ValidationSummary:
+        """
+        Validates the remaining records and waits for the workers
+
+        :return: the validation summary of all validated records
+        """
+        self._flush()
+        try:
+            for future in self._pending:
+                self.summary.update(future.result())
+        finally:
+            self._pending = []
+            if self._pool is not None:
+                self._pool.shutdown()
+                self._pool = None
+        return self.summary
@@ -0,0 +1,119 @@
+"""
+Test batch mode transforms, which are run per batch of rows read as columns
+"""
+import pytest
+
+from koza.cli_runner import get_koza_app, transform_source
+from koza.exceptions import MapItemException
+from koza.model.config.source_config import OutputFormat
+
+pytest.importorskip('numpy')
+
+transform = """
+from koza.cli_runner import get_koza_app
+
+koza_app = get_koza_app('batch-protein-links-detailed')
+batch = koza_app.get_batch()
+
+koza_app.batch_count = getattr(koza_app, 'batch_count', 0) + 1
+koza_app.scores = getattr(koza_app, 'scores', []) + [int(score) for score in batch['combined_score']]
+"""
+
+
+def test_batch_mode(tmp_path):
+    (tmp_path / 'batch-protein-links-detailed.py').write_text(transform)
+    source_config = tmp_path / 'batch-protein-links-detailed.yaml'
+    source_config.write_text(
+        """
+name: 'batch-protein-links-detailed'
+delimiter: ' '
+files:
+  - './examples/data/string.tsv'
+  - './examples/data/string2.tsv'
+columns: !include './examples/standards/string.yaml'
+filters:
+  - inclusion: 'include'
+    column: 'combined_score'
+    filter_code: 'lt'
+    value: 700
+transform_mode: 'batch'
+batch_size: 4
+node_properties:
+  - 'id'
+"""
+    )
+
+    transform_source(str(source_config), str(tmp_path / 'output'), OutputFormat.tsv)
+
+    koza_app = get_koza_app('batch-protein-links-detailed')
+    assert koza_app.batch_count > 2
+    assert koza_app.scores
+    assert all(score < 700 for score in koza_app.scores)
+
+
+map_transform = """
+from koza.cli_runner import get_koza_app
+
+koza_app = get_koza_app('batch-map-protein-links-detailed')
+protein_map = koza_app.get_map('batch-protein-map')
+batch = koza_app.get_batch()
+
+koza_app.rows = getattr(koza_app, 'rows', 0) + len(batch['protein2'])
+koza_app.mapped = getattr(koza_app, 'mapped', []) + [
+    protein_map{lookup} for protein in map(str, batch['protein2'])
+]
+"""
+
+
+@pytest.mark.parametrize("lookup", ["[protein]['entrez']", ".get(protein, {}).get('entrez')"])
+def test_batch_mode_map_miss(tmp_path, lookup):
+    """
+    A missing map key fails a batch transform rather than dropping the rest of its batch,
+    transforms that look up keys with .get() keep every row
+    """
+    (tmp_path / 'protein-map.tsv').write_text(
+        "entrez\tSTRING\n1\t10090.ENSMUSP00000020316\n2\t10090.ENSMUSP00000017365\n"
+    )
+    (tmp_path / 'protein-map.yaml').write_text(
+        f"""
+name: 'batch-protein-map'
+delimiter: '\\t'
+files:
+  - '{tmp_path / 'protein-map.tsv'}'
+columns:
+  - 'entrez'
+  - 'STRING'
+key: 'STRING'
+values:
+  - 'entrez'
+"""
+    )
+    (tmp_path / 'batch-map-protein-links-detailed.py').write_text(
+        map_transform.format(lookup=lookup)
+    )
+    source_config = tmp_path / 'batch-map-protein-links-detailed.yaml'
+    source_config.write_text(
+        f"""
+name: 'batch-map-protein-links-detailed'
+delimiter: ' '
+files:
+  - './examples/data/string.tsv'
+columns: !include './examples/standards/string.yaml'
+depends_on:
+  - '{tmp_path / 'protein-map.yaml'}'
+transform_mode: 'batch'
+batch_size: 4
+node_properties:
+  - 'id'
+"""
+    )
+
+    if lookup.startswith('['):
+        with pytest.raises(MapItemException, match="batch transform"):
+            transform_source(str(source_config), str(tmp_path / 'output'), OutputFormat.tsv)
+        return
+
+    transform_source(str(source_config), str(tmp_path / 'output'), OutputFormat.tsv)
+    koza_app = get_koza_app('batch-map-protein-links-detailed')
+    assert koza_app.rows == len(koza_app.mapped) > 4
+    assert set(koza_app.mapped) == {'1', '2', None}
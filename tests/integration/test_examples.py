@@ -7,7 +7,7 @@ from pathlib import Path
 import pytest
 
 from koza.cli_runner import transform_source
-from koza.model.config.source_config import OutputFormat
+from koza.model.config.source_config import DedupPolicy, OutputFormat, ValidationConfig
 
 
 @pytest.mark.parametrize(
@@ -21,9 +21,13 @@ from koza.model.config.source_config import OutputFormat
         ("string-w-map", "map-protein-links-detailed", OutputFormat.jsonl),
         ("string-w-custom-map", "custom-map-protein-links-detailed", OutputFormat.tsv),
         ("string-w-custom-map", "custom-map-protein-links-detailed", OutputFormat.jsonl),
+        ("string", "protein-links-detailed", OutputFormat.parquet),
+        ("string-w-map", "map-protein-links-detailed", OutputFormat.parquet),
     ],
 )
 def test_examples(source_name, ingest, output_format):
+    if output_format == OutputFormat.parquet:
+        pytest.importorskip('pyarrow')
 
     source_config = f"examples/{source_name}/{ingest}.yaml"
     
@@ -43,3 +47,66 @@ def test_examples(source_name, ingest, output_format):
         # assert Path(file).stat().st_size > 0  # Removed this line because now node files are not
 
     # TODO: at some point, these assertions could get more rigorous, but knowing if we have errors/exceptions is a start
+
+
+@pytest.mark.parametrize("output_format", [OutputFormat.tsv, OutputFormat.jsonl])
+def test_background_write(tmp_path, output_format):
+    """
+    Writing on a background thread gives the same output
+    """
+    source_config = "examples/string-w-map/map-protein-links-detailed.yaml"
+    output_suffix = str(output_format).split('.')[1]
+
+    for output_dir, background_write in [("direct", False), ("background", True)]:
+        transform_source(
+            source_config,
+            str(tmp_path / output_dir),
+            output_format,
+            "examples/translation_table.yaml",
+            background_write=background_write,
+        )
+
+    for output_type in ['nodes', 'edges']:
+        output_name = f"map-protein-links-detailed_{output_type}.{output_suffix}"
+        direct_lines = (tmp_path / "direct" / output_name).read_text().splitlines()
+        background_lines = (tmp_path / "background" / output_name).read_text().splitlines()
+        assert len(direct_lines) == len(background_lines)
+        if output_type == 'nodes':
+            assert direct_lines == background_lines
+
+
+@pytest.mark.parametrize("dedup_nodes", [DedupPolicy.first, DedupPolicy.merge])
+def test_dedup_nodes(tmp_path, dedup_nodes):
+    source_config = "examples/string/protein-links-detailed.yaml"
+    output_name = "protein-links-detailed_nodes.tsv"
+
+    for output_dir, dedup in [("all", None), ("dedup", dedup_nodes)]:
+        transform_source(
+            source_config,
+            str(tmp_path / output_dir),
+            OutputFormat.tsv,
+            "examples/translation_table.yaml",
+            dedup_nodes=dedup,
+        )
+
+    all_lines = (tmp_path / "all" / output_name).read_text().splitlines()
+    dedup_lines = (tmp_path / "dedup" / output_name).read_text().splitlines()
+    assert len(dedup_lines) < len(all_lines)
+    assert dedup_lines == list(dict.fromkeys(all_lines))
+
+
+def test_validate_sample(tmp_path, caplog):
+    # the example's biolink records have properties the test schema doesn't define,
+    # so each sampled record is invalid and summarized rather than stopping the transform
+    transform_source(
+        "examples/string/protein-links-detailed.yaml",
+        str(tmp_path),
+        OutputFormat.jsonl,
+        "examples/translation_table.yaml",
+        schema="tests/resources/validation-schema.yaml",
+        validation=ValidationConfig(first=5),
+    )
+
+    assert (tmp_path / "protein-links-detailed_edges.jsonl").exists()
+    assert "PairwiseGeneToGeneInteraction: 1 of 1 validated records are invalid" in caplog.text
+    assert "Protein: 4 of 4 validated records are invalid" in caplog.text
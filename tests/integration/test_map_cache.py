@@ -0,0 +1,140 @@
+"""
+Test caching loaded maps on disk between runs
+"""
+
+import multiprocessing
+
+import pytest
+import yaml
+
+from koza import cli_runner
+from koza.app import KozaApp
+from koza.cli_runner import get_koza_app, transform_source
+from koza.io.map_cache import clear_loaded_maps, get_loaded_map, load_cached_map, map_cache_key
+from koza.io.yaml_loader import UniqueIncludeLoader
+from koza.model.config.source_config import MapFileConfig, OutputFormat, PrimaryFileConfig
+
+
+@pytest.mark.parametrize(
+    "source_name, ingest, map_name",
+    [
+        ("string-w-map", "map-protein-links-detailed", "entrez-2-string"),
+        ("string-w-custom-map", "custom-map-protein-links-detailed", "custom-entrez-2-string"),
+    ],
+)
+def test_map_cache(tmp_path, source_name, ingest, map_name):
+    source_config = f"examples/{source_name}/{ingest}.yaml"
+    map_cache_dir = tmp_path / "maps"
+
+    outputs = []
+    maps = []
+    for run in ['built', 'cached']:
+        # only the on disk cache is shared between the runs
+        clear_loaded_maps()
+        output_dir = tmp_path / run
+        transform_source(
+            source_config,
+            str(output_dir),
+            OutputFormat.tsv,
+            "examples/translation_table.yaml",
+            map_cache_dir=str(map_cache_dir),
+        )
+        maps.append(get_koza_app(ingest).get_map(map_name))
+        with open(output_dir / f"{ingest}_edges.tsv") as edges_fh:
+            # edge ids are random uuids
+            outputs.append([line.split('\t')[1:] for line in edges_fh])
+
+    assert len(list(map_cache_dir.glob("*.pickle"))) == 1
+    assert maps[0] == maps[1]
+    assert type(maps[0]) == type(maps[1])
+    assert outputs[0] == outputs[1]
+
+
+def test_map_cache_key_changes_with_input(tmp_path):
+    map_file = tmp_path / "map.tsv"
+    map_file.write_text("a\tb\n1\t2\n")
+    map_config = {
+        'name': 'test-map',
+        'files': [str(map_file)],
+        'delimiter': '\t',
+        'key': 'a',
+        'values': ['b'],
+    }
+    key = map_cache_key(MapFileConfig(**map_config))
+    assert key == map_cache_key(MapFileConfig(**map_config))
+
+    map_file.write_text("a\tb\n1\t3\n")
+    assert key != map_cache_key(MapFileConfig(**map_config))
+    assert key != map_cache_key(MapFileConfig(**{**map_config, 'values': ['a', 'b']}))
+
+
+@pytest.mark.parametrize(
+    "cached",
+    [
+        b"",
+        b"not a pickle",
+        # pickles of a class that was renamed, or in a module that was moved
+        b"ckoza.model.map_dict\nRenamedMapDict\n)\x81.",
+        b"ckoza.moved_map_dict\nMapDict\n)\x81.",
+    ],
+)
+def test_unreadable_map_cache(tmp_path, cached):
+    (tmp_path / "key.pickle").write_bytes(cached)
+    assert load_cached_map(tmp_path, "key") is None
+
+
+def test_maps_shared_in_process(tmp_path):
+    clear_loaded_maps()
+    source_config = "examples/string-w-map/map-protein-links-detailed.yaml"
+    maps = []
+    for run in ['first', 'second']:
+        transform_source(source_config, str(tmp_path / run), OutputFormat.tsv)
+        maps.append(get_koza_app('map-protein-links-detailed').get_map('entrez-2-string'))
+    assert maps[0] is maps[1]
+
+
+def test_map_stats_per_run(tmp_path):
+    clear_loaded_maps()
+    source_config = "examples/string-w-map/map-protein-links-detailed.yaml"
+    lookups = []
+    for run in ['first', 'second']:
+        transform_source(source_config, str(tmp_path / run), OutputFormat.tsv)
+        map_stats = get_koza_app('map-protein-links-detailed').get_map('entrez-2-string').stats
+        lookups.append((map_stats.lookups, map_stats.misses))
+    # the map is shared between the runs, its stats are not
+    assert lookups[0][0] > 0
+    assert lookups[0] == lookups[1]
+
+
+@pytest.mark.skipif(
+    multiprocessing.get_start_method() != 'fork', reason="maps are only preloaded for fork"
+)
+def test_maps_preloaded_for_workers(tmp_path):
+    clear_loaded_maps()
+    transform_source(
+        "examples/string-w-map/map-protein-links-detailed.yaml",
+        str(tmp_path),
+        OutputFormat.tsv,
+        "examples/translation_table.yaml",
+        workers=2,
+    )
+    map_config = KozaApp.get_map_config('./examples/maps/entrez-2-string.yaml')
+    assert get_loaded_map(map_config) is not None
+    assert (tmp_path / "map-protein-links-detailed_edges.tsv").exists()
+
+
+def test_maps_cached_for_spawned_workers(tmp_path, monkeypatch):
+    """
+    Spawned workers don't inherit maps, they are cached for them to load instead
+    """
+    clear_loaded_maps()
+    monkeypatch.setattr(cli_runner.multiprocessing, 'get_start_method', lambda: 'spawn')
+    with open("examples/string-w-map/map-protein-links-detailed.yaml") as source_fh:
+        source_config = PrimaryFileConfig(**yaml.load(source_fh, Loader=UniqueIncludeLoader))
+
+    assert not cli_runner._preload_maps(source_config)
+    assert not cli_runner._preload_maps(source_config, str(tmp_path))
+
+    map_config = KozaApp.get_map_config('./examples/maps/entrez-2-string.yaml')
+    assert get_loaded_map(map_config) is None
+    assert load_cached_map(tmp_path, map_cache_key(map_config)) is not None
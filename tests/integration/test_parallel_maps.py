@@ -0,0 +1,65 @@
+"""
+Test loading the maps of a source concurrently
+"""
+
+import pytest
+
+from koza.cli_runner import set_koza_app
+from koza.io.map_cache import clear_loaded_maps
+from koza.model.config.source_config import PrimaryFileConfig
+from koza.model.source import Source
+
+
+def _load_maps(workers, extra_map):
+    clear_loaded_maps()
+    source_config = PrimaryFileConfig(
+        # the name custom-entrez-2-string.py looks up its koza app by
+        name='custom-map-protein-links-detailed',
+        files=['./examples/data/string.tsv'],
+        delimiter=' ',
+        columns=['protein1', 'protein2', 'combined_score'],
+        depends_on=[
+            './examples/maps/entrez-2-string.yaml',
+            './examples/maps/custom-entrez-2-string.yaml',
+            str(extra_map),
+        ],
+        transform_code='./examples/string-w-custom-map/custom-map-protein-links-detailed.py',
+    )
+    koza_app = set_koza_app(Source(source_config), output_dir='./test-output/parallel-maps')
+    koza_app.process_maps(workers)
+    return koza_app
+
+
+@pytest.mark.parametrize("workers", [2, 4])
+def test_parallel_maps(tmp_path, workers):
+    extra_map = tmp_path / "entrez-2-taxon.yaml"
+    extra_map.write_text(
+        """
+name: 'entrez-2-taxon'
+delimiter: '\\t'
+header_delimiter: '/'
+header: 0
+comment_char: '#'
+files:
+  - './examples/data/entrez-2-string.tsv'
+columns:
+  - 'NCBI taxid'
+  - 'entrez'
+  - 'STRING'
+key: 'entrez'
+values:
+  - 'NCBI taxid'
+"""
+    )
+    sequential = _load_maps(None, extra_map)._map_cache
+    koza_app = _load_maps(workers, extra_map)
+    parallel = koza_app._map_cache
+
+    # the map sources are closed once the maps are loaded
+    for map_source in koza_app._map_registry.values():
+        assert not map_source._resources
+
+    assert sequential.keys() == parallel.keys()
+    for map_name, map in sequential.items():
+        assert map == parallel[map_name]
+        assert type(map) == type(parallel[map_name])
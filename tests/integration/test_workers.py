@@ -0,0 +1,323 @@
+"""
+Test transforming the input files of a source in separate worker processes
+"""
+
+import gzip
+import json
+
+import pytest
+
+from koza.cli_runner import transform_source
+from koza.model.config.source_config import (
+    DedupPolicy,
+    OutputCompression,
+    OutputFormat,
+    OutputShardConfig,
+)
+
+
+@pytest.mark.parametrize(
+    "source_name, ingest, output_format",
+    [
+        ("string", "protein-links-detailed", OutputFormat.tsv),
+        ("string", "protein-links-detailed", OutputFormat.jsonl),
+        ("string-w-map", "map-protein-links-detailed", OutputFormat.tsv),
+    ],
+)
+def test_workers(source_name, ingest, output_format):
+
+    source_config = f"examples/{source_name}/{ingest}.yaml"
+
+    output_suffix = str(output_format).split('.')[1]
+    single_output_dir = "./test-output/string/test-workers/single"
+    workers_output_dir = "./test-output/string/test-workers/workers"
+
+    transform_source(
+        source_config, single_output_dir, output_format, "examples/translation_table.yaml"
+    )
+    transform_source(
+        source_config,
+        workers_output_dir,
+        output_format,
+        "examples/translation_table.yaml",
+        workers=2,
+    )
+
+    for output_type in ['nodes', 'edges']:
+        single_file = f"{single_output_dir}/{ingest}_{output_type}.{output_suffix}"
+        workers_file = f"{workers_output_dir}/{ingest}_{output_type}.{output_suffix}"
+        with open(single_file) as single_fh, open(workers_file) as workers_fh:
+            single_lines = single_fh.readlines()
+            workers_lines = workers_fh.readlines()
+
+        assert len(single_lines) == len(workers_lines)
+        if output_format == OutputFormat.tsv:
+            assert single_lines[0] == workers_lines[0]
+
+
+@pytest.mark.parametrize("output_format", [OutputFormat.tsv, OutputFormat.jsonl])
+def test_workers_single_file(tmp_path, output_format):
+    """
+    A single file is split into byte ranges that are transformed in parallel
+    """
+    source_config = tmp_path / "protein-links-detailed.yaml"
+    source_config.write_text(
+        """
+name: 'protein-links-detailed'
+delimiter: ' '
+files:
+  - './examples/data/string.tsv'
+columns: !include './examples/standards/string.yaml'
+transform_code: './examples/string/protein-links-detailed.py'
+transform_mode: 'loop'
+node_properties:
+  - 'id'
+  - 'category'
+edge_properties:
+  - 'id'
+  - 'subject'
+  - 'predicate'
+  - 'object'
+"""
+    )
+
+    output_suffix = str(output_format).split('.')[1]
+    single_output_dir = tmp_path / "single"
+    workers_output_dir = tmp_path / "workers"
+
+    transform_source(
+        str(source_config), str(single_output_dir), output_format, "examples/translation_table.yaml"
+    )
+    transform_source(
+        str(source_config),
+        str(workers_output_dir),
+        output_format,
+        "examples/translation_table.yaml",
+        workers=3,
+    )
+
+    for output_type in ['nodes', 'edges']:
+        output_name = f"protein-links-detailed_{output_type}.{output_suffix}"
+        with open(single_output_dir / output_name) as single_fh:
+            single_lines = single_fh.readlines()
+        with open(workers_output_dir / output_name) as workers_fh:
+            workers_lines = workers_fh.readlines()
+
+        assert len(single_lines) == len(workers_lines)
+        if output_type == 'nodes':
+            assert sorted(single_lines) == sorted(workers_lines)
+
+
+@pytest.mark.parametrize("output_format", [OutputFormat.tsv, OutputFormat.jsonl])
+@pytest.mark.parametrize("compression", [OutputCompression.gzip, OutputCompression.bgzip])
+def test_workers_compressed_output(tmp_path, output_format, compression):
+    """
+    Compressed shard outputs are merged into a single compressed file
+    """
+    source_config = "examples/string/protein-links-detailed.yaml"
+    output_suffix = str(output_format).split('.')[1]
+    single_output_dir = tmp_path / "single"
+    workers_output_dir = tmp_path / "workers"
+
+    transform_source(
+        source_config, str(single_output_dir), output_format, "examples/translation_table.yaml"
+    )
+    transform_source(
+        source_config,
+        str(workers_output_dir),
+        output_format,
+        "examples/translation_table.yaml",
+        workers=2,
+        output_compression=compression,
+    )
+
+    for output_type in ['nodes', 'edges']:
+        output_name = f"protein-links-detailed_{output_type}.{output_suffix}"
+        with open(single_output_dir / output_name) as single_fh:
+            single_lines = single_fh.readlines()
+        with gzip.open(workers_output_dir / f"{output_name}.gz", 'rt') as workers_fh:
+            workers_lines = workers_fh.readlines()
+
+        assert len(single_lines) == len(workers_lines)
+        if output_format == OutputFormat.tsv:
+            assert single_lines[0] == workers_lines[0]
+
+
+def test_workers_parquet(tmp_path):
+    """
+    Parquet shard outputs are merged row group by row group
+    """
+    pq = pytest.importorskip('pyarrow.parquet')
+    source_config = "examples/string/protein-links-detailed.yaml"
+    single_output_dir = tmp_path / "single"
+    workers_output_dir = tmp_path / "workers"
+
+    transform_source(
+        source_config,
+        str(single_output_dir),
+        OutputFormat.parquet,
+        "examples/translation_table.yaml",
+    )
+    transform_source(
+        source_config,
+        str(workers_output_dir),
+        OutputFormat.parquet,
+        "examples/translation_table.yaml",
+        workers=2,
+        output_compression=OutputCompression.zstd,
+    )
+
+    for output_type in ['nodes', 'edges']:
+        output_name = f"protein-links-detailed_{output_type}.parquet"
+        single_table = pq.read_table(single_output_dir / output_name)
+        workers_table = pq.read_table(workers_output_dir / output_name)
+
+        assert single_table.schema == workers_table.schema
+        assert single_table.num_rows == workers_table.num_rows
+
+
+@pytest.mark.parametrize("output_format", [OutputFormat.tsv, OutputFormat.jsonl])
+@pytest.mark.parametrize(
+    "output_shards", [None, OutputShardConfig(max_rows=4), OutputShardConfig(partitions=3)]
+)
+def test_workers_dedup_nodes(tmp_path, output_format, output_shards):
+    """
+    Node files are de-duplicated again as the worker outputs are merged
+    """
+    source_config = "examples/string/protein-links-detailed.yaml"
+    output_suffix = str(output_format).split('.')[1]
+    single_output_dir = tmp_path / "single"
+    workers_output_dir = tmp_path / "workers"
+
+    transform_source(
+        source_config,
+        str(single_output_dir),
+        output_format,
+        "examples/translation_table.yaml",
+        dedup_nodes=DedupPolicy.first,
+    )
+    transform_source(
+        source_config,
+        str(workers_output_dir),
+        output_format,
+        "examples/translation_table.yaml",
+        workers=2,
+        dedup_nodes=DedupPolicy.first,
+        output_shards=output_shards,
+    )
+
+    output_name = f"protein-links-detailed_nodes.{output_suffix}"
+    with open(single_output_dir / output_name) as single_fh:
+        single_lines = single_fh.readlines()
+    if output_format == OutputFormat.tsv:
+        single_lines = single_lines[1:]
+
+    workers_lines = []
+    if output_shards:
+        with open(workers_output_dir / "protein-links-detailed_manifest.json") as manifest_fh:
+            workers_files = [
+                (file['file'], file['rows']) for file in json.load(manifest_fh)['nodes']
+            ]
+    else:
+        workers_files = [(output_name, len(single_lines))]
+    for file_name, rows in workers_files:
+        with open(workers_output_dir / file_name) as workers_fh:
+            lines = workers_fh.readlines()
+        if output_format == OutputFormat.tsv:
+            lines = lines[1:]
+        assert len(lines) == rows
+        workers_lines.extend(lines)
+    assert sorted(workers_lines) == sorted(single_lines)
+
+
+def test_workers_dedup_nodes_parquet(tmp_path):
+    pq = pytest.importorskip('pyarrow.parquet')
+    source_config = "examples/string/protein-links-detailed.yaml"
+
+    node_ids = []
+    for run, workers in [('single', None), ('workers', 2)]:
+        transform_source(
+            source_config,
+            str(tmp_path / run),
+            OutputFormat.parquet,
+            "examples/translation_table.yaml",
+            workers=workers,
+            dedup_nodes=DedupPolicy.first,
+        )
+        nodes = pq.read_table(tmp_path / run / "protein-links-detailed_nodes.parquet")
+        node_ids.append(sorted(nodes['id'].to_pylist()))
+    assert node_ids[0] == node_ids[1]
+
+
+def test_workers_dedup_nodes_merge(tmp_path):
+    with pytest.raises(ValueError):
+        transform_source(
+            "examples/string/protein-links-detailed.yaml",
+            str(tmp_path),
+            OutputFormat.tsv,
+            "examples/translation_table.yaml",
+            workers=2,
+            dedup_nodes=DedupPolicy.merge,
+        )
+
+
+@pytest.mark.parametrize("output_format", [OutputFormat.tsv, OutputFormat.jsonl])
+@pytest.mark.parametrize(
+    "output_shards", [OutputShardConfig(max_rows=4), OutputShardConfig(partitions=3)]
+)
+@pytest.mark.parametrize("workers", [None, 2])
+def test_sharded_output(tmp_path, output_format, output_shards, workers):
+    """
+    Outputs are split into numbered files listed in a manifest
+    """
+    source_config = "examples/string/protein-links-detailed.yaml"
+    output_suffix = str(output_format).split('.')[1]
+    single_output_dir = tmp_path / "single"
+    sharded_output_dir = tmp_path / "sharded"
+
+    transform_source(
+        source_config, str(single_output_dir), output_format, "examples/translation_table.yaml"
+    )
+    transform_source(
+        source_config,
+        str(sharded_output_dir),
+        output_format,
+        "examples/translation_table.yaml",
+        workers=workers,
+        output_compression=OutputCompression.gzip,
+        output_shards=output_shards,
+    )
+
+    with open(sharded_output_dir / "protein-links-detailed_manifest.json") as manifest_fh:
+        manifest = json.load(manifest_fh)
+
+    for output_type in ['nodes', 'edges']:
+        with open(
+            single_output_dir / f"protein-links-detailed_{output_type}.{output_suffix}"
+        ) as single_fh:
+            single_lines = single_fh.readlines()
+        if output_format == OutputFormat.tsv:
+            header, single_lines = single_lines[0], single_lines[1:]
+
+        sharded_lines = []
+        for file in manifest[output_type]:
+            assert file['file'].startswith(f"protein-links-detailed_{output_type}_")
+            with gzip.open(sharded_output_dir / file['file'], 'rt') as sharded_fh:
+                lines = sharded_fh.readlines()
+            if output_format == OutputFormat.tsv:
+                assert lines[0] == header
+                lines = lines[1:]
+            assert len(lines) == file['rows']
+            if output_shards.max_rows:
+                assert len(lines) <= output_shards.max_rows
+            sharded_lines.extend(lines)
+
+        assert len(sharded_lines) == len(single_lines)
+        if output_shards.partitions:
+            assert len(manifest[output_type]) == 3
+        if output_type == 'nodes':
+            assert sorted(sharded_lines) == sorted(single_lines)
+    assert sorted(path.name for path in sharded_output_dir.iterdir()) == sorted(
+        [file['file'] for files in manifest.values() for file in files]
+        + ["protein-links-detailed_manifest.json"]
+    )
@@ -0,0 +1,121 @@
+"""
+Testing column batches read from csv files
+"""
+from pathlib import Path
+
+import pytest
+
+from koza.io.reader import columnar
+from koza.io.reader.csv_reader import CSVReader
+from koza.model.config.source_config import ColumnFilter, FieldType
+from koza.row_filter import RowFilter
+
+pytest.importorskip('numpy')
+
+test_file = Path(__file__).parent.parent / 'resources' / 'source-files' / 'string.tsv'
+
+field_type_map = {
+    'protein1': FieldType.str,
+    'protein2': FieldType.str,
+    'neighborhood': FieldType.str,
+    'fusion': FieldType.str,
+    'cooccurence': FieldType.str,
+    'coexpression': FieldType.str,
+    'experimental': FieldType.str,
+    'database': FieldType.str,
+    'textmining': FieldType.float,
+    'combined_score': FieldType.int,
+}
+
+filters = [
+    ColumnFilter(column='combined_score', inclusion='include', filter_code='lt', value=700),
+    ColumnFilter(
+        column='protein2',
+        inclusion='exclude',
+        filter_code='in',
+        value=['10090.ENSMUSP00000020316'],
+    ),
+]
+
+
+@pytest.fixture(params=['pyarrow', 'numpy'])
+def backend(request, monkeypatch):
+    if request.param == 'pyarrow':
+        pytest.importorskip('pyarrow')
+    else:
+        monkeypatch.setattr(columnar, 'pa', None)
+    return request.param
+
+
+def read_rows():
+    with open(test_file, 'r') as string_file:
+        return list(CSVReader(string_file, field_type_map.copy(), delimiter=' '))
+
+
+def test_batch_matches_rows(backend):
+    rows = read_rows()
+    with open(test_file, 'r') as string_file:
+        reader = CSVReader(string_file, field_type_map.copy(), delimiter=' ')
+        batch = reader.next_batch(4)
+        assert columnar.batch_num_rows(batch) == 4
+        remaining = reader.next_batch(100)
+        assert columnar.batch_num_rows(remaining) == len(rows) - 4
+        with pytest.raises(StopIteration):
+            reader.next_batch(100)
+
+    scores = list(batch['combined_score']) + list(remaining['combined_score'])
+    assert [int(score) for score in scores] == [row['combined_score'] for row in rows]
+
+
+def test_filter_batch(backend):
+    rows = read_rows()
+    row_filter = RowFilter(filters)
+    expected = [row['combined_score'] for row in rows if row_filter.include_row(row)]
+    assert 0 < len(expected) < len(rows) - 1
+
+    with open(test_file, 'r') as string_file:
+        reader = CSVReader(string_file, field_type_map.copy(), delimiter=' ')
+        batch = columnar.filter_batch(reader.next_batch(100), filters)
+
+    assert [int(score) for score in batch['combined_score']] == expected
+
+
+mismatched_filters = [
+    # ints for a str column, strings for an int column and floats for an int column
+    ColumnFilter(column='protein2', inclusion='exclude', filter_code='in', value=[20316]),
+    ColumnFilter(column='combined_score', inclusion='include', filter_code='in', value=['183']),
+    ColumnFilter(
+        column='combined_score', inclusion='include', filter_code='in', value=[183.0, '155', 165]
+    ),
+    ColumnFilter(column='textmining', inclusion='exclude', filter_code='in', value=[67, 137.0]),
+]
+
+
+@pytest.mark.parametrize("column_filter", mismatched_filters)
+def test_filter_batch_mismatched_types(backend, column_filter):
+    """
+    'in' values of another type than the column never match, as with RowFilter
+    """
+    rows = read_rows()
+    row_filter = RowFilter([column_filter])
+    expected = [row['combined_score'] for row in rows if row_filter.include_row(row)]
+
+    with open(test_file, 'r') as string_file:
+        reader = CSVReader(string_file, field_type_map.copy(), delimiter=' ')
+        batch = columnar.filter_batch(reader.next_batch(100), [column_filter])
+
+    assert [int(score) for score in batch['combined_score']] == expected
+
+
+@pytest.mark.parametrize("column_filters", [filters] + [[f] for f in mismatched_filters])
+def test_filter_batch_backends_match(monkeypatch, column_filters):
+    pytest.importorskip('pyarrow')
+    scores = []
+    for backend in ['pyarrow', 'numpy']:
+        if backend == 'numpy':
+            monkeypatch.setattr(columnar, 'pa', None)
+        with open(test_file, 'r') as string_file:
+            reader = CSVReader(string_file, field_type_map.copy(), delimiter=' ')
+            batch = columnar.filter_batch(reader.next_batch(100), column_filters)
+        scores.append([int(score) for score in batch['combined_score']])
+    assert scores[0] == scores[1]
@@ -89,3 +89,14 @@ def test_no_exceptions_with_footer():
         # TODO actually test something
         for _ in reader:
             pass
+
+
+def test_column_without_type_is_skipped():
+    with open(test_file, 'r') as string_file:
+        field_map = field_type_map.copy()
+        del field_map['combined_score']
+        field_map['some_field_that_doesnt_exist'] = FieldType.str
+        reader = CSVReader(string_file, field_map, delimiter=' ')
+        row = next(reader)
+        assert 'combined_score' not in row
+        assert isinstance(row['textmining'], float)
@@ -1,10 +1,17 @@
 """
 Testing custom dictionary
 """
+import gzip
+import pickle
+import shutil
+
 import pytest
 
+from koza.app import KozaApp
 from koza.exceptions import MapItemException
-from koza.model.map_dict import MapDict
+from koza.model.config.source_config import MapFileConfig, MapMode
+from koza.model.map_dict import CompactMapDict, LazyMapDict, MapDict
+from koza.model.source import Source
 
 
 def test_custom_dict_exception():
@@ -16,3 +23,205 @@ def test_custom_dict_exception():
 def test_custom_dict_get_item():
     map_dict = MapDict(foo='bar')
     assert map_dict['foo'] == 'bar'
+
+
+def test_compact_dict_get_item():
+    map_dict = CompactMapDict(['entrez', 'taxon'])
+    map_dict['foo'] = {'entrez': '1', 'taxon': '9606', 'other': 'x'}
+    assert map_dict['foo'] == {'entrez': '1', 'taxon': '9606'}
+    assert map_dict['foo']['entrez'] == '1'
+    assert 'foo' in map_dict
+    assert len(map_dict) == 1
+
+
+def test_compact_dict_exception():
+    map_dict = CompactMapDict(['entrez'])
+    map_dict['foo'] = {'entrez': '1'}
+    with pytest.raises(MapItemException):
+        map_dict['bad_key']
+    assert map_dict.get('bad_key') is None
+
+
+def test_compact_dict_missing_column():
+    map_dict = CompactMapDict(['entrez', 'taxon'])
+    map_dict['foo'] = {'entrez': '1'}
+    assert map_dict['foo'] == {'entrez': '1'}
+    assert pickle.loads(pickle.dumps(map_dict)) == map_dict
+
+
+def test_compact_dict_matches_map_dict():
+    source = Source(
+        MapFileConfig(
+            name='entrez-2-string',
+            files=['./examples/data/entrez-2-string.tsv'],
+            delimiter='\t',
+            header_delimiter='/',
+            header=0,
+            columns=['NCBI taxid', 'entrez', 'STRING'],
+            key='STRING',
+            values=['entrez'],
+            map_mode=MapMode.compact,
+        )
+    )
+    map_dict = KozaApp._load_declarative_map(source)
+    assert isinstance(map_dict, CompactMapDict)
+    source.config.map_mode = MapMode.dict
+    assert map_dict == KozaApp._load_declarative_map(source.config)
+
+
+def _entrez_map_config(tmp_path, map_mode, **kwargs):
+    # copied, since rows are appended to them
+    files = []
+    for name in ['entrez-2-string.tsv', 'additional-entrez-2-string.tsv']:
+        shutil.copy(f'./examples/data/{name}', tmp_path / name)
+        files.append(str(tmp_path / name))
+    # duplicate keys, files are read from last to first so the first file
+    # takes precedence, and within a file the last row wins
+    with open(tmp_path / 'additional-entrez-2-string.tsv', 'a') as map_fh:
+        map_fh.write("\n# comment\n10090\t1\t10090.ENSMUSP00000026270\n")
+    with open(tmp_path / 'entrez-2-string.tsv', 'a') as map_fh:
+        map_fh.write("10090\t2\t10090.ENSMUSP00000026270\n")
+    return MapFileConfig(
+        name='entrez-2-string',
+        files=files,
+        delimiter='\t',
+        header_delimiter='/',
+        header=0,
+        columns=['NCBI taxid', 'entrez', 'STRING'],
+        key='STRING',
+        values=['entrez', 'NCBI taxid'],
+        map_mode=map_mode,
+        **kwargs,
+    )
+
+
+@pytest.mark.parametrize("lazy_cache_size", [0, 100])
+def test_lazy_dict_matches_map_dict(tmp_path, lazy_cache_size):
+    config = _entrez_map_config(tmp_path, MapMode.lazy, lazy_cache_size=lazy_cache_size)
+    map_dict = KozaApp._load_declarative_map(config, tmp_path / 'maps')
+    assert isinstance(map_dict, LazyMapDict)
+    assert map_dict['10090.ENSMUSP00000026270'] == {'entrez': '2', 'NCBI taxid': '10090'}
+    assert map_dict == KozaApp._load_declarative_map(_entrez_map_config(tmp_path, MapMode.dict))
+    # the indexes are saved in the map cache directory, not next to the map files
+    assert len(list((tmp_path / 'maps').glob('*.index'))) == 2
+    assert not list(tmp_path.glob('*.index'))
+    with pytest.raises(MapItemException):
+        map_dict['bad_key']
+
+
+def test_lazy_dict_reuses_index(tmp_path, monkeypatch):
+    config = _entrez_map_config(tmp_path, MapMode.lazy)
+    map_dict = LazyMapDict(config, tmp_path / 'maps')
+
+    def build_index(self, file):
+        raise AssertionError("index was rebuilt")
+
+    monkeypatch.setattr(LazyMapDict, '_build_index', build_index)
+    reloaded = LazyMapDict(config, tmp_path / 'maps')
+    assert reloaded == map_dict
+    assert pickle.loads(pickle.dumps(reloaded)) == map_dict
+
+
+def test_lazy_dict_default_index_dir(tmp_path, monkeypatch):
+    """
+    Without a map cache directory indexes are saved in koza's cache directory
+    """
+    monkeypatch.setenv('KOZA_CACHE_DIR', str(tmp_path / 'cache'))
+    config = _entrez_map_config(tmp_path, MapMode.lazy)
+    map_dict = LazyMapDict(config)
+    assert len(list((tmp_path / 'cache' / 'map-indexes').glob('*.index'))) == 2
+
+    def build_index(self, file):
+        raise AssertionError("index was rebuilt")
+
+    with monkeypatch.context() as rebuild:
+        rebuild.setattr(LazyMapDict, '_build_index', build_index)
+        assert LazyMapDict(config) == map_dict
+
+    # the index is only built when the cache directory can't be created
+    (tmp_path / 'not-a-dir').write_text("")
+    monkeypatch.setenv('KOZA_CACHE_DIR', str(tmp_path / 'not-a-dir' / 'cache'))
+    assert LazyMapDict(config) == map_dict
+
+
+@pytest.mark.parametrize("index", [b"", b"not a pickle", pickle.dumps({'size': 1})])
+def test_lazy_dict_rebuilds_unreadable_index(tmp_path, index):
+    config = _entrez_map_config(tmp_path, MapMode.lazy)
+    map_dict = LazyMapDict(config, tmp_path / 'maps')
+    for index_file in (tmp_path / 'maps').glob('*.index'):
+        index_file.write_bytes(index)
+
+    assert LazyMapDict(config, tmp_path / 'maps') == map_dict
+    for index_file in (tmp_path / 'maps').glob('*.index'):
+        assert pickle.loads(index_file.read_bytes())['offsets']
+
+
+def test_lazy_dict_jsonl(tmp_path, monkeypatch):
+    monkeypatch.setenv('KOZA_CACHE_DIR', str(tmp_path / 'cache'))
+    map_file = tmp_path / 'map.jsonl'
+    map_file.write_text(
+        '{"id": "a", "name": "first", "other": 1}\n\n{"id": "b", "name": "second", "other": 2}\n'
+    )
+    map_dict = LazyMapDict(
+        MapFileConfig(
+            name='jsonl-map',
+            files=[str(map_file)],
+            format='jsonl',
+            key='id',
+            values=['name'],
+            map_mode=MapMode.lazy,
+        )
+    )
+    assert dict(map_dict) == {'a': {'name': 'first'}, 'b': {'name': 'second'}}
+
+
+def test_lazy_dict_falls_back_for_compressed(tmp_path):
+    map_file = tmp_path / 'map.jsonl.gz'
+    with gzip.open(map_file, 'wt') as map_fh:
+        map_fh.write('{"id": "a", "name": "first"}\n')
+    map_dict = KozaApp._load_declarative_map(
+        MapFileConfig(
+            name='jsonl-map',
+            files=[str(map_file)],
+            format='jsonl',
+            key='id',
+            values=['name'],
+            map_mode=MapMode.lazy,
+        )
+    )
+    assert isinstance(map_dict, MapDict)
+    assert map_dict['a'] == {'name': 'first'}
+
+
+def test_map_stats():
+    map_dict = MapDict(foo='bar')
+    map_dict.name = 'test-map'
+    map_dict.stats.sample_interval = 2
+    for key in ['foo', 'foo', 'bad_key', 'foo', 'bad_key', 'other_key']:
+        try:
+            map_dict[key]
+        except MapItemException as map_item_exception:
+            assert map_item_exception.map_name == 'test-map'
+
+    assert map_dict.stats.lookups == 6
+    assert map_dict.stats.misses == 3
+    assert map_dict.stats.sampled_lookups == 3
+    assert map_dict.stats.missing_keys.most_common() == [('bad_key', 2), ('other_key', 1)]
+    assert map_dict.stats.summary('test-map').startswith("Map test-map: 6 lookups, 50.00% hit rate")
+
+
+def test_map_get_stats(tmp_path, monkeypatch):
+    monkeypatch.setenv('KOZA_CACHE_DIR', str(tmp_path / 'cache'))
+    compact_dict = CompactMapDict(['entrez'])
+    compact_dict['foo'] = {'entrez': '1'}
+    lazy_dict = LazyMapDict(_entrez_map_config(tmp_path, MapMode.lazy))
+    # get is counted the same way for every map mode, as with dict.get for MapDict
+    for map_dict, key in [
+        (MapDict(foo={'entrez': '1'}), 'foo'),
+        (compact_dict, 'foo'),
+        (lazy_dict, '10090.ENSMUSP00000026270'),
+    ]:
+        assert map_dict.get(key)['entrez'] in ['1', '2']
+        assert map_dict.get('bad_key') is None
+        assert map_dict.get('bad_key', {}) == {}
+        assert (map_dict.stats.lookups, map_dict.stats.misses) == (0, 0)
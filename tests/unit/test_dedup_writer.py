@@ -0,0 +1,148 @@
+"""
+Testing de-duplication of nodes by id
+"""
+import json
+
+import pytest
+from biolink_model_pydantic.model import Gene, PairwiseGeneToGeneInteraction
+
+from koza.io.writer.dedup_writer import DedupWriter, NodeIdSet
+from koza.io.writer.jsonl_writer import JSONLWriter
+from koza.io.writer.tsv_writer import TSVWriter
+from koza.io.writer.writer import KozaWriter
+from koza.model.config.source_config import DedupPolicy
+
+node_properties = ['id', 'category', 'name', 'xref']
+edge_properties = ['id', 'subject', 'predicate', 'object']
+
+
+def _interactions(rows: int):
+    for i in range(rows):
+        gene_a = Gene(id=f"NCBIGene:{i % 7}", name=f"gene {i % 7}", xref=[f"xref:{i % 3}"])
+        gene_b = Gene(id=f"NCBIGene:{i % 5}")
+        edge = PairwiseGeneToGeneInteraction(
+            id=f"uuid:{i}",
+            subject=gene_a.id,
+            object=gene_b.id,
+            predicate="biolink:interacts_with",
+        )
+        yield gene_a, gene_b, edge
+
+
+def _jsonl_lines(tmp_path, output_type):
+    with open(tmp_path / f"dedup_{output_type}.jsonl") as output_fh:
+        return [json.loads(line) for line in output_fh]
+
+
+@pytest.mark.parametrize("max_nodes", [None, 2])
+def test_dedup_first(tmp_path, max_nodes):
+    writer = DedupWriter(
+        JSONLWriter(str(tmp_path), "dedup", node_properties, edge_properties),
+        DedupPolicy.first,
+        max_nodes,
+        str(tmp_path),
+    )
+    for entities in _interactions(100):
+        writer.write(entities)
+    writer.finalize()
+
+    nodes = _jsonl_lines(tmp_path, 'nodes')
+    assert [node['id'] for node in nodes] == [f"NCBIGene:{i}" for i in range(7)]
+    # the first node with an id is kept
+    assert nodes[0]['name'] == "gene 0"
+    assert len(_jsonl_lines(tmp_path, 'edges')) == 100
+    assert writer.duplicates == 200 - 7
+    assert not list(tmp_path.glob("*.sqlite"))
+
+
+@pytest.mark.parametrize("max_nodes", [None, 2])
+def test_dedup_merge(tmp_path, max_nodes):
+    writer = DedupWriter(
+        JSONLWriter(str(tmp_path), "dedup", node_properties, edge_properties),
+        DedupPolicy.merge,
+        max_nodes,
+        str(tmp_path),
+    )
+    for entities in _interactions(100):
+        writer.write(entities)
+    writer.finalize()
+
+    nodes = _jsonl_lines(tmp_path, 'nodes')
+    assert [node['id'] for node in nodes] == [f"NCBIGene:{i}" for i in range(7)]
+    # the gene_b nodes without a name don't replace it, lists are combined
+    assert nodes[0]['name'] == "gene 0"
+    assert nodes[0]['xref'] == ["xref:0", "xref:1", "xref:2"]
+    assert len(_jsonl_lines(tmp_path, 'edges')) == 100
+    assert not list(tmp_path.glob("*.sqlite"))
+
+
+def test_dedup_merge_tsv(tmp_path):
+    writer = DedupWriter(
+        TSVWriter(str(tmp_path), "dedup", node_properties, edge_properties), DedupPolicy.merge
+    )
+    for entities in _interactions(10):
+        writer.write(entities)
+    writer.finalize()
+
+    with open(tmp_path / "dedup_nodes.tsv") as nodes_fh:
+        lines = nodes_fh.read().splitlines()
+    assert lines[0] == "id\tcategory\tname\txref"
+    assert lines[1] == "NCBIGene:0\tbiolink:Gene\tgene 0\txref:0|xref:1"
+    assert len(lines) == 8
+
+
+def test_node_id_set(tmp_path):
+    node_ids = NodeIdSet(max_ids=3, directory=str(tmp_path))
+    assert [node_ids.add(node_id) for node_id in "abcabdd"] == [
+        True,
+        True,
+        True,
+        False,
+        False,
+        True,
+        False,
+    ]
+    assert list(tmp_path.glob("*.sqlite"))
+    node_ids.close()
+    assert not list(tmp_path.glob("*.sqlite"))
+
+
+def test_dedup_converted(tmp_path):
+    writer = DedupWriter(
+        JSONLWriter(str(tmp_path), "dedup", node_properties, edge_properties), DedupPolicy.first
+    )
+    for i in range(10):
+        writer.write_converted(
+            [{'id': f"NCBIGene:{i % 3}", 'name': str(i)}],
+            [{'id': f"uuid:{i}", 'subject': f"NCBIGene:{i % 3}"}],
+        )
+    writer.finalize()
+
+    assert [node['name'] for node in _jsonl_lines(tmp_path, 'nodes')] == ["0", "1", "2"]
+    assert len(_jsonl_lines(tmp_path, 'edges')) == 10
+
+
+def test_dedup_write_node(tmp_path):
+    writer = DedupWriter(
+        JSONLWriter(str(tmp_path), "dedup", node_properties, edge_properties), DedupPolicy.merge
+    )
+    for i in range(4):
+        writer.write_node({'id': "NCBIGene:1", 'xref': [f"xref:{i % 2}"]})
+        writer.write_edge({'id': f"uuid:{i}", 'subject': "NCBIGene:1"})
+    writer.finalize()
+
+    assert _jsonl_lines(tmp_path, 'nodes') == [{'id': "NCBIGene:1", 'xref': ["xref:0", "xref:1"]}]
+    assert len(_jsonl_lines(tmp_path, 'edges')) == 4
+
+
+def test_writer_without_record_writes():
+    class EntityWriter(KozaWriter):
+        def write(self, entities):
+            pass
+
+        def finalize(self):
+            pass
+
+    # writers need write_node and write_edge, eg for the merge policy
+    with pytest.raises(TypeError):
+        DedupWriter(EntityWriter(), DedupPolicy.merge)
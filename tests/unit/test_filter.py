@@ -2,6 +2,8 @@
 Testing for row filtering
 
 """
+import json
+
 import pytest
 
 from koza.model.config.source_config import ColumnFilter, FilterCode, FilterInclusion
@@ -137,3 +139,53 @@ def test_empty_filters():
     rf = RowFilter()
 
     assert rf.include_row(row)
+
+
+def test_in_filter_with_unhashable_value():
+    column_filter = ColumnFilter(
+        column='a',
+        inclusion=FilterInclusion('include'),
+        filter_code=FilterCode('in'),
+        value=['llama', 'alpaca'],
+    )
+    rf = RowFilter([column_filter])
+
+    assert rf.include_row({'a': ['llama']}) is False
+
+
+@pytest.mark.parametrize(
+    "value, result",
+    [
+        (['llama', 'alpaca'], False),
+        ([['llama', 'alpaca'], 'condor'], True),
+        ([{'name': 'llama'}], False),
+    ],
+)
+def test_in_filter_with_list_column(value, result):
+    """
+    Rows parsed from json can have list values, and 'in' lists can hold unhashable values
+    """
+    column_filter = ColumnFilter(
+        column='a',
+        inclusion=FilterInclusion('include'),
+        filter_code=FilterCode('in'),
+        value=['llama'],
+    )
+    # not valid in a config, but filters can be built without validation
+    object.__setattr__(column_filter, 'value', value)
+    rf = RowFilter([column_filter])
+
+    assert rf.include_row(json.loads('{"a": ["llama", "alpaca"]}')) is result
+    assert rf.include_row({'a': 'condor'}) is ('condor' in value)
+
+
+def test_missing_column_excludes_row():
+    column_filter = ColumnFilter(
+        column='d',
+        inclusion=FilterInclusion('exclude'),
+        filter_code=FilterCode('eq'),
+        value=1,
+    )
+    rf = RowFilter([column_filter])
+
+    assert rf.include_row({'a': 0.3}) is False
@@ -0,0 +1,65 @@
+"""
+Testing flat mode transforms, which are compiled once and run per row
+"""
+import logging
+
+from koza.app import MAP_MISS_WARNINGS
+from koza.model.map_dict import MapDict
+
+transform = """
+from koza.cli_runner import koza_app
+
+# module level names persist between rows
+row_count = globals().get('row_count', 0) + 1
+
+row = koza_app.get_row()
+if row['skip']:
+    koza_app.next_row()
+
+koza_app.write(row['id'], row_count)
+"""
+
+
+def test_flat_transform(mock_koza, tmp_path):
+    transform_code = tmp_path / 'flat_transform.py'
+    transform_code.write_text(transform)
+    rows = [
+        {'id': 'a', 'skip': False},
+        {'id': 'b', 'skip': True},
+        {'id': 'c', 'skip': False},
+    ]
+
+    entities = mock_koza('flat-transform', iter(rows), str(transform_code))
+
+    assert entities == ['c', 3]
+
+
+map_transform = """
+from koza.cli_runner import koza_app
+
+row = koza_app.get_row()
+koza_app.write(koza_app.get_map('test-map')[row['id']]['name'])
+"""
+
+
+def test_flat_transform_map_misses(mock_koza, tmp_path, caplog):
+    transform_code = tmp_path / 'map_transform.py'
+    transform_code.write_text(map_transform)
+    map_dict = MapDict(a={'name': 'first'})
+    map_dict.name = 'test-map'
+    rows = [{'id': 'a'}] + [{'id': f'missing-{index % 3}'} for index in range(25)]
+
+    with caplog.at_level(logging.INFO):
+        entities = mock_koza(
+            'map-transform', iter(rows), str(transform_code), {'test-map': map_dict}
+        )
+
+    assert entities == ['first']
+    miss_warnings = [
+        record for record in caplog.records if 'not found in map test-map' in record.message
+    ]
+    assert len(miss_warnings) == MAP_MISS_WARNINGS
+    assert map_dict.stats.lookups == 26
+    assert map_dict.stats.misses == 25
+    assert "Map test-map: 26 lookups, 3.85% hit rate, 25 misses" in caplog.text
+    assert "missing-0 (9), missing-1 (8), missing-2 (8)" in caplog.text
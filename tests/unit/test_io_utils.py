@@ -9,10 +9,20 @@ https://github.com/monarch-initiative/dipper/blob/6f1fe5bb/dipper/utils/TestUtil
 https://github.com/monarch-initiative/dipper/blob/682560f/tests/test_udp.py#L85
 """
 
+import bz2
+import gzip
+import lzma
+import threading
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
 import pytest
+import requests
 
 from koza.io.utils import *
 from koza.io.utils import _sanitize_export_property
+from koza.model.config.source_config import PrimaryFileConfig
+from koza.model.source import Source
 
 
 def test_404():
@@ -96,3 +106,202 @@ def test_sanitize_export_property(query):
         assert query[1] == value
     else:
         assert query[1] in value
+
+
+@pytest.mark.parametrize("shards", [1, 2, 3, 7, 100])
+def test_split_resource(tmp_path, shards):
+    """
+    Test that byte ranges are line aligned and together cover the whole file
+    """
+    lines = [f"line {i}\t{'x' * i}\n" for i in range(20)]
+    resource = tmp_path / 'lines.tsv'
+    resource.write_text(''.join(lines))
+
+    byte_ranges = split_resource(resource, shards)
+
+    assert len(byte_ranges) <= shards
+    read_lines = []
+    for byte_range in byte_ranges:
+        with open_resource(resource, byte_range) as range_fh:
+            range_lines = range_fh.readlines()
+        assert range_lines
+        read_lines.extend(range_lines)
+    assert read_lines == lines
+
+
+def test_split_resource_after_header(tmp_path):
+    resource = tmp_path / 'with-header.tsv'
+    resource.write_text("a\tb\n1\t2\n3\t4\n")
+
+    byte_ranges = split_resource(resource, 2, start=4)
+
+    assert byte_ranges[0][0] == 4
+    with open_resource(resource, byte_ranges[0]) as range_fh:
+        assert range_fh.readline() == "1\t2\n"
+
+
+def test_split_file_quoted_newlines(tmp_path):
+    """
+    Test that a csv file with quoted fields, which may contain newlines, is not split
+    """
+    unquoted = tmp_path / 'unquoted.tsv'
+    unquoted.write_text("a\tb\n" + "".join(f"{i}\tvalue {i}\n" for i in range(20)))
+    quoted = tmp_path / 'quoted.tsv'
+    quoted.write_text("a\tb\n" + "".join(f'{i}\t"value\n{i}"\n' for i in range(20)))
+
+    for file, expected_ranges in [(unquoted, 4), (quoted, 1)]:
+        config = PrimaryFileConfig(
+            name='split', files=[str(file)], delimiter='\t', columns=['a', 'b']
+        )
+        byte_ranges, header = Source.split_file(config, file, 4)
+        assert len(byte_ranges) == expected_ranges
+        assert header == ['a', 'b']
+        assert byte_ranges[0][0] == 4
+
+
+@pytest.mark.parametrize(
+    "suffix, compress",
+    [
+        ('', lambda data: data),
+        ('.gz', gzip.compress),
+        ('.bz2', bz2.compress),
+        ('.xz', lzma.compress),
+    ],
+)
+@pytest.mark.parametrize("background", [False, True])
+def test_open_compressed_resource(tmp_path, suffix, compress, background):
+    text = ''.join(f"line {i}\t{'é' * (i % 5)}\n" for i in range(10000))
+    resource = tmp_path / f"lines.tsv{suffix}"
+    resource.write_bytes(compress(text.encode()))
+
+    with open_resource(resource, background=background) as resource_io:
+        assert resource_io.readline() == "line 0\t\n"
+        assert resource_io.read() == text[len("line 0\t\n") :]
+
+
+@pytest.fixture
+def http_server(tmp_path):
+    """
+    Serves tmp_path/served over http, recording the status of each response
+    """
+    served = tmp_path / "served"
+    served.mkdir()
+    statuses = []
+
+    class Handler(SimpleHTTPRequestHandler):
+        def send_response(self, code, message=None):
+            statuses.append(code)
+            super().send_response(code, message)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), partial(Handler, directory=str(served)))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}", served, statuses
+    server.shutdown()
+    server.server_close()
+
+
+def test_open_remote_resource_cached(tmp_path, http_server):
+    url, served, statuses = http_server
+    cache_dir = tmp_path / "cache"
+    content = "".join(f"row {i}\n" for i in range(100000))
+    with gzip.open(served / "data.tsv.gz", 'wt') as served_fh:
+        served_fh.write(content)
+
+    with fetch_resource(f"{url}/data.tsv.gz", cache_dir) as remote_fh:
+        assert gzip.decompress(remote_fh.read()).decode() == content
+
+    # unchanged files are revalidated, not downloaded again
+    with fetch_resource(f"{url}/data.tsv.gz", cache_dir) as remote_fh:
+        assert gzip.decompress(remote_fh.read()).decode() == content
+    assert statuses == [200, 304]
+    assert not list((cache_dir / "downloads").glob("*.part"))
+
+
+def test_open_remote_resource_interrupted(tmp_path, http_server, monkeypatch):
+    url, served, statuses = http_server
+    cache_dir = tmp_path / "cache"
+    (served / "data.tsv").write_text("a\tb\n1\t2\n")
+
+    def interrupted(response, chunk_size=1):
+        yield b"a\tb\n"
+        raise requests.exceptions.ConnectionError("interrupted")
+
+    monkeypatch.setattr(requests.Response, 'iter_content', interrupted)
+    with pytest.raises(requests.exceptions.ConnectionError):
+        with fetch_resource(f"{url}/data.tsv", cache_dir) as remote_fh:
+            remote_fh.read()
+
+    # nothing is left in the cache, so the next run downloads the file again
+    assert not list((cache_dir / "downloads").iterdir())
+
+
+def test_open_remote_resource(tmp_path, http_server, monkeypatch):
+    url, served, statuses = http_server
+    monkeypatch.setenv('KOZA_CACHE_DIR', str(tmp_path / "cache"))
+    (served / "data.tsv").write_text("a\tb\n1\t2\n")
+
+    with open_resource(f"{url}/data.tsv") as remote_fh:
+        assert remote_fh.read() == "a\tb\n1\t2\n"
+    assert (tmp_path / "cache" / "downloads").exists()
+
+    with pytest.raises(ValueError):
+        open_resource(f"{url}/missing.tsv")
+
+
+def _bgzf_blocks(data: bytes):
+    """
+    Splits bgzip data into its blocks, using the block size in each block header
+    """
+    blocks = []
+    while data:
+        block_size = int.from_bytes(data[16:18], 'little') + 1
+        blocks.append(data[:block_size])
+        data = data[block_size:]
+    return blocks
+
+
+@pytest.mark.parametrize("compression", ['gzip', 'bgzip'])
+def test_open_output(tmp_path, compression):
+    text = ''.join(f"line {i}\t{'é' * (i % 5)}\n" for i in range(100000))
+    output_file = tmp_path / "lines.tsv.gz"
+    with open_output(output_file, compression, header="a\tb\n") as output_fh:
+        output_fh.write(text)
+
+    assert gzip.decompress(output_file.read_bytes()).decode() == "a\tb\n" + text
+    with open_resource(output_file) as resource_io:
+        assert resource_io.read() == "a\tb\n" + text
+    if compression == 'bgzip':
+        blocks = _bgzf_blocks(output_file.read_bytes())
+        assert blocks[-1] == BGZF_EOF
+        assert all(len(block) <= 0x10000 for block in blocks)
+
+
+@pytest.mark.parametrize("compression", [None, 'gzip', 'bgzip'])
+def test_merge_compressed_output(tmp_path, compression):
+    shard_files = []
+    for shard in range(3):
+        shard_file = tmp_path / f"shard{shard}.tsv"
+        with open_output(shard_file, compression, header="a\tb\n") as output_fh:
+            output_fh.write(''.join(f"{shard}\t{i}\n" for i in range(1000)))
+        shard_files.append(shard_file)
+
+    output_file = tmp_path / "merged.tsv"
+    merge_output_files(shard_files, output_file, header=True, compression=compression)
+    merged = output_file.read_bytes()
+    if compression:
+        merged = gzip.decompress(merged)
+    assert merged.decode() == "a\tb\n" + ''.join(
+        f"{shard}\t{i}\n" for shard in range(3) for i in range(1000)
+    )
+    if compression == 'bgzip':
+        blocks = _bgzf_blocks(output_file.read_bytes())
+        assert blocks.count(BGZF_EOF) == 1 and blocks[-1] == BGZF_EOF
+
+
+def test_open_output_unsupported(tmp_path):
+    with pytest.raises(ValueError):
+        open_output(tmp_path / "lines.tsv", 'snappy')
@@ -1,9 +1,11 @@
 import gzip
+import io
+import json
 from pathlib import Path
 
 import pytest
 
-from koza.io.reader.json_reader import JSONReader
+from koza.io.reader.json_reader import JSONReader, JSONStream
 
 test_zfin_data = Path(__file__).parents[1] / 'resources' / 'source-files' / 'test_BGI_ZFIN.json.gz'
 
@@ -30,3 +32,60 @@ def test_missing_req_property_raises_exception():
         json_reader = JSONReader(zfin, ['fake_prop'], json_path=json_path)
         with pytest.raises(ValueError):
             next(json_reader)
+
+
+def test_streaming_normal_case():
+    with gzip.open(test_zfin_data, 'rt') as zfin:
+        json_reader = JSONReader(zfin, json_path=json_path, streaming=True)
+        row = next(json_reader)
+        assert row['symbol'] == 'gdnfa'
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 1024])
+def test_streaming_skips_values_outside_json_path(monkeypatch, chunk_size):
+    document = {
+        'meta': {'note': 'braces } and ] in "strings" \\ are skipped', 'list': [[1], {'a': [2]}]},
+        'count': 12345,
+        'data': [{'id': 'a', 'value': 1.5}, {'id': 'bé', 'value': [1, {'x': None}]}, 7],
+        'after': [1, 2, 3],
+    }
+    monkeypatch.setattr(JSONStream, '_chunk_size', chunk_size)
+
+    json_reader = JSONReader(io.StringIO(json.dumps(document)), json_path=['data'], streaming=True)
+
+    assert list(json_reader) == document['data']
+
+
+def test_streaming_missing_json_path():
+    json_reader = JSONReader(io.StringIO('{"data": []}'), json_path=['nodes'], streaming=True)
+    with pytest.raises(KeyError):
+        next(json_reader)
+
+
+@pytest.mark.parametrize("row_limit", [None, 1, 5])
+@pytest.mark.parametrize(
+    "document, path",
+    [
+        ({'data': {'id': 'a', 'value': [1, 2]}}, ['data']),
+        ({'data': [{'id': 'a'}, {'id': 'b'}]}, ['data']),
+        ({'data': [{'id': 'a'}, {'id': 'b'}]}, ['data', 1]),
+        ({'id': 'a'}, None),
+    ],
+)
+def test_streaming_matches_loaded_object(document, path, row_limit):
+    """
+    A single object at json_path is read as one row, streaming or not
+    """
+    rows = [
+        list(
+            JSONReader(
+                io.StringIO(json.dumps(document)),
+                json_path=path,
+                row_limit=row_limit,
+                streaming=streaming,
+            )
+        )
+        for streaming in [False, True]
+    ]
+    assert rows[0] == rows[1]
+    assert rows[0]
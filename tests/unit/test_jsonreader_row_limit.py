@@ -33,3 +33,13 @@ def test_missing_req_property_raises_exception():
         json_reader = JSONReader(ddpheno, ['fake_prop'], json_path=json_path, row_limit=3)
         with pytest.raises(ValueError):
             next(json_reader)
+
+
+def test_streaming_matches_loaded_document():
+    with gzip.open(test_ddpheno, 'rt') as ddpheno:
+        loaded_rows = list(JSONReader(ddpheno, json_path=json_path, row_limit=50))
+    with gzip.open(test_ddpheno, 'rt') as ddpheno:
+        streamed_rows = list(JSONReader(ddpheno, json_path=json_path, row_limit=50, streaming=True))
+
+    assert len(streamed_rows) == 50
+    assert streamed_rows == loaded_rows
@@ -1,3 +1,5 @@
+from dataclasses import asdict
+
 import pytest
 from biolink_model_pydantic.model import Curie, Gene, GeneToGeneAssociation, Predicate, Publication
 
@@ -71,3 +73,26 @@ def test_keys_uniformity(id, symbol, synonym, xref):
     assert 'xref' in output.keys()
     assert 'description' in output.keys()
     assert 'source' in output.keys()
+
+
+def test_conversion_matches_asdict():
+    gene = Gene(id=Curie("ZFIN:ZDB-GENE-990415-8"), symbol="pax2a", name="paired box 2a")
+    pub = Publication(id=Curie("PMID:17522161"), type="MESH:foobar")
+    association = GeneToGeneAssociation(
+        id='uuid:123',
+        subject=gene.id,
+        predicate=Predicate.interacts_with,
+        object=gene.id,
+        publications=[pub],
+    )
+
+    (nodes, edges) = KGXConverter().convert([gene, pub, association])
+    assert nodes == [asdict(gene), asdict(pub)]
+    assert edges == [asdict(association)]
+    # values are copied, as with asdict
+    assert edges[0]['category'] is not association.category
+
+
+def test_conversion_error():
+    with pytest.raises(ValueError):
+        KGXConverter().convert([Curie("ZFIN:ZDB-GENE-990415-8")])
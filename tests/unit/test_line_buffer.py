@@ -0,0 +1,89 @@
+"""
+Testing batched writes of output lines
+"""
+import io
+
+from koza.io.writer.writer import LineBuffer, ShardedLineBuffer
+from koza.model.config.source_config import OutputShardConfig
+
+
+class CountingStringIO(io.StringIO):
+    writes = 0
+
+    def write(self, s):
+        self.writes += 1
+        return super().write(s)
+
+
+def test_batch_size():
+    output = CountingStringIO()
+    line_buffer = LineBuffer(output, batch_size=3)
+    for i in range(7):
+        line_buffer.write(f"{i}\n")
+
+    assert output.writes == 2
+    line_buffer.flush()
+    assert output.writes == 3
+    assert output.getvalue() == ''.join(f"{i}\n" for i in range(7))
+
+
+def test_batch_bytes():
+    output = CountingStringIO()
+    line_buffer = LineBuffer(output, batch_bytes=10)
+    line_buffer.write("abcd\n")
+    assert output.writes == 0
+    line_buffer.write("efghij\n")
+    assert output.writes == 1
+    assert output.getvalue() == "abcd\nefghij\n"
+
+
+def _sharded_line_buffer(shards):
+    outputs = {}
+
+    def open_file(file_name):
+        outputs[file_name] = io.StringIO()
+        outputs[file_name].close = lambda: None
+        return outputs[file_name]
+
+    return ShardedLineBuffer(open_file, "out", ".tsv", shards, batch_size=2), outputs
+
+
+def test_sharded_max_rows():
+    line_buffer, outputs = _sharded_line_buffer(OutputShardConfig(max_rows=3))
+    for i in range(7):
+        line_buffer.write(f"{i}\n")
+    line_buffer.close()
+
+    assert list(outputs) == ["out_00000.tsv", "out_00001.tsv", "out_00002.tsv"]
+    assert outputs["out_00001.tsv"].getvalue() == "3\n4\n5\n"
+    assert line_buffer.manifest() == [
+        {'file': "out_00000.tsv", 'rows': 3},
+        {'file': "out_00001.tsv", 'rows': 3},
+        {'file': "out_00002.tsv", 'rows': 1},
+    ]
+
+
+def test_sharded_max_bytes():
+    line_buffer, outputs = _sharded_line_buffer(OutputShardConfig(max_bytes=5))
+    for line in ["ab\n", "c\n", "defghij\n", "k\n"]:
+        line_buffer.write(line)
+    line_buffer.close()
+
+    # a line longer than max_bytes gets a file of its own
+    assert [output.getvalue() for output in outputs.values()] == ["ab\nc\n", "defghij\n", "k\n"]
+
+
+def test_sharded_partitions():
+    line_buffer, outputs = _sharded_line_buffer(OutputShardConfig(partitions=4))
+    for i in range(100):
+        line_buffer.write(f"{i % 10}\t{i}\n", key=f"subject:{i % 10}")
+    line_buffer.close()
+
+    assert len(outputs) == 4
+    assert sum(file['rows'] for file in line_buffer.manifest()) == 100
+    # all lines with the same key are in the same file
+    for output in outputs.values():
+        keys = {line.split("\t")[0] for line in output.getvalue().splitlines()}
+        for other in outputs.values():
+            if other is not output:
+                assert not keys & {line.split("\t")[0] for line in other.getvalue().splitlines()}
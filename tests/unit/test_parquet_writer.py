@@ -0,0 +1,69 @@
+import pytest
+from biolink_model_pydantic.model import Disease, Gene, PairwiseGeneToGeneInteraction
+
+from koza.io.writer.parquet_writer import ParquetWriter
+
+pq = pytest.importorskip('pyarrow.parquet')
+
+
+def test_parquet_writer(tmp_path):
+    """
+    Writes nodes and edges to parquet files, keeping list columns as lists
+    """
+    g = Gene(id="HGNC:11603", name="TBX4", xref=["ENSEMBL:ENSG00000121075"])
+    d = Disease(id="MONDO:0005002", name="chronic obstructive pulmonary disease")
+    a = PairwiseGeneToGeneInteraction(
+        id="uuid:5b06e86f-d768-4cd9-ac27-abe31e95ab1e",
+        subject=g.id,
+        object=d.id,
+        predicate="biolink:interacts_with",
+        publications=["PMID:1", "PMID:2"],
+    )
+
+    node_properties = ['id', 'category', 'name', 'xref', 'in_taxon']
+    edge_properties = ['id', 'subject', 'predicate', 'object', 'publications', 'negated']
+
+    writer = ParquetWriter(str(tmp_path), "parquet-writer", node_properties, edge_properties)
+    writer.write([g, d, a])
+    writer.finalize()
+
+    nodes = pq.read_table(tmp_path / "parquet-writer_nodes.parquet")
+    assert nodes.column_names == ['id', 'category', 'name', 'xref', 'in_taxon']
+    assert nodes.to_pylist() == [
+        {
+            'id': "HGNC:11603",
+            'category': ["biolink:Gene"],
+            'name': "TBX4",
+            'xref': ["ENSEMBL:ENSG00000121075"],
+            'in_taxon': None,
+        },
+        {
+            'id': "MONDO:0005002",
+            'category': ["biolink:Disease"],
+            'name': "chronic obstructive pulmonary disease",
+            'xref': None,
+            'in_taxon': None,
+        },
+    ]
+
+    edges = pq.read_table(tmp_path / "parquet-writer_edges.parquet")
+    assert str(edges.schema.field('negated').type) == 'bool'
+    edge = edges.to_pylist()[0]
+    assert edge['subject'] == "HGNC:11603"
+    assert edge['publications'] == ["PMID:1", "PMID:2"]
+
+
+def test_parquet_writer_row_groups(tmp_path):
+    writer = ParquetWriter(str(tmp_path), "row-groups", ['id', 'name'], row_group_size=10)
+    for i in range(25):
+        writer.write([Gene(id=f"HGNC:{i}", name=f"gene {i}")])
+    writer.finalize()
+
+    parquet_file = pq.ParquetFile(tmp_path / "row-groups_nodes.parquet")
+    assert parquet_file.num_row_groups == 3
+    assert parquet_file.read().column('id').to_pylist() == [f"HGNC:{i}" for i in range(25)]
+
+
+def test_parquet_writer_bgzip(tmp_path):
+    with pytest.raises(ValueError):
+        ParquetWriter(str(tmp_path), "bgzip", ['id'], compression='bgzip')
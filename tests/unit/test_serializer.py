@@ -0,0 +1,71 @@
+"""
+Testing the JSON serializers used to write JSONL output
+"""
+import json
+from dataclasses import dataclass, field
+from typing import List
+
+import pytest
+from biolink_model_pydantic.model import Gene, PairwiseGeneToGeneInteraction
+
+from koza.converter.kgx_converter import KGXConverter
+from koza.io import serializer
+from koza.io.serializer import get_json_serializer
+
+
+@dataclass
+class Node:
+    id: str
+    name: str
+    xref: List[str] = field(default_factory=list)
+
+
+installed = [
+    name
+    for name, module in [('orjson', serializer.orjson), ('msgspec', serializer.msgspec)]
+    if module is not None
+] + ['json']
+
+
+@pytest.mark.parametrize("name", installed)
+def test_serializer(name):
+    serialize = get_json_serializer(name)
+    gene = Gene(id="HGNC:11603", name="TBX4 – β", in_taxon=["NCBITaxon:9606"])
+    edge = PairwiseGeneToGeneInteraction(
+        id="uuid:123",
+        subject=gene.id,
+        object="HGNC:1",
+        predicate="biolink:interacts_with",
+    )
+
+    # the same as serializing the converted dictionary
+    converter = KGXConverter()
+    for entity, converted in [
+        (gene, converter.convert_node(gene)),
+        (edge, converter.convert_association(edge)),
+    ]:
+        line = serialize(entity)
+        assert "\n" not in line
+        assert json.loads(line) == json.loads(json.dumps(converted, ensure_ascii=False))
+    assert "TBX4 – β" in serialize(gene)
+
+
+@pytest.mark.parametrize("name", installed)
+def test_serializer_dataclass(name):
+    serialize = get_json_serializer(name)
+    node = Node(id="a", name="é", xref=["b"])
+    assert json.loads(serialize(node)) == {"id": "a", "name": "é", "xref": ["b"]}
+    assert json.loads(serialize({"xref": {"b"}})) == {"xref": ["b"]}
+    with pytest.raises(TypeError):
+        serialize({"value": object()})
+
+
+def test_json_serializer_output_unchanged():
+    serialize = get_json_serializer('json')
+    row = {"id": "a", "name": "é", "xref": ["b", "c"]}
+    assert serialize(row) == json.dumps(row, ensure_ascii=False)
+
+
+def test_unknown_serializer():
+    with pytest.raises(ValueError):
+        get_json_serializer('pickle')
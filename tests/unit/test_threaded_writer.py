@@ -0,0 +1,68 @@
+"""
+Testing writes on a background thread
+"""
+import threading
+
+import pytest
+
+from koza.io.writer.writer import KozaWriter, ThreadedWriter
+
+
+class ListWriter(KozaWriter):
+    def __init__(self, fail_on=None):
+        self.entities = []
+        self.threads = set()
+        self.finalized = False
+        self.fail_on = fail_on
+
+    def write(self, entities):
+        self.threads.add(threading.current_thread())
+        for entity in entities:
+            if entity == self.fail_on:
+                raise ValueError(f"can't write {entity}")
+            self.entities.append(entity)
+
+    def write_node(self, record):
+        self.entities.append(record)
+
+    def write_edge(self, record):
+        self.entities.append(record)
+
+    def finalize(self):
+        self.finalized = True
+
+
+def test_threaded_writer():
+    writer = ListWriter()
+    threaded_writer = ThreadedWriter(writer, queue_size=2, batch_size=3)
+    for i in range(100):
+        threaded_writer.write((i, -i))
+    threaded_writer.finalize()
+
+    assert writer.entities == [entity for i in range(100) for entity in (i, -i)]
+    assert writer.threads == {threaded_writer._thread}
+    assert writer.finalized
+
+
+def test_threaded_writer_error():
+    writer = ListWriter(fail_on=5)
+    threaded_writer = ThreadedWriter(writer, batch_size=1)
+    with pytest.raises(ValueError):
+        for i in range(10000):
+            threaded_writer.write((i,))
+    # the error is raised again by finalize, after the writer is finalized
+    with pytest.raises(ValueError):
+        threaded_writer.finalize()
+    assert writer.finalized
+    assert writer.entities == [0, 1, 2, 3, 4]
+
+
+def test_threaded_writer_converted():
+    writer = ListWriter()
+    threaded_writer = ThreadedWriter(writer, batch_size=2)
+    threaded_writer.write((1,))
+    threaded_writer.write_converted([{'id': 'a'}], [])
+    threaded_writer.write((2,))
+    threaded_writer.finalize()
+
+    assert writer.entities == [1, {'id': 'a'}, 2]
@@ -2,6 +2,7 @@ import os
 
 from biolink_model_pydantic.model import Disease, Gene, GeneToDiseaseAssociation, Predicate
 
+from koza.io.utils import build_export_row
 from koza.io.writer.tsv_writer import TSVWriter
 
 
@@ -44,3 +45,43 @@ def test_tsv_writer():
     assert os.path.exists("{}/{}_nodes.tsv".format(outdir, outfile)) and os.path.exists(
         "{}/{}_edges.tsv".format(outdir, outfile)
     )
+
+
+def test_tsv_writer_export_values(tmp_path):
+    """
+    Rows match build_export_row for the output columns
+    """
+    node_properties = ['id', 'category', 'name', 'negated', 'count', 'synonym', 'extra_list']
+    edge_properties = ['id', 'subject', 'predicate', 'object', 'publications', 'flag']
+    nodes = [
+        {'id': 'A:1', 'category': ['biolink:Gene', None, ''], 'name': 'a\tb\nc \\"d'},
+        {'id': 'A:2', 'name': ' ', 'negated': True, 'count': 0, 'synonym': 'single', 'other': 1},
+        {'id': 'A:3', 'name': '', 'negated': False, 'count': 3, 'extra_list': ['x', ' ', 'y']},
+        {'id': '', 'name': None, 'negated': 'yes', 'synonym': [], 'extra_list': 'z'},
+    ]
+    edges = [
+        {'id': 'e1', 'subject': 'A:1', 'predicate': 'p', 'object': 'A:2', 'flag': True},
+        {'id': 'e2', 'subject': 'A:1', 'object': ' ', 'publications': 'PMID:1', 'flag': 'x'},
+    ]
+
+    writer = TSVWriter(str(tmp_path), 'export', node_properties, edge_properties)
+    for node in nodes:
+        writer.write_node(node)
+    for edge in edges:
+        writer.write_edge(edge)
+    writer.finalize()
+
+    def expected_line(record, columns, node=False):
+        row = build_export_row(record, list_delimiter='|')
+        if node:
+            row['id'] = record['id']
+        return '\t'.join(str(row[column]) if column in row else '' for column in columns) + '\n'
+
+    with open(tmp_path / 'export_nodes.tsv') as nodes_fh:
+        lines = nodes_fh.readlines()
+    assert lines[1:] == [
+        expected_line(node, writer.ordered_node_columns, node=True) for node in nodes
+    ]
+    with open(tmp_path / 'export_edges.tsv') as edges_fh:
+        lines = edges_fh.readlines()
+    assert lines[1:] == [expected_line(edge, writer.ordered_edge_columns) for edge in edges]
@@ -1,8 +1,16 @@
+from dataclasses import asdict, dataclass
 from pathlib import Path
 
 import pytest
 from linkml_validator.validator import Validator
 
+from koza.model.config.source_config import ValidationConfig
+from koza.validation import (
+    EntityValidator,
+    ValidationSummary,
+    get_schema_validator,
+)
+
 valid_gene = {
     "id": "BOGUS:12345",
     "name": "Bogus Gene 12345",
@@ -28,3 +36,68 @@ def test_invalid_input(gene):
     v = validator.validate(obj=gene, target_class="NamedThing")
     result = v.validation_results[0]
     assert result.valid == False
+
+
+validation_schema = Path(__file__).parent.parent / 'resources' / 'validation-schema.yaml'
+
+
+@dataclass
+class Gene:
+    id: str
+    name: str
+
+
+def _gene_records(count):
+    genes = [Gene(f"GENE:{i}", f"gene {i}") for i in range(count)]
+    # every third record is missing its required id
+    records = [{"name": gene.name} if i % 3 == 0 else asdict(gene) for i, gene in enumerate(genes)]
+    return genes, records
+
+
+def test_schema_validator_is_cached():
+    assert get_schema_validator(validation_schema) is get_schema_validator(str(validation_schema))
+
+
+def test_schema_validator_errors():
+    schema_validator = get_schema_validator(validation_schema)
+    assert schema_validator.errors({"id": "GENE:1", "category": ["Gene"]}, "NamedThing") == []
+    assert schema_validator.errors({"name": "gene", "category": "Gene"}, "NamedThing") == [
+        "category: 'Gene' is not of type 'array'",
+        "'id' is a required property",
+    ]
+    with pytest.raises(ValueError):
+        schema_validator.errors({"id": "GENE:1"}, "Gene")
+
+
+@pytest.mark.parametrize("workers", [None, 2])
+def test_entity_validator_summary(workers):
+    validator = EntityValidator(validation_schema, ValidationConfig(workers=workers, batch_size=4))
+    genes, records = _gene_records(30)
+    validator.add(genes, records, "NamedThing")
+    validator.add([Gene("GENE:x", "x")], [{"id": "GENE:x", "subject": "GENE:x"}], "Association")
+    summary = validator.finish()
+
+    assert summary.validated == {"Gene": 31}
+    assert summary.invalid == {"Gene": 11}
+    assert len(summary.examples["Gene"]) == ValidationSummary.max_examples
+    assert not summary.valid
+    assert summary.summary().startswith("Gene: 11 of 31 validated records are invalid")
+
+
+def test_entity_validator_sample():
+    genes, records = _gene_records(300)
+
+    validator = EntityValidator(validation_schema, ValidationConfig(first=10))
+    validator.add(genes, records, "NamedThing")
+    assert validator.finish().validated == {"Gene": 10}
+
+    validator = EntityValidator(validation_schema, ValidationConfig(sample_rate=0.1))
+    validator.add(genes, records, "NamedThing")
+    assert 10 < validator.finish().validated["Gene"] < 60
+
+
+def test_validation_config():
+    with pytest.raises(ValueError):
+        ValidationConfig(sample_rate=0)
+    with pytest.raises(ValueError):
+        ValidationConfig(first=0)